@@ -0,0 +1,511 @@
+"""
+Async Base Agent - asyncio Variante von BaseAgent auf redis.asyncio
+"""
+
+import asyncio
+import inspect
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Set, Union
+import logging
+
+import redis.asyncio as aioredis
+
+from agents.codec import ChannelCodecs, CodecError, decode, epoch_ms
+from agents.dispatch import EXECUTOR_KINDS, process_safe
+from agents.transport import create_async_transport, transport_options_from_env
+from agents.rpc import RemoteError, RequestTimeout, gather as gather_futures, new_correlation_id
+from agents.replicas import AsyncReplicaRegistry, AsyncReplicaRouter, LoadReporter, replica_address
+from agents.state_store import AsyncAgentStateStore
+from config.agent_config import config
+
+class AsyncBaseAgent:
+    """
+    asyncio sibling of BaseAgent with the same message envelope and channels.
+
+    Handlers may be `async def` or plain functions. Plain handlers run in a
+    worker thread (asyncio.to_thread) so a blocking call such as `npm install`
+    does not stall the loop; cheap control handlers run on the loop directly.
+
+    send_message() and update_status() return awaitables but may also be
+    called fire-and-forget, from the loop or from a sync handler thread, so
+    existing BaseAgent subclasses port by swapping the base class. The
+    BaseAgent-only knobs are accepted: executor ('inline', 'thread',
+    'process') is honoured, priority is ignored (no inbound lanes, messages
+    start in arrival order), flush() is a no-op because every send goes out
+    right away, and host= is ignored (AgentHost multiplexes sync agents).
+    """
+
+    CONTROL_MESSAGE_TYPES = ("status_request", "coordination_command")
+
+    def __init__(self, agent_name: str, agent_role: str, transport: Optional[str] = None,
+                 host=None, replica_id: Optional[str] = None):
+        # Replicas of one role run side by side as "<role>@<replica_id>"
+        self.role = agent_name
+        self.replica_id = replica_id or os.getenv('AGENT_REPLICA_ID') or None
+        if self.replica_id:
+            agent_name = replica_address(agent_name, self.replica_id)
+        self.agent_name = agent_name
+        self.agent_role = agent_role
+        self.redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
+
+        # Redis Setup - connection is checked in connect()
+        self.redis_client = aioredis.Redis.from_url(self.redis_url, decode_responses=False)
+
+        # Codec per channel: JSON default, binary/compressed when negotiated
+        self.codecs = ChannelCodecs.from_env(self.redis_client)
+
+        # Shared agent/phase state in Redis hashes, we write our own status
+        self.state = AsyncAgentStateStore(self.redis_client)
+
+        # Sends to a role go to its least-loaded replica (or by affinity key)
+        self.replicas = AsyncReplicaRegistry(self.redis_client)
+        self.router = AsyncReplicaRouter(self.replicas)
+        self._load_reporter = LoadReporter(self.replicas.ttl_ms) if self.replica_id else None
+
+        # Message transport: 'pubsub' (default) or durable 'streams'
+        self.transport_name = transport or os.getenv('AGENT_TRANSPORT', 'pubsub')
+        self.transport = create_async_transport(
+            self.transport_name,
+            self.redis_client,
+            agent_name,
+            **transport_options_from_env(self.transport_name)
+        )
+
+        # Message handlers
+        self.message_handlers: Dict[str, Callable] = {}
+        self.is_running = False
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Concurrency: per-type limits plus a global cap on in-flight messages
+        self.default_concurrency = int(os.getenv('AGENT_MAX_WORKERS', '4'))
+        self.ordered = os.getenv('AGENT_DISPATCH_MODE', 'unordered') == 'ordered'
+        self.max_in_flight = int(os.getenv('AGENT_MAX_IN_FLIGHT', '1000'))
+        self._limits: Dict[str, int] = {}
+        self._executors: Dict[str, str] = {}
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._handling = 0
+        self._tasks: Set[asyncio.Task] = set()
+        # Transport message ids whose handlers finished, acked by the listener
+        self._completed_ids = deque()
+        # Outstanding request() futures by correlation id
+        self.pending_requests: Dict[str, asyncio.Future] = {}
+
+        # Setup logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(f"Agent-{agent_name}")
+        if host is not None:
+            self.logger.warning(f"{agent_name}: AgentHost runs sync agents only, host= ignored")
+
+    async def connect(self):
+        """Check the Redis connection"""
+        try:
+            await self.redis_client.ping()
+            print(f"✅ {self.agent_name} connected to Redis")
+        except Exception as e:
+            print(f"❌ {self.agent_name} Redis connection failed: {e}")
+            raise
+
+    def register_handler(self, message_type: str, handler: Callable,
+                         concurrency: Optional[int] = None, executor: Optional[str] = None,
+                         priority: Optional[str] = None):
+        """Register sync or async message handler for specific message type
+
+        Same signature as BaseAgent.register_handler(); executor picks where a
+        plain handler runs, priority is accepted for compatibility and ignored.
+        """
+        if executor is not None and executor not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor: {executor}")
+        if executor == "process" and not process_safe(handler):
+            raise ValueError(f"Handler for {message_type} cannot run in a process: "
+                             f"use a module-level function, not {handler!r}")
+        self.message_handlers[message_type] = handler
+        if executor is not None:
+            self._executors[message_type] = executor
+        if concurrency is not None:
+            self._limits[message_type] = concurrency
+            self._semaphores.pop(message_type, None)
+
+    def send_message(self, to_agent: str, message_type: str, payload: Dict[str, Any],
+                     flush: bool = False, affinity: Optional[str] = None):
+        """Send message to another agent (awaitable, or fire-and-forget)
+
+        Replica routing as in BaseAgent.send_message(); flush is accepted for
+        compatibility, sends are never queued here.
+        """
+        return self._schedule(self._send_routed(to_agent, message_type, payload, affinity))
+
+    def broadcast(self, targets: Union[str, List[str]], message_type: str,
+                  payload: Dict[str, Any]):
+        """Send one message to several agents in one round-trip (see BaseAgent.broadcast)
+
+        The awaitable resolves to the delivery count per target.
+        """
+        return self._schedule(self._broadcast(targets, message_type, payload))
+
+    def request(self, to_agent: str, message_type: str, payload: Dict[str, Any],
+                timeout: float = 30.0, affinity: Optional[str] = None):
+        """Send a request; the awaitable resolves to the correlated reply payload
+
+        Raises RequestTimeout after `timeout` seconds, or RemoteError if the
+        remote handler raised or does not exist.
+        """
+        return self._schedule(self._request(to_agent, message_type, payload, timeout, affinity))
+
+    def request_many(self, targets: List[str], message_type: str, payload: Dict[str, Any],
+                     timeout: float = 30.0) -> Dict[str, Any]:
+        """Send the same request to several agents, one awaitable per target"""
+        return {
+            target: self.request(target, message_type, payload, timeout)
+            for target in targets
+        }
+
+    def gather(self, futures: Dict[str, Any], timeout: Optional[float] = None):
+        """Wait for request awaitables; values are reply payloads or exceptions
+
+        Awaitable on the loop; from a sync handler thread (where request()
+        returns concurrent futures) it blocks like BaseAgent.gather().
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return gather_futures(futures, timeout)
+        return self._gather(futures, timeout)
+
+    def flush(self) -> int:
+        """Nothing to flush: sends are not queued (BaseAgent compatibility)"""
+        return 0
+
+    async def _gather(self, futures: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        tasks = {key: asyncio.ensure_future(future) for key, future in futures.items()}
+        if tasks:
+            # asyncio.wait does not cancel what is still pending at the timeout
+            await asyncio.wait(tasks.values(), timeout=timeout)
+        results = {}
+        for key, task in tasks.items():
+            if not task.done():
+                results[key] = RequestTimeout("No reply before gather timeout")
+            elif task.cancelled():
+                results[key] = asyncio.CancelledError()
+            else:
+                results[key] = task.exception() or task.result()
+        return results
+
+    async def _request(self, to_agent: str, message_type: str, payload: Dict[str, Any],
+                       timeout: float, affinity: Optional[str] = None):
+        correlation_id = new_correlation_id()
+        future = self.loop.create_future()
+        self.pending_requests[correlation_id] = future
+        try:
+            await self._send_routed(to_agent, message_type, payload, affinity,
+                                    correlation_id=correlation_id)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise RequestTimeout("No reply before request timeout")
+        finally:
+            self.pending_requests.pop(correlation_id, None)
+
+    def update_status(self, status: str, task: Optional[str] = None,
+                      flush: Optional[bool] = None):
+        """Update agent status for MCP Bridge (awaitable, or fire-and-forget)"""
+        return self._schedule(self._update_status(status, task))
+
+    def _schedule(self, coro):
+        """Run coro on the agent loop, from the loop itself or from another thread"""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is not None:
+            return self._spawn(coro)
+        if self.loop is None:
+            coro.close()
+            raise RuntimeError(f"{self.agent_name} event loop is not running")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        # Keep a strong reference so fire-and-forget tasks are not collected
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _send_routed(self, to_agent: str, message_type: str, payload: Any,
+                           affinity: Optional[str] = None, **envelope: Any):
+        try:
+            to_agent = await self.router.route(to_agent, payload, affinity)
+        except Exception as e:
+            self.logger.error(f"❌ Replica lookup failed: {e}")
+        await self._send_message(to_agent, message_type, payload, **envelope)
+
+    async def _send_message(self, to_agent: str, message_type: str, payload: Any,
+                            **envelope: Any):
+        message = {
+            "from": self.agent_name,
+            "to": to_agent,
+            "type": message_type,
+            "timestamp": epoch_ms(),
+            "payload": payload,
+            **envelope
+        }
+
+        try:
+            data = await self.codecs.async_encode_for_agent(to_agent, message)
+            await self.transport.send(to_agent, data)
+            await self._update_status("active", f"Sent {message_type} to {to_agent}")
+            self.logger.info(f"📤 → {to_agent}: {message_type}")
+        except Exception as e:
+            self.logger.error(f"❌ Message send failed: {e}")
+
+    async def _broadcast(self, targets: Union[str, List[str]], message_type: str,
+                         payload: Any) -> Dict[str, int]:
+        names = config.resolve_targets(targets, exclude=self.role)
+        if not names:
+            self.logger.warning(f"No agents match broadcast target: {targets}")
+            return {}
+        message = {
+            "from": self.agent_name,
+            "to": names,
+            "type": message_type,
+            "timestamp": epoch_ms(),
+            "payload": payload
+        }
+
+        try:
+            # One replica per role when the role runs as replicas
+            addresses = {name: await self.router.route(name, payload) for name in names}
+            frames = await self.codecs.async_encode_for_agents(list(addresses.values()), message)
+            sent = await self.transport.send_many(frames)
+            deliveries = {name: sent.get(address, 0) for name, address in addresses.items()}
+        except Exception as e:
+            self.logger.error(f"❌ Broadcast failed: {e}")
+            return {name: 0 for name in names}
+        self.logger.info(f"📣 → {', '.join(names)}: {message_type}")
+        await self._update_status("active", f"Broadcast {message_type} to {len(names)} agents")
+        return deliveries
+
+    async def _update_status(self, status: str, task: Optional[str] = None):
+        status_update = {
+            "agent": self.agent_name,
+            "status": status,
+            "task": task,
+            "timestamp": epoch_ms()
+        }
+
+        try:
+            data = self.codecs.encode_for_channel('agent_status_update', status_update)
+            # State and notification in one round-trip, state first
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                await self.state.queue_status(pipe, self.agent_name, status, task,
+                                              updated_ms=status_update["timestamp"])
+                pipe.publish('agent_status_update', data)
+                commands = list(pipe.command_stack)
+                results = await pipe.execute(raise_on_error=False)
+            # Script cache lost (Redis restart, SCRIPT FLUSH): re-sent as EVAL
+            recovered = await self.state.recover_noscript(commands, results)
+            for index, result in enumerate(results):
+                if isinstance(result, Exception) and index not in recovered:
+                    raise result
+        except Exception as e:
+            self.logger.error(f"❌ Status update failed: {e}")
+
+    async def listen_for_messages(self):
+        """Listen for incoming messages"""
+        try:
+            await self.transport.subscribe()
+            await self.codecs.async_advertise(self.agent_name)
+            await self._report_load()
+
+            self.logger.info(f"👂 {self.agent_name} listening for messages ({self.transport_name})...")
+            await self._update_status("ready", "Waiting for tasks")
+
+            while self.is_running:
+                batch = await self.transport.read_batch()
+                for message_id, raw_message in batch:
+                    await self._admit(raw_message, message_id)
+                await self._ack_completed()
+                await self._report_load()
+
+        except asyncio.CancelledError:
+            self.logger.info(f"🛑 {self.agent_name} listener cancelled")
+            raise
+        except Exception as e:
+            self.logger.error(f"❌ Listen error: {e}")
+        finally:
+            await self._drain()
+
+    async def _drain(self):
+        """Let running handlers finish, ack them and go offline"""
+        current = asyncio.current_task()
+        pending = [task for task in self._tasks if task is not current]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self._ack_completed()
+        await self.transport.close()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+        if self.replica_id:
+            try:
+                await self.replicas.remove(self.role, self.replica_id)
+            except Exception as e:
+                self.logger.error(f"❌ Replica deregistration failed: {e}")
+        await self._update_status("offline", "Agent stopped")
+
+    async def _report_load(self):
+        """Write our in-flight count to the replica registry (replicas only)"""
+        if self._load_reporter is None or not self._load_reporter.due(self._handling):
+            return
+        try:
+            await self.replicas.report(self.role, self.replica_id, self._handling)
+        except Exception as e:
+            self.logger.error(f"❌ Load report failed: {e}")
+
+    async def _ack_completed(self):
+        """Ack all messages whose handlers finished (at-least-once delivery)"""
+        message_ids = []
+        while self._completed_ids:
+            message_ids.append(self._completed_ids.popleft())
+        await self.transport.ack(message_ids)
+
+    def _semaphore_for(self, message_type: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(message_type)
+        if semaphore is None:
+            limit = 1 if self.ordered else self._limits.get(message_type, self.default_concurrency)
+            semaphore = self._semaphores[message_type] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def _admit(self, raw_message: Any, message_id: Optional[str]):
+        """Wait for an in-flight slot, then process the message in its own task
+
+        The slot and the load count are taken here and given back by the
+        task; process_message() itself does no accounting.
+        """
+        await self._in_flight.acquire()
+        self._handling += 1
+        self._spawn(self._process_admitted(raw_message, message_id))
+
+    async def _process_admitted(self, raw_message: Any, message_id: Optional[str]):
+        try:
+            await self.process_message(raw_message, message_id)
+        finally:
+            self._in_flight.release()
+            self._handling -= 1
+
+    async def process_message(self, raw_message: Any, message_id: Optional[str] = None):
+        """Decode one raw message and run its handler"""
+        correlation_id = None
+        try:
+            data = decode(raw_message)
+            message_type = data.get('type')
+            payload = data.get('payload', {})
+            from_agent = data.get('from')
+            correlation_id = data.get('correlation_id')
+
+            if data.get('reply'):
+                # Replies go straight to the waiting future, never to a handler
+                self._resolve_reply(correlation_id, payload, data.get('error'))
+                return
+
+            self.logger.info(f"📥 ← {from_agent}: {message_type}")
+
+            handler = self.message_handlers.get(message_type)
+            if handler is None:
+                self.logger.warning(f"No handler for message type: {message_type}")
+                if correlation_id:
+                    await self._reply(from_agent, message_type, correlation_id,
+                                      error=f"No handler for message type: {message_type}")
+                return
+
+            # Acquire before the first await so ordered mode keeps arrival order
+            async with self._semaphore_for(message_type):
+                await self._update_status("working", f"Processing {message_type}")
+                result = await self._call_handler(message_type, handler, payload)
+
+            if correlation_id:
+                await self._reply(from_agent, message_type, correlation_id, result)
+            elif result:
+                # Send response if handler returns something
+                await self._send_message(from_agent, f"{message_type}_response", result)
+
+        except CodecError:
+            self.logger.warning("Invalid message received")
+        except Exception as e:
+            self.logger.error(f"Message processing error: {e}")
+            await self._update_status("error", str(e))
+            if correlation_id:
+                await self._reply(from_agent, message_type, correlation_id, error=str(e))
+        finally:
+            if message_id:
+                self._completed_ids.append(message_id)
+
+    def _resolve_reply(self, correlation_id: str, payload: Any, error: Optional[str]):
+        future = self.pending_requests.get(correlation_id)
+        if future is None or future.done():
+            self.logger.debug(f"Late or unknown reply: {correlation_id}")
+            return
+        if error is not None:
+            future.set_exception(RemoteError(error))
+        else:
+            future.set_result(payload)
+
+    async def _reply(self, to_agent: str, message_type: str, correlation_id: str,
+                     result: Any = None, error: Optional[str] = None):
+        """Send the correlated reply for a request()"""
+        envelope = {"correlation_id": correlation_id, "reply": True}
+        if error is not None:
+            envelope["error"] = error
+        await self._send_message(to_agent, f"{message_type}_response", result, **envelope)
+
+    async def _call_handler(self, message_type: str, handler: Callable, payload: Dict[str, Any]):
+        if inspect.iscoroutinefunction(handler):
+            return await handler(payload)
+        executor = self._executors.get(message_type)
+        if executor == "inline" or (executor is None and message_type in self.CONTROL_MESSAGE_TYPES):
+            result = handler(payload)
+        elif executor == "process":
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.default_concurrency)
+            result = await self.loop.run_in_executor(self._process_pool, handler, payload)
+        else:
+            result = await asyncio.to_thread(handler, payload)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def start(self):
+        """Start the agent"""
+        self.loop = asyncio.get_running_loop()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        await self.connect()
+        self.is_running = True
+        await self._update_status("starting", "Agent initialization")
+        await self._call_setup()
+        await self.listen_for_messages()
+
+    async def _call_setup(self):
+        # Sync setup() may block (MainAgent.interactive_mode), keep it off the loop
+        if inspect.iscoroutinefunction(self.setup):
+            await self.setup()
+        else:
+            await asyncio.to_thread(self.setup)
+
+    def run(self):
+        """Blocking entry point: run the agent on a fresh event loop"""
+        try:
+            asyncio.run(self.start())
+        except KeyboardInterrupt:
+            self.logger.info(f"🛑 {self.agent_name} stopped by user")
+
+    def setup(self):
+        """Override in subclass for agent-specific setup (sync or async)"""
+        pass
+
+    async def stop(self):
+        """Stop the agent"""
+        self.is_running = False
+        await self._update_status("stopping", "Agent shutdown")
@@ -4,114 +4,503 @@ Base Agent Class für Redis + MCP Koordination
 """
 
 import redis
-import json
 import time
 import os
 import threading
-from datetime import datetime
-from typing import Dict, Any, Callable, Optional
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, List, Optional, Union
 import logging
 
+from agents.codec import ChannelCodecs, CodecError, decode, epoch_ms
+from agents.transport import create_transport, transport_options_from_env
+from agents.dispatch import HandlerDispatcher, QueueFull, process_safe
+from agents.metrics import AgentMetrics
+from agents.outbound import OutboundQueue
+from agents.replicas import LoadReporter, ReplicaRegistry, ReplicaRouter, replica_address
+from agents.rpc import PendingRequests, gather
+from agents.state_store import AgentStateStore
+from config.agent_config import config
+
 class BaseAgent:
-    def __init__(self, agent_name: str, agent_role: str):
+    # Cheap control messages answered on the listener thread from the high
+    # lane, even while all handler workers are busy
+    CONTROL_MESSAGE_TYPES = ("status_request", "coordination_command")
+    # Channel and hash where agents announce full inbound lanes
+    BACKPRESSURE_CHANNEL = "agent_backpressure"
+    
+    def __init__(self, agent_name: str, agent_role: str, transport: Optional[str] = None,
+                 host=None, replica_id: Optional[str] = None):
+        # Replicas of one role run side by side as "<role>@<replica_id>"
+        self.role = agent_name
+        self.replica_id = replica_id or os.getenv('AGENT_REPLICA_ID') or None
+        if self.replica_id:
+            agent_name = replica_address(agent_name, self.replica_id)
         self.agent_name = agent_name
         self.agent_role = agent_role
-        self.redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
+        # AgentHost when several agents share one process (agents/host.py)
+        self.host = host
+        self.redis_url = host.redis_url if host else os.getenv('REDIS_URL', 'redis://localhost:6379')
         
         # Redis Setup
         try:
-            self.redis_client = redis.Redis.from_url(self.redis_url, decode_responses=True)
+            if host is not None:
+                self.redis_client = host.redis_client
+            else:
+                self.redis_client = redis.Redis.from_url(self.redis_url, decode_responses=False)
             self.redis_client.ping()
             print(f"✅ {agent_name} connected to Redis")
         except Exception as e:
             print(f"❌ {agent_name} Redis connection failed: {e}")
             raise
         
+        # Codec per channel: JSON default, binary/compressed when negotiated
+        self.codecs = ChannelCodecs.from_env(self.redis_client)
+        
+        # Shared agent/phase state in Redis hashes, we write our own status
+        self.state = AgentStateStore(self.redis_client)
+        
+        # Message transport: 'pubsub' (default) or durable 'streams'
+        self.transport_name = transport or os.getenv('AGENT_TRANSPORT', 'pubsub')
+        if host is not None:
+            self.transport = host.create_transport(agent_name, self.transport_name)
+        else:
+            self.transport = create_transport(
+                self.transport_name,
+                self.redis_client,
+                agent_name,
+                **transport_options_from_env(self.transport_name)
+            )
+        
         # Message handlers
         self.message_handlers: Dict[str, Callable] = {}
         self.is_running = False
         
+        # Handler latency / throughput instrumentation (AGENT_METRICS=1)
+        self.metrics = AgentMetrics.from_env(agent_name)
+        
+        # Handler execution pool (AGENT_EXECUTOR: thread | inline; "process" only per handler)
+        # with bounded priority lanes (AGENT_OVERFLOW_POLICY: block | drop_oldest | reject)
+        self.dispatcher = HandlerDispatcher(
+            executor=os.getenv('AGENT_EXECUTOR', 'thread'),
+            max_workers=int(os.getenv('AGENT_MAX_WORKERS', '4')),
+            ordered=os.getenv('AGENT_DISPATCH_MODE', 'unordered') == 'ordered',
+            name=agent_name,
+            capacity=int(os.getenv('AGENT_QUEUE_CAPACITY', '1000')),
+            overflow=os.getenv('AGENT_OVERFLOW_POLICY', 'block'),
+            on_pressure=self._on_backpressure,
+            metrics=self.metrics
+        )
+        for message_type in self.CONTROL_MESSAGE_TYPES:
+            self.dispatcher.configure(message_type, executor="inline", lane="high")
+        # Transport message ids whose handlers finished, acked by the listener
+        self._completed_ids = deque()
+        
         # Setup logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(f"Agent-{agent_name}")
         
-    def register_handler(self, message_type: str, handler: Callable):
-        """Register message handler for specific message type"""
+        # Outbound queue: messages and status updates go out in pipelines
+        if host is not None:
+            self.outbound = host.outbound
+        else:
+            self.outbound = OutboundQueue(
+                self.redis_client,
+                max_batch=int(os.getenv('AGENT_OUTBOUND_BATCH', '64')),
+                flush_interval_ms=float(os.getenv('AGENT_OUTBOUND_FLUSH_MS', '2')),
+                name=agent_name,
+                logger=self.logger,
+                metrics=self.metrics,
+                recover=self.state.recover_noscript
+            )
+        
+        # Outstanding request() futures by correlation id
+        self.pending_requests = PendingRequests(agent_name)
+        
+        # Sends to a role go to its least-loaded replica (or by affinity key)
+        self.replicas = ReplicaRegistry(self.redis_client)
+        self.router = ReplicaRouter(self.replicas)
+        self._load_reporter = LoadReporter(self.replicas.ttl_ms) if self.replica_id else None
+        
+        # Peers' backpressure flags: agent -> (expires, lanes)
+        self._backpressure_cache: Dict[str, tuple] = {}
+        
+        # Metrics snapshot on request, answered even while workers are busy
+        self.register_handler("metrics_request", lambda payload: self.metrics.snapshot(),
+                              executor="inline")
+        
+    def register_handler(self, message_type: str, handler: Callable,
+                         concurrency: Optional[int] = None, executor: Optional[str] = None,
+                         priority: Optional[str] = None):
+        """Register message handler for specific message type
+        
+        concurrency limits parallel runs of this type, executor overrides the
+        agent default ('inline', 'thread' or 'process'), priority picks the
+        inbound lane ('high', 'normal' or 'low'). A 'process' handler must be
+        picklable: a module-level function, not a bound method or lambda.
+        """
+        if executor == "process" and not process_safe(handler):
+            raise ValueError(f"Handler for {message_type} cannot run in a process: "
+                             f"use a module-level function, not {handler!r}")
         self.message_handlers[message_type] = handler
+        self.dispatcher.configure(message_type, concurrency=concurrency, executor=executor,
+                                  lane=priority)
+        
+    def send_message(self, to_agent: str, message_type: str, payload: Dict[str, Any],
+                     flush: bool = False, affinity: Optional[str] = None):
+        """Send message to another agent
         
-    def send_message(self, to_agent: str, message_type: str, payload: Dict[str, Any]):
-        """Send message to another agent"""
-        message = {
+        The message is queued and pipelined with other sends; flush=True sends
+        it (and everything queued before it) right away. If the target role
+        runs as replicas, the message goes to the least-loaded one, or to the
+        replica owning `affinity` (default: the payload's project_path).
+        """
+        self._send(self.router.route(to_agent, payload, affinity), message_type, payload, flush)
+    
+    def _envelope(self, to_agent: Any, message_type: str, payload: Any, **envelope: Any) -> Dict[str, Any]:
+        return {
             "from": self.agent_name,
             "to": to_agent,
             "type": message_type,
-            "timestamp": datetime.utcnow().isoformat(),
-            "payload": payload
+            "timestamp": epoch_ms(),
+            "payload": payload,
+            **envelope
         }
+    
+    def _send(self, to_agent: str, message_type: str, payload: Any, flush: bool = False,
+              **envelope: Any):
+        message = self._envelope(to_agent, message_type, payload, **envelope)
+        
+        try:
+            data = self.codecs.encode_for_agent(to_agent, message)
+            self.outbound.put(
+                lambda pipe: self.transport.send(to_agent, data, client=pipe),
+                f"📤 → {to_agent}: {message_type}",
+                flush=False
+            )
+            if self.metrics.enabled:
+                self.metrics.record_out(message_type)
+                self.metrics.record_redis_call()
+            self.update_status("active", f"Sent {message_type} to {to_agent}", flush=flush or None)
+        except Exception as e:
+            self.logger.error(f"❌ Message send failed: {e}")
+    
+    def broadcast(self, targets: Union[str, List[str]], message_type: str,
+                  payload: Dict[str, Any]) -> Dict[str, int]:
+        """Send one message to several agents in a single round-trip
+        
+        targets is a list of agent names, a capability from the agent config
+        or "*" for every configured agent except this one. A role running as
+        replicas gets the message on one replica, picked as in send_message().
+        The message is encoded once per negotiated codec and sent in one
+        pipeline. Returns the delivery count per target (0 = nobody received it).
+        """
+        names = config.resolve_targets(targets, exclude=self.role)
+        if not names:
+            self.logger.warning(f"No agents match broadcast target: {targets}")
+            return {}
+        message = self._envelope(names, message_type, payload)
+        
+        try:
+            addresses = {name: self.router.route(name, payload) for name in names}
+            frames = self.codecs.encode_for_agents(list(addresses.values()), message)
+            # Queued sends go first, so order per target is kept
+            self.outbound.flush()
+            sent = self._send_many(message_type, frames)
+            deliveries = {name: sent.get(address, 0) for name, address in addresses.items()}
+        except Exception as e:
+            self.logger.error(f"❌ Broadcast failed: {e}")
+            return {name: 0 for name in names}
+        
+        self.logger.info(f"📣 → {', '.join(names)}: {message_type}")
+        missed = [name for name, count in deliveries.items() if not count]
+        if missed:
+            self.logger.warning(f"⚠️ {message_type} not delivered to: {', '.join(missed)}")
+        self.update_status("active", f"Broadcast {message_type} to {len(names)} agents")
+        return deliveries
+    
+    def _send_many(self, message_type: str, frames: Dict[str, Any]) -> Dict[str, int]:
+        """transport.send_many() with out-counter and round-trip metrics"""
+        if not self.metrics.enabled:
+            return self.transport.send_many(frames)
+        started = time.perf_counter()
+        deliveries = self.transport.send_many(frames)
+        self.metrics.record_rtt((time.perf_counter() - started) * 1000)
+        self.metrics.record_out(message_type, len(frames))
+        self.metrics.record_redis_call(len(frames))
+        return deliveries
+    
+    def request(self, to_agent: str, message_type: str, payload: Dict[str, Any],
+                timeout: float = 30.0, affinity: Optional[str] = None) -> Future:
+        """Send a request and return a Future for the correlated reply
+        
+        The future fails with RequestTimeout after `timeout` seconds, or with
+        RemoteError if the remote handler raised or does not exist. Replica
+        routing as in send_message().
+        """
+        correlation_id, future = self.pending_requests.create(timeout)
+        self._send(self.router.route(to_agent, payload, affinity), message_type, payload,
+                   flush=True, correlation_id=correlation_id)
+        return future
+    
+    def request_many(self, targets: List[str], message_type: str, payload: Dict[str, Any],
+                     timeout: float = 30.0) -> Dict[str, Future]:
+        """Send the same request to several agents, one future per target
         
+        All requests go out in one round-trip; a target nobody is listening
+        for fails right away instead of waiting for the timeout.
+        """
+        futures, correlation_ids, frames, addresses = {}, {}, {}, {}
         try:
-            channel = f'agent_{to_agent}'
-            self.redis_client.publish(channel, json.dumps(message))
-            self.update_status("active", f"Sent {message_type} to {to_agent}")
-            self.logger.info(f"📤 → {to_agent}: {message_type}")
+            for target in targets:
+                correlation_ids[target], futures[target] = self.pending_requests.create(timeout)
+                address = addresses[target] = self.router.route(target, payload)
+                frames[address] = self.codecs.encode_for_agent(address, self._envelope(
+                    address, message_type, payload, correlation_id=correlation_ids[target]
+                ))
+            self.outbound.flush()
+            deliveries = self._send_many(message_type, frames)
         except Exception as e:
             self.logger.error(f"❌ Message send failed: {e}")
+            deliveries = {}
+        for target, correlation_id in correlation_ids.items():
+            if not deliveries.get(addresses.get(target)):
+                self.pending_requests.resolve(correlation_id, error=f"{message_type} not delivered to {target}")
+        self.update_status("active", f"Sent {message_type} to {len(deliveries)} agents")
+        return futures
     
-    def update_status(self, status: str, task: Optional[str] = None):
+    def gather(self, futures: Dict[str, Future], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Wait for request futures; values are reply payloads or exceptions"""
+        return gather(futures, timeout)
+    
+    def update_status(self, status: str, task: Optional[str] = None,
+                      flush: Optional[bool] = None):
         """Update agent status for MCP Bridge"""
         status_update = {
             "agent": self.agent_name,
             "status": status,
             "task": task,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": epoch_ms()
         }
         
         try:
-            self.redis_client.publish('agent_status_update', json.dumps(status_update))
+            data = self.codecs.encode_for_channel('agent_status_update', status_update)
+            
+            def op(pipe):
+                # State first, so readers woken by the publish see it
+                self.state.queue_status(pipe, self.agent_name, status, task,
+                                        updated_ms=status_update["timestamp"])
+                pipe.publish('agent_status_update', data)
+            
+            self.outbound.put(op, flush=flush)
+            if self.metrics.enabled:
+                self.metrics.record_redis_call(2)
         except Exception as e:
             self.logger.error(f"❌ Status update failed: {e}")
     
+    def flush(self) -> int:
+        """Send all queued messages now (one pipeline round-trip)"""
+        return self.outbound.flush()
+    
+    def dump_metrics(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """Metrics snapshot, also written as JSON to path or AGENT_METRICS_FILE if set
+        
+        '{agent}' in the path is replaced with the agent name.
+        """
+        path = path or os.getenv('AGENT_METRICS_FILE')
+        if path:
+            self.metrics.dump(path.format(agent=self.agent_name))
+        return self.metrics.snapshot()
+    
+    def is_backpressured(self, agent_name: str, max_age: float = 1.0) -> bool:
+        """True while one of the agent's inbound lanes is above its high watermark
+        
+        Senders of bulk work can check this and slow down; the flag is cached
+        for max_age seconds.
+        """
+        cached = self._backpressure_cache.get(agent_name)
+        if cached and cached[0] > time.monotonic():
+            return bool(cached[1])
+        try:
+            lanes = self.redis_client.hget(self.BACKPRESSURE_CHANNEL, agent_name)
+        except Exception as e:
+            self.logger.error(f"❌ Backpressure lookup failed: {e}")
+            lanes = None
+        self._backpressure_cache[agent_name] = (time.monotonic() + max_age, lanes)
+        return bool(lanes)
+    
+    def _report_load(self):
+        """Write our in-flight count to the replica registry (replicas only)"""
+        if self._load_reporter is None:
+            return
+        in_flight = self.dispatcher.in_flight()
+        if self._load_reporter.due(in_flight):
+            self.outbound.put(
+                lambda pipe: self.replicas.queue_report(pipe, self.role, self.replica_id, in_flight)
+            )
+    
+    def _on_backpressure(self, lane: str, high: bool, depth: int, capacity: int):
+        """Publish a lane crossing its high or low watermark"""
+        if high:
+            self.logger.warning(f"🚦 {lane} lane at {depth}/{capacity}, signalling backpressure")
+        else:
+            self.logger.info(f"🟢 {lane} lane drained to {depth}/{capacity}")
+        signal = {
+            "agent": self.agent_name,
+            "lane": lane,
+            "backpressure": high,
+            "depth": depth,
+            "capacity": capacity,
+            "timestamp": epoch_ms()
+        }
+        lanes = ",".join(self.dispatcher.pressured_lanes())
+        
+        def publish(pipe):
+            if lanes:
+                pipe.hset(self.BACKPRESSURE_CHANNEL, self.agent_name, lanes)
+            else:
+                pipe.hdel(self.BACKPRESSURE_CHANNEL, self.agent_name)
+            pipe.publish(self.BACKPRESSURE_CHANNEL,
+                         self.codecs.encode_for_channel(self.BACKPRESSURE_CHANNEL, signal))
+        
+        self.outbound.put(publish, flush=True)
+    
     def listen_for_messages(self):
         """Listen for incoming messages"""
         try:
-            pubsub = self.redis_client.pubsub()
-            pubsub.subscribe(f'agent_{self.agent_name}')
+            self.transport.subscribe()
+            self.codecs.advertise(self.agent_name)
+            self._report_load()
             
-            self.logger.info(f"👂 {self.agent_name} listening for messages...")
+            self.logger.info(f"👂 {self.agent_name} listening for messages ({self.transport_name})...")
             self.update_status("ready", "Waiting for tasks")
             
-            for message in pubsub.listen():
-                if message['type'] == 'message':
-                    try:
-                        data = json.loads(message['data'])
-                        message_type = data.get('type')
-                        payload = data.get('payload', {})
-                        from_agent = data.get('from')
-                        
-                        self.logger.info(f"📥 ← {from_agent}: {message_type}")
-                        
-                        if message_type in self.message_handlers:
-                            self.update_status("working", f"Processing {message_type}")
-                            result = self.message_handlers[message_type](payload)
-                            
-                            # Send response if handler returns something
-                            if result:
-                                self.send_message(from_agent, f"{message_type}_response", result)
-                        else:
-                            self.logger.warning(f"No handler for message type: {message_type}")
-                            
-                    except json.JSONDecodeError:
-                        self.logger.warning("Invalid JSON message received")
-                    except Exception as e:
-                        self.logger.error(f"Message processing error: {e}")
-                        self.update_status("error", str(e))
+            while self.is_running:
+                batch = self.transport.read_batch()
+                for message_id, raw_message in batch:
+                    self.process_message(raw_message, message_id)
+                self._ack_completed()
+                self._report_load()
                         
         except KeyboardInterrupt:
             self.logger.info(f"🛑 {self.agent_name} stopped by user")
         except Exception as e:
             self.logger.error(f"❌ Listen error: {e}")
         finally:
+            self.dispatcher.shutdown(wait=True)
+            self._ack_completed()
+            self.transport.close()
+            self.pending_requests.fail_all(f"{self.agent_name} stopped")
+            if self.replica_id:
+                self.outbound.put(lambda pipe: self.replicas.queue_remove(pipe, self.role, self.replica_id))
+            if self.metrics.enabled:
+                try:
+                    self.dump_metrics()
+                except Exception as e:
+                    self.logger.error(f"❌ Metrics dump failed: {e}")
             self.update_status("offline", "Agent stopped")
+            if self.host is None:
+                self.outbound.close()
+            else:
+                self.outbound.flush()
+    
+    def _ack_completed(self):
+        """Ack all messages whose handlers finished (at-least-once delivery)"""
+        message_ids = []
+        while self._completed_ids:
+            message_ids.append(self._completed_ids.popleft())
+        self.transport.ack(message_ids)
+    
+    def process_message(self, raw_message: Any, message_id: Optional[str] = None):
+        """Decode one raw message and dispatch it to its handler"""
+        correlation_id = None
+        try:
+            data = decode(raw_message)
+            message_type = data.get('type')
+            payload = data.get('payload', {})
+            from_agent = data.get('from')
+            correlation_id = data.get('correlation_id')
+            
+            if data.get('reply'):
+                # Replies go straight to the waiting future, never to a handler
+                if not self.pending_requests.resolve(correlation_id, payload, data.get('error')):
+                    self.logger.debug(f"Late or unknown reply from {from_agent}: {message_type}")
+            elif data.get('nack'):
+                self.on_nack(from_agent, payload.get('type'), payload.get('reason'))
+            elif message_type in self.message_handlers:
+                self.logger.info(f"📥 ← {from_agent}: {message_type}")
+                self.update_status("working", f"Processing {message_type}")
+                sent_ms = data.get('timestamp')
+                self.dispatcher.submit(
+                    message_type,
+                    self.message_handlers[message_type],
+                    payload,
+                    lambda result, error: self._handler_done(
+                        message_type, from_agent, message_id, correlation_id, result, error
+                    ),
+                    sent_ms=sent_ms if isinstance(sent_ms, (int, float)) else None
+                )
+                # _handler_done completes the message
+                return
+            else:
+                self.logger.warning(f"No handler for message type: {message_type}")
+                if correlation_id:
+                    self._reply(from_agent, message_type, correlation_id,
+                                error=f"No handler for message type: {message_type}")
+                
+        except CodecError:
+            self.logger.warning("Invalid message received")
+        except Exception as e:
+            self.logger.error(f"Message processing error: {e}")
+            self.update_status("error", str(e))
+            if correlation_id:
+                self._reply(from_agent, message_type, correlation_id, error=str(e))
+        
+        if message_id:
+            self._completed_ids.append(message_id)
+    
+    def _handler_done(self, message_type: str, from_agent: str, message_id: Optional[str],
+                      correlation_id: Optional[str], result: Any, error: Optional[BaseException]):
+        """Called once a handler finished, on the thread that ran it"""
+        try:
+            if isinstance(error, QueueFull):
+                # Dropped or rejected before it ran
+                self._nack(from_agent, message_type, correlation_id, str(error))
+                return
+            if error is not None:
+                self.logger.error(f"Message processing error ({message_type}): {error}")
+                self.update_status("error", str(error))
+            if correlation_id:
+                self._reply(from_agent, message_type, correlation_id, result,
+                            None if error is None else str(error))
+            elif error is None and result:
+                # Send response if handler returns something
+                self.send_message(from_agent, f"{message_type}_response", result)
+        finally:
+            if message_id:
+                self._completed_ids.append(message_id)
+    
+    def _reply(self, to_agent: str, message_type: str, correlation_id: str,
+               result: Any = None, error: Optional[str] = None):
+        """Send the correlated reply for a request()"""
+        envelope = {"correlation_id": correlation_id, "reply": True}
+        if error is not None:
+            envelope["error"] = error
+        self._send(to_agent, f"{message_type}_response", result, flush=True, **envelope)
+    
+    def _nack(self, to_agent: str, message_type: str, correlation_id: Optional[str], reason: str):
+        """Tell the sender its message was dropped or rejected unprocessed"""
+        self.logger.warning(f"🚫 {message_type} from {to_agent} not processed: {reason}")
+        if correlation_id:
+            # request() callers get a RemoteError right away instead of a timeout
+            self._reply(to_agent, message_type, correlation_id, error=reason)
+        else:
+            self._send(to_agent, f"{message_type}_nack", {"type": message_type, "reason": reason},
+                       nack=True)
+    
+    def on_nack(self, from_agent: str, message_type: str, reason: str):
+        """Override to retry or slow down when a peer dropped one of our messages"""
+        self.logger.warning(f"🚫 {from_agent} did not process {message_type}: {reason}")
     
     def start(self):
         """Start the agent"""
@@ -127,4 +516,4 @@ class BaseAgent:
     def stop(self):
         """Stop the agent"""
         self.is_running = False
-        self.update_status("stopping", "Agent shutdown")
+        self.update_status("stopping", "Agent shutdown", flush=True)
@@ -0,0 +1,221 @@
+"""
+Message Codecs - JSON (Default), kompaktes Binärformat und Kompression
+
+Wire format:
+- plain JSON text, unchanged from before, for uncompressed JSON
+- framed: 0x00 | codec id (1 byte) | flags (1 byte) | body
+
+A frame never starts with '{', so decode() tells the two apart and every
+receiver can read every sender. Flag 0x01 means the body is zlib-compressed.
+"""
+
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional binary codec
+    msgpack = None
+
+FRAME_MAGIC = b"\x00"
+FLAG_ZLIB = 0x01
+
+
+class CodecError(ValueError):
+    """Raised when a message cannot be encoded or decoded"""
+
+
+def epoch_ms() -> int:
+    """Envelope timestamp: integer milliseconds since the epoch"""
+    return int(time.time() * 1000)
+
+
+class JsonCodec:
+    name = "json"
+    codec_id = b"j"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    codec_id = b"m"
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS = {JsonCodec.name: JsonCodec()}
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec()
+
+_CODECS_BY_ID = {codec.codec_id: codec for codec in CODECS.values()}
+
+
+def get_codec(name: str):
+    try:
+        return CODECS[name]
+    except KeyError:
+        hint = " (pip install msgpack)" if name == MsgpackCodec.name else ""
+        raise CodecError(f"Codec not available: {name}{hint}")
+
+
+def encode(obj: Any, codec: str = "json", compress_threshold: int = 0) -> bytes:
+    """Encode obj; bodies of at least compress_threshold bytes are zlib-compressed (0 = off)"""
+    message_codec = get_codec(codec)
+    try:
+        body = message_codec.dumps(obj)
+    except (TypeError, ValueError) as e:
+        raise CodecError(f"Cannot encode message with {codec}: {e}") from e
+
+    flags = 0
+    if compress_threshold and len(body) >= compress_threshold:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_ZLIB
+    if message_codec.name == JsonCodec.name and not flags:
+        return body
+    return FRAME_MAGIC + message_codec.codec_id + bytes((flags,)) + body
+
+
+def decode(data: Union[bytes, str]) -> Any:
+    """Decode a plain JSON or framed message"""
+    try:
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data.startswith(FRAME_MAGIC):
+            return json.loads(data)
+
+        message_codec = _CODECS_BY_ID.get(data[1:2])
+        if message_codec is None:
+            raise CodecError(f"Unsupported codec id: {data[1:2]!r}")
+        body = data[3:]
+        if data[2] & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        return message_codec.loads(body)
+    except CodecError:
+        raise
+    except Exception as e:
+        raise CodecError(f"Invalid message: {e}") from e
+
+
+class ChannelCodecs:
+    """
+    Chooses the codec per channel.
+
+    Agents advertise the codecs they can decode in the `agent_codecs` hash
+    (preferred first). A sender uses its preferred codec for `agent_<name>`
+    when the target advertises it and falls back to JSON otherwise. Lookups
+    are cached for `cache_ttl` seconds. Other channels (agent_status_update,
+    coordination_command, ...) use JSON unless overridden, since their
+    readers do not advertise.
+    """
+
+    REGISTRY_KEY = "agent_codecs"
+
+    def __init__(self, redis_client, preferred: str = "json",
+                 overrides: Optional[Dict[str, str]] = None, compress_threshold: int = 0,
+                 cache_ttl: float = 60.0):
+        get_codec(preferred)
+        self.redis_client = redis_client
+        self.preferred = preferred
+        self.overrides = overrides or {}
+        self.compress_threshold = compress_threshold
+        self.cache_ttl = cache_ttl
+        self._peer_cache: Dict[str, Tuple[float, List[str]]] = {}
+
+    @classmethod
+    def from_env(cls, redis_client) -> "ChannelCodecs":
+        """AGENT_CODEC, AGENT_CODEC_CHANNELS (channel=codec,...), AGENT_COMPRESS_THRESHOLD"""
+        overrides = {}
+        for item in os.getenv("AGENT_CODEC_CHANNELS", "").split(","):
+            if "=" in item:
+                channel, codec = item.split("=", 1)
+                overrides[channel.strip()] = codec.strip()
+        return cls(
+            redis_client,
+            preferred=os.getenv("AGENT_CODEC", "json"),
+            overrides=overrides,
+            compress_threshold=int(os.getenv("AGENT_COMPRESS_THRESHOLD", "0")),
+        )
+
+    def supported(self) -> List[str]:
+        """Codecs this process decodes, preferred first"""
+        return [self.preferred] + [name for name in CODECS if name != self.preferred]
+
+    def advertise(self, agent_name: str):
+        self.redis_client.hset(self.REGISTRY_KEY, agent_name, ",".join(self.supported()))
+
+    async def async_advertise(self, agent_name: str):
+        await self.redis_client.hset(self.REGISTRY_KEY, agent_name, ",".join(self.supported()))
+
+    def encode_for_channel(self, channel: str, obj: Any) -> bytes:
+        return encode(obj, self.overrides.get(channel, JsonCodec.name), self.compress_threshold)
+
+    def codec_for_agent(self, agent_name: str) -> str:
+        codec = self._agent_codec(agent_name)
+        if codec is None:
+            codec = self._choose(self._store_peer(
+                agent_name, self.redis_client.hget(self.REGISTRY_KEY, agent_name)
+            ))
+        return codec
+
+    async def async_codec_for_agent(self, agent_name: str) -> str:
+        codec = self._agent_codec(agent_name)
+        if codec is None:
+            codec = self._choose(self._store_peer(
+                agent_name, await self.redis_client.hget(self.REGISTRY_KEY, agent_name)
+            ))
+        return codec
+
+    def encode_for_agent(self, agent_name: str, obj: Any) -> bytes:
+        return encode(obj, self.codec_for_agent(agent_name), self.compress_threshold)
+
+    async def async_encode_for_agent(self, agent_name: str, obj: Any) -> bytes:
+        return encode(obj, await self.async_codec_for_agent(agent_name), self.compress_threshold)
+
+    def encode_for_agents(self, agent_names: List[str], obj: Any) -> Dict[str, bytes]:
+        """Encode obj once per negotiated codec, not once per agent"""
+        return self._encode_grouped({name: self.codec_for_agent(name) for name in agent_names}, obj)
+
+    async def async_encode_for_agents(self, agent_names: List[str], obj: Any) -> Dict[str, bytes]:
+        return self._encode_grouped(
+            {name: await self.async_codec_for_agent(name) for name in agent_names}, obj
+        )
+
+    def _encode_grouped(self, codec_by_agent: Dict[str, str], obj: Any) -> Dict[str, bytes]:
+        frames: Dict[str, bytes] = {}
+        for codec in set(codec_by_agent.values()):
+            frames[codec] = encode(obj, codec, self.compress_threshold)
+        return {name: frames[codec] for name, codec in codec_by_agent.items()}
+
+    def _agent_codec(self, agent_name: str) -> Optional[str]:
+        """Codec from override or cache, None if the peer must be looked up"""
+        override = self.overrides.get(f"agent_{agent_name}")
+        if override:
+            return override
+        if self.preferred == JsonCodec.name:
+            return JsonCodec.name
+        cached = self._peer_cache.get(agent_name)
+        if cached and cached[0] > time.monotonic():
+            return self._choose(cached[1])
+        return None
+
+    def _store_peer(self, agent_name: str, advertised) -> List[str]:
+        if isinstance(advertised, bytes):
+            advertised = advertised.decode("utf-8")
+        peer_codecs = advertised.split(",") if advertised else [JsonCodec.name]
+        self._peer_cache[agent_name] = (time.monotonic() + self.cache_ttl, peer_codecs)
+        return peer_codecs
+
+    def _choose(self, peer_codecs: List[str]) -> str:
+        return self.preferred if self.preferred in peer_codecs else JsonCodec.name
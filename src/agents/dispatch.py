@@ -0,0 +1,352 @@
+"""
+Handler Dispatcher - führt Message Handler parallel in einem Executor aus
+"""
+
+import inspect
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# callback(result, error) - läuft im Worker- bzw. Executor-Thread
+DoneCallback = Callable[[Any, Optional[BaseException]], None]
+# on_pressure(lane, high, depth, capacity)
+PressureCallback = Callable[[str, bool, int, int], None]
+
+EXECUTOR_KINDS = ("inline", "thread", "process")
+# "process" nur pro Message-Type, nie als Default für alle Handler
+DEFAULT_EXECUTOR_KINDS = ("inline", "thread")
+# Priority lanes, highest first
+LANES = ("high", "normal", "low")
+OVERFLOW_POLICIES = ("block", "drop_oldest", "reject")
+
+
+def process_safe(handler: Callable) -> bool:
+    """True if the handler can be pickled by reference into a worker process"""
+    if inspect.ismethod(handler) or not inspect.isfunction(handler):
+        return False
+    # lambdas and nested functions cannot be looked up by qualified name
+    return "<" not in handler.__qualname__
+
+
+class QueueFull(Exception):
+    """The message was dropped or rejected because its lane was full"""
+
+
+class _Job:
+    __slots__ = ("seq", "message_type", "handler", "payload", "callback", "sent_ms", "started")
+
+    def __init__(self, seq: int, message_type: str, handler: Callable, payload: Any,
+                 callback: DoneCallback, sent_ms: Optional[float] = None):
+        self.seq = seq
+        self.message_type = message_type
+        self.handler = handler
+        self.payload = payload
+        self.callback = callback
+        self.sent_ms = sent_ms
+        self.started = 0.0
+
+
+class HandlerDispatcher:
+    """
+    Runs handlers off the listener thread with priority lanes and limits.
+
+    - executor "inline" runs on the calling (listener) thread, for cheap
+      control messages that must answer even while workers are busy
+    - executor "thread" uses a shared ThreadPoolExecutor
+    - executor "process" uses a ProcessPoolExecutor; the handler and its
+      payload must be picklable, so use module-level functions, not bound
+      agent methods (the agent holds a Redis connection). It can only be
+      configured per message type, never as the default executor
+
+    Waiting jobs sit in bounded lanes (high, normal, low). A free worker
+    always takes from the highest non-empty lane, FIFO per message type.
+    At most `limit` handlers of one type run at the same time; in ordered
+    mode the limit is 1 for every type, so messages of one type complete
+    in arrival order.
+
+    When a lane is full the overflow policy applies: "block" makes submit()
+    wait (and with it the listener, so streams entries stay in Redis and
+    higher lanes wait too), "drop_oldest" evicts the oldest waiting
+    job, "reject" refuses the new one. Evicted and refused jobs get
+    callback(None, QueueFull). on_pressure fires when a lane crosses its
+    high watermark and again once it drained below the low watermark.
+
+    With an enabled AgentMetrics, queue wait (from sent_ms, the sender's
+    timestamp) is recorded when a handler starts and execution time when
+    it finishes. Without one the hot path only pays a None check.
+    """
+
+    def __init__(self, executor: str = "thread", max_workers: int = 4, ordered: bool = False,
+                 name: str = "agent", capacity: int = 1000, overflow: str = "block",
+                 on_pressure: Optional[PressureCallback] = None,
+                 high_watermark: float = 0.8, low_watermark: float = 0.5, metrics=None):
+        if executor not in DEFAULT_EXECUTOR_KINDS:
+            raise ValueError(f"Default executor must be one of {DEFAULT_EXECUTOR_KINDS}, got: {executor}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.default_executor = executor
+        self.max_workers = max_workers
+        self.ordered = ordered
+        self.name = name
+        self.logger = logging.getLogger(f"Dispatch-{name}")
+        self.on_pressure = on_pressure
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.metrics = metrics if metrics is not None and metrics.enabled else None
+
+        self._limits: Dict[str, int] = {}
+        self._executors: Dict[str, str] = {}
+        self._lane_of: Dict[str, str] = {}
+        self._capacity: Dict[str, int] = {lane: capacity for lane in LANES}
+        self._overflow: Dict[str, str] = {lane: overflow for lane in LANES}
+        # lane -> message_type -> waiting jobs; OrderedDict rotates for fairness
+        self._lanes: Dict[str, "OrderedDict[str, Deque[_Job]]"] = {lane: OrderedDict() for lane in LANES}
+        self._depth: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._pressure: Dict[str, bool] = {lane: False for lane in LANES}
+        self._running: Dict[str, int] = defaultdict(int)
+        self._total_running = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+
+    def configure(self, message_type: str, concurrency: Optional[int] = None,
+                  executor: Optional[str] = None, lane: Optional[str] = None):
+        """Set concurrency limit, executor kind and/or priority lane for one message type"""
+        if concurrency is not None:
+            if concurrency < 1:
+                raise ValueError("concurrency must be >= 1")
+            self._limits[message_type] = concurrency
+        if executor is not None:
+            if executor not in EXECUTOR_KINDS:
+                raise ValueError(f"Unknown executor: {executor}")
+            self._executors[message_type] = executor
+        if lane is not None:
+            if lane not in LANES:
+                raise ValueError(f"Unknown lane: {lane}")
+            self._lane_of[message_type] = lane
+
+    def configure_lane(self, lane: str, capacity: Optional[int] = None,
+                       overflow: Optional[str] = None):
+        """Set capacity and/or overflow policy of one lane"""
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+        if capacity is not None:
+            if capacity < 1:
+                raise ValueError("capacity must be >= 1")
+            self._capacity[lane] = capacity
+        if overflow is not None:
+            if overflow not in OVERFLOW_POLICIES:
+                raise ValueError(f"Unknown overflow policy: {overflow}")
+            self._overflow[lane] = overflow
+
+    def executor_for(self, message_type: str) -> str:
+        return self._executors.get(message_type, self.default_executor)
+
+    def lane_for(self, message_type: str) -> str:
+        return self._lane_of.get(message_type, "normal")
+
+    def limit_for(self, message_type: str) -> int:
+        if self.ordered:
+            return 1
+        return self._limits.get(message_type, self.max_workers)
+
+    def submit(self, message_type: str, handler: Callable, payload: Any, callback: DoneCallback,
+               sent_ms: Optional[float] = None):
+        """Queue handler(payload) and report the outcome through callback
+
+        sent_ms is the sender's epoch-ms timestamp, used for the queue wait metric.
+        """
+        job = _Job(next(self._seq), message_type, handler, payload, callback, sent_ms)
+
+        if self.executor_for(message_type) == "inline":
+            self._run_inline(job)
+            return
+
+        lane = self.lane_for(message_type)
+        evicted: List[_Job] = []
+        with self._cond:
+            while self._depth[lane] >= self._capacity[lane]:
+                if self._closed:
+                    raise RuntimeError("dispatcher is shut down")
+                policy = self._overflow[lane]
+                if policy == "block":
+                    self._cond.wait()
+                elif policy == "drop_oldest":
+                    evicted.append(self._pop_oldest(lane))
+                else:
+                    evicted.append(job)
+                    job = None
+                    break
+            if job is not None:
+                self._lanes[lane].setdefault(message_type, deque()).append(job)
+                self._depth[lane] += 1
+            ready = self._take_ready()
+            pressure = self._check_pressure(lane)
+
+        for dropped in evicted:
+            if self.metrics is not None:
+                self.metrics.record_error(dropped.message_type)
+            dropped.callback(None, QueueFull(f"{lane} lane full ({self._overflow[lane]})"))
+        if pressure is not None:
+            self._notify_pressure(lane, *pressure)
+        for ready_job in ready:
+            self._start(ready_job)
+
+    def _pop_oldest(self, lane: str) -> _Job:
+        queues = self._lanes[lane]
+        message_type = min((t for t, q in queues.items() if q), key=lambda t: queues[t][0].seq)
+        self._depth[lane] -= 1
+        return queues[message_type].popleft()
+
+    def _take_ready(self) -> List[_Job]:
+        """Pop runnable jobs by lane priority while workers are free (lock held)"""
+        ready: List[_Job] = []
+        for lane in LANES:
+            queues = self._lanes[lane]
+            progressed = True
+            while progressed and self._total_running < self.max_workers and self._depth[lane]:
+                progressed = False
+                for message_type in list(queues):
+                    waiting = queues[message_type]
+                    if not waiting:
+                        del queues[message_type]
+                        continue
+                    if self._running[message_type] >= self.limit_for(message_type):
+                        continue
+                    ready.append(waiting.popleft())
+                    self._depth[lane] -= 1
+                    self._running[message_type] += 1
+                    self._total_running += 1
+                    queues.move_to_end(message_type)
+                    progressed = True
+                    break
+        if ready:
+            # Platz in den Lanes: blockierte submit() Aufrufe wecken
+            self._cond.notify_all()
+        return ready
+
+    def _check_pressure(self, lane: str) -> Optional[Tuple[bool, int, int]]:
+        """Watermark crossing for one lane (lock held), None if unchanged"""
+        depth, capacity = self._depth[lane], self._capacity[lane]
+        if not self._pressure[lane] and depth >= capacity * self.high_watermark:
+            self._pressure[lane] = True
+        elif self._pressure[lane] and depth <= capacity * self.low_watermark:
+            self._pressure[lane] = False
+        else:
+            return None
+        return self._pressure[lane], depth, capacity
+
+    def _notify_pressure(self, lane: str, high: bool, depth: int, capacity: int):
+        if self.on_pressure is not None:
+            try:
+                self.on_pressure(lane, high, depth, capacity)
+            except Exception as e:
+                self.logger.error(f"❌ Backpressure callback failed for {lane} lane: {e}")
+
+    def _run_inline(self, job: _Job):
+        metrics = self.metrics
+        if metrics is not None:
+            self._record_start(job)
+        try:
+            if metrics is None:
+                result = job.handler(job.payload)
+            else:
+                result = metrics.run_as(job.message_type, job.handler, job.payload)
+        except Exception as e:
+            self._record_end(job, True)
+            job.callback(None, e)
+            return
+        self._record_end(job, False)
+        job.callback(result, None)
+
+    def _record_start(self, job: _Job):
+        now_ms = time.time() * 1000
+        self.metrics.record_in(job.message_type, now_ms - (job.sent_ms or now_ms))
+        job.started = time.perf_counter()
+
+    def _record_end(self, job: _Job, error: bool):
+        if self.metrics is not None:
+            self.metrics.record_exec(job.message_type, (time.perf_counter() - job.started) * 1000, error)
+
+    def _pool(self, message_type: str):
+        if self._closed:
+            raise RuntimeError("dispatcher is shut down")
+        if self.executor_for(message_type) == "process":
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=f"{self.name}-handler"
+            )
+        return self._thread_pool
+
+    def _start(self, job: _Job):
+        handler = job.handler
+        if self.metrics is not None:
+            self._record_start(job)
+            if self.executor_for(job.message_type) != "process":
+                # Prozess-Handler müssen picklebar bleiben
+                handler = partial(self.metrics.run_as, job.message_type, handler)
+        try:
+            future = self._pool(job.message_type).submit(handler, job.payload)
+        except Exception as e:
+            # z.B. Pool bereits heruntergefahren
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda f: self._finish(job, f))
+
+    def _finish(self, job: _Job, future: Future):
+        try:
+            error = future.exception()
+            self._record_end(job, error is not None)
+            job.callback(None if error else future.result(), error)
+        finally:
+            with self._cond:
+                self._running[job.message_type] -= 1
+                self._total_running -= 1
+                ready = self._take_ready()
+                changes = [(lane, self._check_pressure(lane)) for lane in LANES]
+            for lane, pressure in changes:
+                if pressure is not None:
+                    self._notify_pressure(lane, *pressure)
+            for ready_job in ready:
+                self._start(ready_job)
+
+    def in_flight(self) -> int:
+        """Handlers currently running or waiting in a lane"""
+        with self._cond:
+            return self._total_running + sum(self._depth.values())
+
+    def depths(self) -> Dict[str, int]:
+        """Waiting jobs per lane"""
+        with self._cond:
+            return dict(self._depth)
+
+    def pressured_lanes(self) -> List[str]:
+        """Lanes currently above their high watermark"""
+        with self._cond:
+            return [lane for lane in LANES if self._pressure[lane]]
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work; with wait=True running and queued handlers finish first"""
+        if wait:
+            with self._cond:
+                while self._total_running or any(self._depth.values()):
+                    self._cond.wait(0.1)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+        self._thread_pool = None
+        self._process_pool = None
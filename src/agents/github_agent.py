@@ -12,14 +12,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from agents.base_agent import BaseAgent
 
 class GitHubAgent(BaseAgent):
-    def __init__(self):
-        super().__init__("github", "GitHub MCP Integration Specialist")
+    def __init__(self, **kwargs):
+        super().__init__("github", "GitHub MCP Integration Specialist", **kwargs)
         
     def setup(self):
         """Setup GitHub Agent handlers"""
         self.register_handler("initialize", self.handle_initialize)
         self.register_handler("setup_repository", self.handle_setup_repository)
-        self.register_handler("status_request", self.handle_status_request)
+        self.register_handler("status_request", self.handle_status_request, priority="high")
         
         print("🐙 GitHub Agent ready!")
         print("🎯 Specializing in: GitHub MCP Server + Repository Management")
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Agent Host - mehrere Agents in einem Prozess
+
+Alle Agents teilen sich einen Redis Connection Pool, eine Outbound Queue
+und eine Pub/Sub Connection, auf der die Channels aller gehosteten Agents
+abonniert sind. Nachrichten zwischen Agents im selben Prozess werden direkt
+in die Inbox des Empfängers gelegt und gehen nicht über Redis.
+
+Usage:
+    python src/agents/host.py ui leaflet github
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import redis
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.metrics import AgentMetrics
+from agents.outbound import OutboundQueue
+from agents.state_store import AgentStateStore
+from agents.transport import (
+    PubSubTransport,
+    RawMessage,
+    create_transport,
+    transport_options_from_env,
+)
+
+
+class HostTransport:
+    """Pub/Sub transport for an agent running inside an AgentHost"""
+
+    name = "host"
+
+    def __init__(self, host: "AgentHost", agent_name: str, batch_size: int = 100,
+                 block_ms: int = 1000):
+        self.host = host
+        self.agent_name = agent_name
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.inbox: Optional[queue.Queue] = None
+
+    def send(self, to_agent: str, data: Any, client=None):
+        """Deliver in-process when the target is hosted here, else PUBLISH"""
+        if self.host.deliver_local(to_agent, data):
+            return
+        (client or self.host.redis_client).publish(PubSubTransport.channel_for(to_agent), data)
+
+    def send_many(self, messages: Dict[str, Any]) -> Dict[str, int]:
+        """Local targets get the message directly, the rest share one pipeline"""
+        deliveries = {
+            to_agent: 1 for to_agent, data in messages.items()
+            if self.host.deliver_local(to_agent, data)
+        }
+        remote = {to_agent: data for to_agent, data in messages.items() if to_agent not in deliveries}
+        if remote:
+            pipe = self.host.redis_client.pipeline(transaction=False)
+            for to_agent, data in remote.items():
+                pipe.publish(PubSubTransport.channel_for(to_agent), data)
+            deliveries.update(PubSubTransport.delivery_counts(remote, pipe.execute(raise_on_error=False)))
+        return {to_agent: deliveries[to_agent] for to_agent in messages}
+
+    def subscribe(self):
+        self.inbox = self.host.subscribe(self.agent_name)
+
+    def read_batch(self) -> List[RawMessage]:
+        try:
+            batch: List[RawMessage] = [(None, self.inbox.get(timeout=self.block_ms / 1000))]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append((None, self.inbox.get_nowait()))
+            except queue.Empty:
+                break
+        return batch
+
+    def ack(self, message_ids: List[str]):
+        pass
+
+    def close(self):
+        self.host.unsubscribe(self.agent_name)
+        self.inbox = None
+
+
+class AgentHost:
+    """Runs several BaseAgent subclasses in one interpreter"""
+
+    # Backoff of the shared listener after a Redis error, doubled per failure
+    RECONNECT_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 5.0
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.redis_url = redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379')
+        self.pool = redis.ConnectionPool.from_url(self.redis_url)
+        self.redis_client = redis.Redis(connection_pool=self.pool)
+
+        self.logger = logging.getLogger("AgentHost")
+        # Round-trip times of the shared pipeline (AGENT_METRICS=1)
+        self.metrics = AgentMetrics.from_env("host")
+        self.outbound = OutboundQueue(
+            self.redis_client,
+            max_batch=int(os.getenv('AGENT_OUTBOUND_BATCH', '64')),
+            flush_interval_ms=float(os.getenv('AGENT_OUTBOUND_FLUSH_MS', '2')),
+            name="host",
+            logger=self.logger,
+            metrics=self.metrics,
+            # Status writes of all hosted agents go through this pipeline
+            recover=AgentStateStore(self.redis_client).recover_noscript
+        )
+
+        self.agents: Dict[str, Any] = {}
+        self._inboxes: Dict[str, queue.Queue] = {}
+        self._lock = threading.Lock()
+        self._subscription_changes: "queue.Queue" = queue.Queue()
+        self._pubsub = None
+        self._listener: Optional[threading.Thread] = None
+        self.is_running = False
+
+    # ------------------------------------------------------------------
+    # Used by BaseAgent
+    # ------------------------------------------------------------------
+    def create_transport(self, agent_name: str, transport_name: str):
+        """Multiplexed pub/sub for hosted agents; streams keep their own reads"""
+        options = transport_options_from_env(transport_name)
+        if transport_name == PubSubTransport.name:
+            return HostTransport(self, agent_name, **options)
+        return create_transport(transport_name, self.redis_client, agent_name, **options)
+
+    def subscribe(self, agent_name: str) -> queue.Queue:
+        channel = PubSubTransport.channel_for(agent_name)
+        with self._lock:
+            inbox = self._inboxes.setdefault(channel, queue.Queue())
+        self._subscription_changes.put(("subscribe", channel))
+        self._ensure_listener()
+        return inbox
+
+    def unsubscribe(self, agent_name: str):
+        channel = PubSubTransport.channel_for(agent_name)
+        with self._lock:
+            self._inboxes.pop(channel, None)
+        self._subscription_changes.put(("unsubscribe", channel))
+
+    def deliver_local(self, agent_name: str, data: Any) -> bool:
+        """Put data into a hosted agent's inbox; False if the agent is not here"""
+        with self._lock:
+            inbox = self._inboxes.get(PubSubTransport.channel_for(agent_name))
+        if inbox is None:
+            return False
+        inbox.put(data)
+        return True
+
+    # ------------------------------------------------------------------
+    # Shared subscription
+    # ------------------------------------------------------------------
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self.is_running = True
+            self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            self._listener = threading.Thread(target=self._listen, name="host-listener", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        """One connection for all hosted channels, dispatched to local inboxes"""
+        # PubSub ist nicht thread-safe: (un)subscribe nur in diesem Thread
+        delay = self.RECONNECT_DELAY
+        broken = False
+        while self.is_running:
+            try:
+                if broken:
+                    self._resubscribe()
+                    broken = False
+                self._apply_subscription_changes()
+                message = self._pubsub.get_message(timeout=0.2)
+            except Exception as e:
+                self.logger.error(f"❌ Host listen error, resubscribing in {delay:.1f}s: {e}")
+                broken = True
+                time.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+                continue
+            delay = self.RECONNECT_DELAY
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            with self._lock:
+                inbox = self._inboxes.get(channel)
+            if inbox is not None:
+                inbox.put(message["data"])
+        self._pubsub.close()
+
+    def _resubscribe(self):
+        """Fresh pub/sub connection for all hosted channels after a listen error"""
+        try:
+            self._pubsub.close()
+        except Exception as e:
+            self.logger.debug(f"Closing the broken pub/sub connection failed: {e}")
+        self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        with self._lock:
+            channels = list(self._inboxes)
+        if channels:
+            self._pubsub.subscribe(*channels)
+            self.logger.info(f"🔄 Host listener resubscribed to {len(channels)} channels")
+
+    def _apply_subscription_changes(self):
+        while True:
+            try:
+                action, channel = self._subscription_changes.get_nowait()
+            except queue.Empty:
+                return
+            if action == "subscribe":
+                self._pubsub.subscribe(channel)
+            else:
+                self._pubsub.unsubscribe(channel)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def add(self, agent_cls, **kwargs):
+        """Instantiate an agent class bound to this host"""
+        agent = agent_cls(host=self, **kwargs)
+        self.agents[agent.agent_name] = agent
+        return agent
+
+    def run(self, foreground: Optional[str] = None):
+        """Start all agents in threads; `foreground` runs on the calling thread"""
+        threads = []
+        for name, agent in self.agents.items():
+            if name == foreground:
+                continue
+            thread = threading.Thread(target=agent.start, name=f"agent-{name}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        try:
+            if foreground:
+                self.agents[foreground].start()
+            else:
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            self.logger.info("🛑 Agent host stopped by user")
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join(timeout=5.0)
+            self.close()
+
+    def stop(self):
+        """Ask all hosted agents to stop"""
+        for agent in self.agents.values():
+            if agent.is_running:
+                agent.stop()
+
+    def close(self):
+        """Stop the shared listener and flush the shared outbound queue"""
+        self.is_running = False
+        if self._listener is not None:
+            self._listener.join(timeout=5.0)
+        self.outbound.close()
+
+
+def main():
+    from agents.main_agent import MainAgent
+    from agents.ui_agent import UIAgent
+    from agents.leaflet_agent import LeafletAgent
+    from agents.github_agent import GitHubAgent
+
+    agent_classes = {
+        "main": MainAgent,
+        "ui": UIAgent,
+        "leaflet": LeafletAgent,
+        "github": GitHubAgent,
+    }
+    names = sys.argv[1:] or ["ui", "leaflet", "github"]
+    unknown = [name for name in names if name not in agent_classes]
+    if unknown:
+        print(f"❌ Unknown agents: {', '.join(unknown)} (available: {', '.join(agent_classes)})")
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO)
+    host = AgentHost()
+    for name in names:
+        host.add(agent_classes[name])
+
+    print(f"🏠 Agent host running: {', '.join(names)}")
+    # MainAgent braucht stdin für den interaktiven Modus
+    host.run(foreground="main" if "main" in names else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Status Journal - append-only JSONL Events unter dem Redis State Store, Compaction beim Memory-Export
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from agents.state_store import ACTIVE_STATUSES, MAX_TASKS, write_json_atomic
+
+# apply(state, event) - mutates state in place
+ApplyFn = Callable[[Dict[str, Any], Dict[str, Any]], None]
+
+SEQ_KEY = "journal_seq"
+
+
+def apply_status_event(snapshot: Dict[str, Any], event: Dict[str, Any]):
+    """Fold one status event into a memory document (store snapshot layout)
+
+    Events not newer than the agent's updated_ms are skipped, so folding
+    on top of an export that already contains them changes nothing.
+    """
+    agents = snapshot.setdefault("agents", {})
+    entry = agents.setdefault(event["agent"], {"status": "unknown", "tasks": []})
+    updated_ms = event.get("updated_ms") or 0
+    if updated_ms and updated_ms <= (entry.get("updated_ms") or 0):
+        return
+    entry["status"] = event["status"]
+    entry["last_update"] = event["at"]
+    if updated_ms:
+        entry["updated_ms"] = updated_ms
+    if event.get("task"):
+        entry["current_task"] = event["task"]
+        tasks = entry.setdefault("tasks", [])
+        tasks.append({"task": event["task"], "timestamp": event["at"]})
+        entry["tasks"] = tasks[-MAX_TASKS:]
+    snapshot.setdefault("coordination", {})["active_agents"] = sum(
+        1 for agent in agents.values() if agent.get("status") in ACTIVE_STATUSES
+    )
+
+
+class StatusJournal:
+    """
+    Append-only journal for one writer of a shared JSON snapshot.
+
+    The Redis hashes are the live state; the journal is the durable event
+    log underneath them, and the snapshot is the MCP memory file.
+    append() writes each event as one JSON line, so a status change costs
+    O(event). compact() folds the journal into the snapshot: it re-reads
+    the snapshot from disk (other writers' changes are kept) or takes a
+    fresh store snapshot as the base, applies the journal events, writes
+    it with temp-file + rename and truncates the journal.
+
+    Every event gets a sequence number and the snapshot records the last
+    folded number per writer under "journal_seq", so events are applied
+    exactly once even after a crash between the rename and the truncate.
+    recover() folds whatever the previous run left in the journal and
+    hands that tail back for replay into the store.
+    """
+
+    def __init__(self, snapshot_path: str, writer: str, apply: ApplyFn,
+                 compact_every: int = 100, compact_interval: float = 1.0, fsync: bool = False):
+        self.snapshot_path = snapshot_path
+        self.journal_path = f"{os.path.splitext(snapshot_path)[0]}.{writer}.jsonl"
+        self.lock_path = f"{snapshot_path}.lock"
+        self.writer = writer
+        self.apply = apply
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self.fsync = fsync
+
+        self._lock = threading.RLock()
+        self._file = None
+        self._seq = 0
+        self._pending = 0
+        self._last_compaction = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+    def recover(self, initial: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Create the snapshot if missing, fold the journal tail; returns the state and the tail"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            with self._file_lock():
+                snapshot = self._load_snapshot()
+                if snapshot is None:
+                    snapshot = initial()
+                events = self._read_journal()
+                self._seq = max(
+                    [snapshot.get(SEQ_KEY, {}).get(self.writer, 0)] + [e["seq"] for e in events]
+                )
+                tail = self._fold(snapshot, events)
+                write_json_atomic(self.snapshot_path, snapshot)
+                self._truncate()
+            self._pending = 0
+            self._last_compaction = time.monotonic()
+            return snapshot, tail
+
+    # ------------------------------------------------------------------
+    # Append
+    # ------------------------------------------------------------------
+    def append(self, events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Journal events (seq is added), returns them as written"""
+        with self._lock:
+            written = []
+            lines = []
+            for event in events:
+                self._seq += 1
+                event = {**event, "seq": self._seq}
+                written.append(event)
+                lines.append(json.dumps(event, separators=(",", ":")))
+            if not lines:
+                return written
+            journal = self._journal_file()
+            journal.write("\n".join(lines) + "\n")
+            journal.flush()
+            if self.fsync:
+                os.fsync(journal.fileno())
+            self._pending += len(written)
+            return written
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def compaction_due(self) -> bool:
+        with self._lock:
+            if not self._pending:
+                return False
+            return (self._pending >= self.compact_every
+                    or time.monotonic() - self._last_compaction >= self.compact_interval)
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+    def compact(self, base: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Fold the journal into the snapshot; returns the merged state (None if nothing to do)
+
+        With base (a store snapshot) the file is replaced by base plus the
+        journal, keeping the other writers' journal_seq marks.
+        """
+        with self._lock:
+            if base is None and not self._pending:
+                return None
+            with self._file_lock():
+                current = self._load_snapshot() or {}
+                if base is None:
+                    snapshot = current
+                else:
+                    snapshot = {**base, SEQ_KEY: dict(current.get(SEQ_KEY, {}))}
+                self._fold(snapshot, self._read_journal())
+                write_json_atomic(self.snapshot_path, snapshot)
+                self._truncate()
+            self._pending = 0
+            self._last_compaction = time.monotonic()
+            return snapshot
+
+    def compact_if_due(self) -> Optional[Dict[str, Any]]:
+        return self.compact() if self.compaction_due() else None
+
+    def close(self):
+        """Final compaction, then release the journal file"""
+        with self._lock:
+            self.compact()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _fold(self, snapshot: Dict[str, Any], events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply the events not folded yet; returns them"""
+        marks = snapshot.setdefault(SEQ_KEY, {})
+        folded = marks.get(self.writer, 0)
+        applied = []
+        for event in events:
+            if event["seq"] <= folded:
+                continue
+            self.apply(snapshot, event)
+            applied.append(event)
+            folded = event["seq"]
+        marks[self.writer] = folded
+        return applied
+
+    def _journal_file(self):
+        if self._file is None:
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+        return self._file
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        if self._file is not None:
+            self._file.flush()
+        events = []
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        # Abgeschnittene letzte Zeile nach einem Crash
+                        break
+        except FileNotFoundError:
+            pass
+        return events
+
+    def _truncate(self):
+        self._journal_file().truncate(0)
+
+    def _load_snapshot(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _file_lock(self):
+        return _FileLock(self.lock_path)
+
+
+class _FileLock:
+    """flock on a side file, serializes compactions of several processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
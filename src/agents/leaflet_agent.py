@@ -9,14 +9,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from agents.base_agent import BaseAgent
 
 class LeafletAgent(BaseAgent):
-    def __init__(self):
-        super().__init__("leaflet", "Map Integration Specialist")
+    def __init__(self, **kwargs):
+        super().__init__("leaflet", "Map Integration Specialist", **kwargs)
         
     def setup(self):
         """Setup Leaflet Agent handlers"""
         self.register_handler("initialize", self.handle_initialize)
         self.register_handler("create_map_component", self.handle_create_map_component)
-        self.register_handler("status_request", self.handle_status_request)
+        self.register_handler("status_request", self.handle_status_request, priority="high")
         
         print("🗺️ Leaflet Agent ready!")
         print("🎯 Specializing in: Leaflet.js + SvelteKit + Southwest Map Features")
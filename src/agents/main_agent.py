@@ -7,32 +7,43 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from agents.base_agent import BaseAgent
+from agents.phase_scheduler import PhaseScheduler
+from config.agent_config import config
+import threading
 import time
 
 class MainAgent(BaseAgent):
-    def __init__(self):
-        super().__init__("main", "Master Orchestrator")
-        self.project_phases = [
-            "init",
-            "sveltekit_setup", 
-            "leaflet_integration",
-            "github_setup",
-            "final_integration"
-        ]
-        self.current_phase = 0
+    def __init__(self, **kwargs):
+        super().__init__("main", "Master Orchestrator", **kwargs)
+        # Phases and their dependencies come from AgentLabConfig.phases
+        self.scheduler = PhaseScheduler(config.phases)
+        self.project_phases = self.scheduler.order
         self.agent_responses = {}
         
     def setup(self):
         """Setup Main Agent handlers"""
-        self.register_handler("phase_complete", self.handle_phase_complete)
-        self.register_handler("agent_ready", self.handle_agent_ready)
-        self.register_handler("status_request", self.handle_status_request)
+        # Phase progress drives the whole workflow: ahead of any bulk traffic
+        self.register_handler("phase_complete", self.handle_phase_complete, priority="high")
+        self.register_handler("agent_ready", self.handle_agent_ready, priority="high")
+        self.register_handler("status_request", self.handle_status_request, priority="high")
         
         print("🎭 Main Agent (Master Orchestrator) ready!")
         print("🎯 Type 'start' to begin Test App development")
         
-        # Start interactive mode
-        self.interactive_mode()
+    def start(self):
+        """Start the agent with the listener in the background and the prompt in front"""
+        self.is_running = True
+        self.update_status("starting", "Agent initialization")
+        self.setup()
+        
+        # Replies and phase_complete must arrive while the prompt is open
+        listener = threading.Thread(target=self.listen_for_messages, name="main-listener", daemon=True)
+        listener.start()
+        try:
+            self.interactive_mode()
+        finally:
+            self.stop()
+            listener.join()
         
     def interactive_mode(self):
         """Interactive command mode"""
@@ -62,7 +73,7 @@ class MainAgent(BaseAgent):
         print("\n🎯 Available Commands:")
         print("  start  - Start Test App development")
         print("  status - Check all agent status")
-        print("  next   - Proceed to next phase")
+        print("  next   - Mark running phases complete and continue")
         print("  help   - Show this help")
         print("  quit   - Exit agent")
         
@@ -73,19 +84,36 @@ class MainAgent(BaseAgent):
         print("🎨 Theme: Southwest Desert with Apple Liquid Glass")
         print("🤖 Agents: UI + Leaflet + GitHub")
         
-        # Phase 1: Initialize all agents
-        self.current_phase = 0
-        self.coordinate_phase(self.project_phases[self.current_phase])
+        # Every phase without dependencies starts right away
+        self.agent_responses = {}
+        self.coordinate_phases(self.scheduler.start())
+        
+    def coordinate_phases(self, transition):
+        """Start phases whose dependencies are done, in parallel
+        
+        transition comes from the scheduler: each phase start and the end
+        of the run are reported to exactly one caller, listener or prompt.
+        """
+        for phase_name in transition.started:
+            self.coordinate_phase(phase_name)
+        if transition.finished:
+            self.show_final_summary()
         
     def coordinate_phase(self, phase_name: str):
-        """Coordinate current development phase"""
-        print(f"\n📍 Phase {self.current_phase + 1}: {phase_name}")
+        """Coordinate one development phase"""
+        print(f"\n📍 Phase {self.project_phases.index(phase_name) + 1}/{len(self.project_phases)}: {phase_name}")
         
         if phase_name == "init":
             print("🔄 Initializing all agents...")
-            self.send_message("ui", "initialize", {"phase": "init", "role": "SvelteKit + Southwest Theme"})
-            self.send_message("leaflet", "initialize", {"phase": "init", "role": "Map Integration"})
-            self.send_message("github", "initialize", {"phase": "init", "role": "GitHub MCP Integration"})
+            # One message for all agents, each one reads its own role
+            self.broadcast("*", "initialize", {
+                "phase": "init",
+                "roles": {
+                    "ui": "SvelteKit + Southwest Theme",
+                    "leaflet": "Map Integration",
+                    "github": "GitHub MCP Integration"
+                }
+            })
             
         elif phase_name == "sveltekit_setup":
             print("🎨 UI Agent: SvelteKit + Southwest Theme setup...")
@@ -116,6 +144,9 @@ class MainAgent(BaseAgent):
             print("🔗 Final integration and testing...")
             self.send_message("ui", "integrate_components", {"components": ["map", "github"]})
             
+        # Phase commands are latency-critical, don't wait for the batch deadline
+        self.flush()
+            
     def handle_phase_complete(self, payload):
         """Handle phase completion from agents"""
         agent = payload.get("agent")
@@ -125,52 +156,46 @@ class MainAgent(BaseAgent):
         
         self.agent_responses[f"{agent}_{phase}"] = payload
         
-        # Check if all agents completed current phase
-        if self.all_agents_ready_for_next_phase():
-            self.next_phase()
-            
-    def all_agents_ready_for_next_phase(self):
-        """Check if all agents are ready for next phase"""
-        current_phase_name = self.project_phases[self.current_phase]
-        
-        if current_phase_name == "init":
-            required_responses = ["ui_init", "leaflet_init", "github_init"]
-        elif current_phase_name == "sveltekit_setup":
-            required_responses = ["ui_sveltekit_setup"]
-        elif current_phase_name == "leaflet_integration":
-            required_responses = ["leaflet_map_component"]
-        elif current_phase_name == "github_setup":
-            required_responses = ["github_repository_setup"]
-        else:
-            return True
+        # Completions per phase are declared in config (completes_on)
+        self.coordinate_phases(self.scheduler.complete(f"{agent}_{phase}"))
             
-        return all(response in self.agent_responses for response in required_responses)
-        
     def next_phase(self):
-        """Proceed to next phase"""
-        if self.current_phase < len(self.project_phases) - 1:
-            self.current_phase += 1
-            self.coordinate_phase(self.project_phases[self.current_phase])
-        else:
-            print("\n🎉 All phases completed!")
-            print("✅ Test App development finished")
-            self.show_final_summary()
+        """Manual override: treat the running phases as complete"""
+        running = self.scheduler.running()
+        if not running:
+            print("ℹ️ No phase running")
+            return
+        print(f"⏭️ Skipping ahead: {', '.join(running)}")
+        self.coordinate_phases(self.scheduler.force_complete())
             
     def show_final_summary(self):
         """Show final project summary"""
+        print("\n🎉 All phases completed!")
+        print("✅ Test App development finished")
         print("\n📊 PROJECT SUMMARY:")
         print("🎨 UI Agent: SvelteKit app with Southwest theme")
         print("🗺️ Leaflet Agent: Interactive map with markers")
         print("🐙 GitHub Agent: Repository with issues and actions")
         print("🔗 Integration: All components working together")
         print("\n🚀 Test app ready at: ./test-app")
+        self.show_critical_path()
+        
+    def show_critical_path(self):
+        """Longest dependency chain: the wall-clock floor of the whole run"""
+        report = self.scheduler.report()
+        print(f"\n⏱️ Critical path: {' → '.join(report['critical_path'])}")
+        print(f"   {report['critical_path_seconds'] / 60:.1f} min "
+              f"(sequential: {report['sequential_seconds'] / 60:.1f} min)")
         
     def check_all_agent_status(self):
         """Check status of all agents"""
         print("\n📊 Checking agent status...")
-        self.send_message("ui", "status_request", {})
-        self.send_message("leaflet", "status_request", {})
-        self.send_message("github", "status_request", {})
+        requests = self.request_many(["ui", "leaflet", "github"], "status_request", {}, timeout=5.0)
+        for agent, reply in self.gather(requests).items():
+            if isinstance(reply, Exception):
+                print(f"⚠️ {agent}: no status ({reply})")
+            else:
+                print(f"✅ {agent}: {reply.get('status')} - {reply.get('specialization', '')}")
         
     def handle_agent_ready(self, payload):
         """Handle agent ready notification"""
@@ -179,12 +204,15 @@ class MainAgent(BaseAgent):
         
     def handle_status_request(self, payload):
         """Handle status request"""
+        report = self.scheduler.report()
         return {
             "agent": self.agent_name,
             "status": "active",
-            "current_phase": self.project_phases[self.current_phase] if self.current_phase < len(self.project_phases) else "completed",
-            "phase_number": self.current_phase + 1,
-            "total_phases": len(self.project_phases)
+            "running_phases": self.scheduler.running(),
+            "completed_phases": sum(1 for phase in report["phases"].values() if phase["state"] == "done"),
+            "total_phases": len(self.project_phases),
+            "phases": report["phases"],
+            "critical_path": report["critical_path"]
         }
 
 if __name__ == "__main__":
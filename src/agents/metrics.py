@@ -0,0 +1,179 @@
+"""
+Agent Metrics - Latenz-Histogramme und Zähler pro Message Type
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Callable, Dict
+
+# Bucket upper bounds in milliseconds, roughly 1-2.5-5 per decade
+BUCKETS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000, 300000,
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is O(log buckets)"""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms < self.min:
+            self.min = value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile (max for the overflow bucket)"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS_MS[index], self.max) if index < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "min_ms": round(self.min, 3) if self.count else 0.0,
+            "max_ms": round(self.max, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p90_ms": round(self.percentile(90), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "buckets": {
+                str(bound): count for bound, count in zip(BUCKETS_MS + ("inf",), self.counts) if count
+            },
+        }
+
+
+class AgentMetrics:
+    """
+    Per message type: queue wait (sender timestamp until the handler
+    starts), execution time, messages in / out / errored and the Redis
+    commands a handler issued through the agent. Plus the Redis round-trip
+    time of every pipeline flush.
+
+    With enabled=False nothing is recorded; the agent, dispatcher and
+    outbound queue skip the timing calls entirely.
+    """
+
+    def __init__(self, name: str = "agent", enabled: bool = False):
+        self.name = name
+        self.enabled = enabled
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._queue_wait: Dict[str, Histogram] = defaultdict(Histogram)
+        self._exec: Dict[str, Histogram] = defaultdict(Histogram)
+        self._redis_rtt = Histogram()
+        self._in: Dict[str, int] = defaultdict(int)
+        self._out: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._redis_calls: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def from_env(cls, name: str) -> "AgentMetrics":
+        """AGENT_METRICS=1 turns recording on"""
+        return cls(name, enabled=os.getenv("AGENT_METRICS", "0").lower() in ("1", "true", "yes"))
+
+    def record_in(self, message_type: str, queue_wait_ms: float):
+        with self._lock:
+            self._in[message_type] += 1
+            self._queue_wait[message_type].observe(max(0.0, queue_wait_ms))
+
+    def record_exec(self, message_type: str, exec_ms: float, error: bool = False):
+        with self._lock:
+            self._exec[message_type].observe(exec_ms)
+            if error:
+                self._errors[message_type] += 1
+
+    def record_error(self, message_type: str):
+        with self._lock:
+            self._errors[message_type] += 1
+
+    def record_out(self, message_type: str, count: int = 1):
+        with self._lock:
+            self._out[message_type] += count
+
+    def record_redis_call(self, count: int = 1):
+        """Attribute Redis commands to the handler running on this thread, if any"""
+        current = getattr(self._local, "message_type", None)
+        if current is None:
+            return
+        with self._lock:
+            self._redis_calls[current] += count
+
+    def record_rtt(self, rtt_ms: float):
+        with self._lock:
+            self._redis_rtt.observe(rtt_ms)
+
+    def run_as(self, message_type: str, handler: Callable, payload: Any) -> Any:
+        """Run handler with Redis calls on this thread attributed to message_type"""
+        self._local.message_type = message_type
+        try:
+            return handler(payload)
+        finally:
+            self._local.message_type = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-dict copy of all metrics, safe to serialize"""
+        with self._lock:
+            message_types = sorted(set(self._in) | set(self._out) | set(self._exec) | set(self._errors))
+            return {
+                "agent": self.name,
+                "enabled": self.enabled,
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "handlers": {
+                    message_type: {
+                        "in": self._in.get(message_type, 0),
+                        "out": self._out.get(message_type, 0),
+                        "errors": self._errors.get(message_type, 0),
+                        "redis_calls": self._redis_calls.get(message_type, 0),
+                        "queue_wait": self._queue_wait[message_type].snapshot()
+                        if message_type in self._queue_wait else None,
+                        "exec": self._exec[message_type].snapshot()
+                        if message_type in self._exec else None,
+                    }
+                    for message_type in message_types
+                },
+                "totals": {
+                    "in": sum(self._in.values()),
+                    "out": sum(self._out.values()),
+                    "errors": sum(self._errors.values()),
+                },
+                "redis_rtt": self._redis_rtt.snapshot(),
+            }
+
+    def dump(self, path: str):
+        """Write the snapshot as JSON (temp file + rename, never half-written)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            for counters in (self._queue_wait, self._exec, self._in, self._out,
+                             self._errors, self._redis_calls):
+                counters.clear()
+            self._redis_rtt = Histogram()
+            self.started_at = time.time()
@@ -0,0 +1,136 @@
+"""
+Outbound Queue - bündelt ausgehende Redis Commands in Pipelines
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+# op(pipe) hängt ein oder mehrere Commands an die Pipeline an
+OutboundOp = Callable[[Any], None]
+# recover(commands, results) sendet fehlgeschlagene Commands erneut, gibt die Indizes zurück
+RecoverHook = Callable[[List[Any], List[Any]], List[int]]
+
+
+class OutboundQueue:
+    """
+    Coalesces outbound commands (PUBLISH, XADD, status updates) into one
+    Redis pipeline per flush.
+
+    A background thread flushes once `max_batch` ops are queued or
+    `flush_interval_ms` after the first op of a batch was queued, whichever
+    comes first. flush() sends everything immediately for latency-critical
+    sends. With flush_interval_ms <= 0 there is no background thread and
+    every put() flushes on the caller thread. An enabled AgentMetrics gets
+    the round-trip time of every pipeline. If a command failed, `recover`
+    gets the pipeline's commands and results and may re-send them (e.g.
+    EVALSHA after NOSCRIPT); recovered failures are not logged.
+    """
+
+    def __init__(self, redis_client, max_batch: int = 64, flush_interval_ms: float = 2.0,
+                 name: str = "agent", logger: Optional[logging.Logger] = None, metrics=None,
+                 recover: Optional[RecoverHook] = None):
+        self.redis_client = redis_client
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.synchronous = flush_interval_ms <= 0
+        self.name = name
+        self.logger = logger or logging.getLogger(f"Outbound-{name}")
+        self.metrics = metrics if metrics is not None and metrics.enabled else None
+        self.recover = recover
+
+        self._items: List[Tuple[OutboundOp, Optional[str]]] = []
+        self._first_put = 0.0
+        self._cond = threading.Condition()
+        # Serialisiert take+execute, damit Batches in Reihenfolge rausgehen
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, op: OutboundOp, description: Optional[str] = None, flush: Optional[bool] = None):
+        """
+        Queue one op. flush=True sends now, flush=False never flushes here,
+        None lets the queue decide (immediately only in synchronous mode).
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} outbound queue is closed")
+            self._items.append((op, description))
+            if len(self._items) == 1:
+                self._first_put = time.monotonic()
+                self._cond.notify()
+            elif len(self._items) >= self.max_batch:
+                self._cond.notify()
+            if not self.synchronous and self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{self.name}-outbound", daemon=True
+                )
+                self._thread.start()
+
+        if flush or (flush is None and self.synchronous):
+            self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._items:
+                    return
+                deadline = self._first_put + self.flush_interval
+                while len(self._items) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self.flush()
+
+    def flush(self) -> int:
+        """Send all queued ops in one pipeline round-trip, returns the op count"""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._items = self._items, []
+            if not batch:
+                return 0
+
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for op, _description in batch:
+                    op(pipe)
+                commands = list(pipe.command_stack)
+                started = time.perf_counter()
+                results = pipe.execute(raise_on_error=False)
+                if self.metrics is not None:
+                    self.metrics.record_rtt((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                self.logger.error(f"❌ Message send failed ({len(batch)} queued): {e}")
+                return 0
+
+            recovered: Set[int] = set()
+            if self.recover is not None and any(isinstance(result, Exception) for result in results):
+                try:
+                    recovered = set(self.recover(commands, results))
+                except Exception as e:
+                    self.logger.error(f"❌ Retry of failed commands failed: {e}")
+            for index, result in enumerate(results):
+                if isinstance(result, Exception) and index not in recovered:
+                    self.logger.error(f"❌ Message send failed: {result}")
+            # Logging happens here, off the sender's path
+            for _op, description in batch:
+                if description:
+                    self.logger.info(description)
+            return len(batch)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def close(self):
+        """Flush what is left and stop the background thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
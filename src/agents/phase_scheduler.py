@@ -0,0 +1,192 @@
+"""
+Phase Scheduler - Projektphasen als DAG, parallel sobald Abhängigkeiten erfüllt sind
+"""
+
+import re
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+
+_UNIT_SECONDS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+def estimated_seconds(estimate: Optional[str]) -> float:
+    """Upper bound of an estimate like "5-8 minutes" in seconds (0 if unparsable)"""
+    if not estimate:
+        return 0.0
+    numbers = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", estimate)]
+    unit = next((seconds for name, seconds in _UNIT_SECONDS.items() if name in estimate), 60)
+    return max(numbers) * unit if numbers else 0.0
+
+
+class Transition(NamedTuple):
+    """Result of one scheduler step, decided under the scheduler lock"""
+    # Phases that can start now
+    started: List[str]
+    # True only for the step that finished the last phase
+    finished: bool
+
+
+class PhaseScheduler:
+    """
+    Runs phases as soon as all their `depends_on` phases are done.
+
+    A phase is done once every key in its `completes_on` list was recorded
+    (phase_complete messages as "<agent>_<phase>"). Completions may arrive
+    in any order, also before their phase started. The critical path uses
+    measured durations for finished phases, elapsed time for running ones
+    and the config estimate for the rest.
+
+    All methods are thread-safe. start(), complete() and force_complete()
+    return a Transition, so exactly one caller sees each phase start and
+    exactly one sees the whole run finish.
+    """
+
+    def __init__(self, phases: List[Dict[str, Any]]):
+        self.phases = {phase["name"]: phase for phase in phases}
+        self.depends_on = {name: list(phase.get("depends_on", [])) for name, phase in self.phases.items()}
+        self.completes_on = {name: set(phase.get("completes_on", [])) for name, phase in self.phases.items()}
+        self.dependents: Dict[str, List[str]] = {name: [] for name in self.phases}
+        for name, dependencies in self.depends_on.items():
+            for dependency in dependencies:
+                if dependency not in self.phases:
+                    raise ValueError(f"Phase {name} depends on unknown phase: {dependency}")
+                self.dependents[dependency].append(name)
+        self.order = self._topological_order()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def _topological_order(self) -> List[str]:
+        waiting = {name: len(dependencies) for name, dependencies in self.depends_on.items()}
+        ready = [name for name in self.phases if not waiting[name]]
+        order = []
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for dependent in self.dependents[name]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    ready.append(dependent)
+        if len(order) != len(self.phases):
+            cyclic = sorted(name for name, count in waiting.items() if count)
+            raise ValueError(f"Phase dependencies contain a cycle: {', '.join(cyclic)}")
+        return order
+
+    def reset(self):
+        with self._lock:
+            self.state = {name: PENDING for name in self.phases}
+            self.completions: Set[str] = set()
+            self.started_at: Dict[str, float] = {}
+            self.finished_at: Dict[str, float] = {}
+            self._waiting = {name: len(dependencies) for name, dependencies in self.depends_on.items()}
+
+    def start(self) -> Transition:
+        """Reset and start the phases without dependencies"""
+        self.reset()
+        with self._lock:
+            started = self._launch([name for name in self.order if not self._waiting[name]])
+            return Transition(started, self._all_done())
+
+    def complete(self, key: str) -> Transition:
+        """Record one completion; returns the phases that can start now"""
+        with self._lock:
+            was_finished = self._all_done()
+            self.completions.add(key)
+            finished = [name for name in self.order
+                        if self.state[name] == RUNNING and self.completes_on[name] <= self.completions]
+            started = self._finish(finished)
+            return Transition(started, self._all_done() and not was_finished)
+
+    def force_complete(self) -> Transition:
+        """Treat all running phases as done (manual override)"""
+        with self._lock:
+            was_finished = self._all_done()
+            started = self._finish([name for name in self.order if self.state[name] == RUNNING])
+            return Transition(started, self._all_done() and not was_finished)
+
+    def _all_done(self) -> bool:
+        return all(state == DONE for state in self.state.values())
+
+    def _finish(self, finished: List[str]) -> List[str]:
+        now = time.monotonic()
+        startable = []
+        for name in finished:
+            self.state[name] = DONE
+            self.finished_at[name] = now
+            for dependent in self.dependents[name]:
+                self._waiting[dependent] -= 1
+                if not self._waiting[dependent]:
+                    startable.append(dependent)
+        return self._launch(startable)
+
+    def _launch(self, names: List[str]) -> List[str]:
+        """Mark phases running; ones whose completions already arrived finish right away"""
+        now = time.monotonic()
+        for name in names:
+            self.state[name] = RUNNING
+            self.started_at[name] = now
+        already_done = [name for name in names if self.completes_on[name] <= self.completions]
+        launched = [name for name in names if name not in already_done]
+        if already_done:
+            launched.extend(self._finish(already_done))
+        return launched
+
+    @property
+    def finished(self) -> bool:
+        with self._lock:
+            return self._all_done()
+
+    def running(self) -> List[str]:
+        with self._lock:
+            return [name for name in self.order if self.state[name] == RUNNING]
+
+    def duration(self, name: str) -> float:
+        """Seconds: measured if done, elapsed if running, else the config estimate"""
+        with self._lock:
+            return self._duration(name)
+
+    def _duration(self, name: str) -> float:
+        if name in self.finished_at:
+            return self.finished_at[name] - self.started_at[name]
+        if name in self.started_at:
+            return max(time.monotonic() - self.started_at[name],
+                       estimated_seconds(self.phases[name].get("estimated_time")))
+        return estimated_seconds(self.phases[name].get("estimated_time"))
+
+    def critical_path(self) -> Tuple[List[str], float]:
+        """Longest dependency chain by duration, and its length in seconds"""
+        with self._lock:
+            longest: Dict[str, float] = {}
+            previous: Dict[str, Optional[str]] = {}
+            for name in self.order:
+                before = max(self.depends_on[name], key=lambda dependency: longest[dependency], default=None)
+                longest[name] = (longest[before] if before else 0.0) + self._duration(name)
+                previous[name] = before
+            if not longest:
+                return [], 0.0
+            name = max(longest, key=longest.__getitem__)
+            total = longest[name]
+            path = []
+            while name is not None:
+                path.append(name)
+                name = previous[name]
+            return path[::-1], total
+
+    def report(self) -> Dict[str, Any]:
+        """Phase states, durations and the critical path"""
+        path, total = self.critical_path()
+        with self._lock:
+            return {
+                "phases": {
+                    name: {"state": self.state[name], "seconds": round(self._duration(name), 1)}
+                    for name in self.order
+                },
+                "critical_path": path,
+                "critical_path_seconds": round(total, 1),
+                # Sum of all phase durations, what a strictly linear run would take
+                "sequential_seconds": round(sum(self._duration(name) for name in self.order), 1),
+            }
@@ -0,0 +1,254 @@
+"""
+Agent Replicas - mehrere Instanzen einer Rolle, Routing nach Last oder Affinität
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# A replica of role "ui" with id "2" is addressed as "ui@2" and listens on
+# its own channel / stream (agent_ui@2). Replicas report their in-flight
+# handler count to
+#
+# <prefix>:replicas:<role>   HASH  replica id -> {"in_flight": n, "updated_ms": ms}
+#
+# and senders route a message for "ui" to one of the live replicas: the
+# least-loaded one, or the one owning the message's affinity key on a
+# consistent hash ring. Roles without replicas keep the plain agent_<role>
+# channel, so single-instance setups behave exactly as before.
+
+REPLICA_SEPARATOR = "@"
+# Payload fields that pin a message to one replica when present
+DEFAULT_AFFINITY_KEYS = ("project_path",)
+# Virtual nodes per replica on the hash ring
+RING_VNODES = 64
+
+
+def replica_address(role: str, replica_id: str) -> str:
+    return f"{role}{REPLICA_SEPARATOR}{replica_id}"
+
+
+def role_of(address: str) -> str:
+    """Role part of an agent address ("ui@2" -> "ui", "ui" -> "ui")"""
+    return address.split(REPLICA_SEPARATOR, 1)[0]
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring; adding or removing a replica only moves its own keys"""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = RING_VNODES):
+        points = sorted(
+            (_hash(f"{node}#{index}"), node) for node in nodes for index in range(vnodes)
+        )
+        self._hashes = [point for point, _node in points]
+        self._nodes = [node for _point, node in points]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._nodes:
+            return None
+        return self._nodes[bisect(self._hashes, _hash(key)) % len(self._nodes)]
+
+
+class _ReplicaSchema:
+    """Key layout and parsing shared by the sync and async registry"""
+
+    def __init__(self, prefix: str = "agentlab", ttl_ms: Optional[int] = None):
+        self.prefix = prefix
+        # A replica that has not reported for ttl_ms is not routed to
+        self.ttl_ms = ttl_ms if ttl_ms is not None else int(os.getenv("AGENT_REPLICA_TTL_MS", "10000"))
+
+    def replicas_key(self, role: str) -> str:
+        return f"{self.prefix}:replicas:{role}"
+
+    def _queue_report(self, pipe, role: str, replica_id: str, in_flight: int):
+        key = self.replicas_key(role)
+        pipe.hset(key, replica_id, json.dumps({
+            "in_flight": in_flight,
+            "updated_ms": int(time.time() * 1000),
+        }))
+        # The hash disappears once every replica of the role is gone
+        pipe.pexpire(key, self.ttl_ms * 3)
+
+    def _live(self, raw: Dict[Any, Any]) -> Dict[str, int]:
+        """replica id -> in-flight count, stale reports dropped"""
+        cutoff = time.time() * 1000 - self.ttl_ms
+        loads = {}
+        for replica_id, value in raw.items():
+            report = json.loads(value)
+            if report.get("updated_ms", 0) >= cutoff:
+                replica_id = replica_id.decode("utf-8") if isinstance(replica_id, bytes) else replica_id
+                loads[replica_id] = int(report.get("in_flight", 0))
+        return loads
+
+
+class ReplicaRegistry(_ReplicaSchema):
+    """Replica reports on a sync redis client"""
+
+    def __init__(self, redis_client, prefix: str = "agentlab", ttl_ms: Optional[int] = None):
+        super().__init__(prefix, ttl_ms)
+        self.redis_client = redis_client
+
+    def queue_report(self, pipe, role: str, replica_id: str, in_flight: int):
+        self._queue_report(pipe, role, replica_id, in_flight)
+
+    def queue_remove(self, pipe, role: str, replica_id: str):
+        pipe.hdel(self.replicas_key(role), replica_id)
+
+    def load(self, role: str) -> Dict[str, int]:
+        return self._live(self.redis_client.hgetall(self.replicas_key(role)))
+
+
+class AsyncReplicaRegistry(_ReplicaSchema):
+    """Replica reports on a redis.asyncio client"""
+
+    def __init__(self, redis_client, prefix: str = "agentlab", ttl_ms: Optional[int] = None):
+        super().__init__(prefix, ttl_ms)
+        self.redis_client = redis_client
+
+    async def report(self, role: str, replica_id: str, in_flight: int):
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            self._queue_report(pipe, role, replica_id, in_flight)
+            await pipe.execute()
+
+    async def remove(self, role: str, replica_id: str):
+        await self.redis_client.hdel(self.replicas_key(role), replica_id)
+
+    async def load(self, role: str) -> Dict[str, int]:
+        return self._live(await self.redis_client.hgetall(self.replicas_key(role)))
+
+
+class LoadReporter:
+    """
+    Replica side: decides when the in-flight count has to be written.
+
+    A report goes out when the count changed or, as a liveness heartbeat,
+    once a third of the registry TTL has passed since the last one.
+    """
+
+    def __init__(self, ttl_ms: int):
+        self.interval = ttl_ms / 3000
+        self._reported: Optional[int] = None
+        self._next = 0.0
+
+    def due(self, in_flight: int) -> bool:
+        now = time.monotonic()
+        if in_flight == self._reported and now < self._next:
+            return False
+        self._reported = in_flight
+        self._next = now + self.interval
+        return True
+
+
+class _RoleTable:
+    __slots__ = ("expires", "loads", "ring")
+
+    def __init__(self, expires: float, loads: Dict[str, int], ring: Optional[HashRing]):
+        self.expires = expires
+        self.loads = loads
+        self.ring = ring
+
+
+class _RouterBase:
+    """
+    Sender side: maps a role to one of its live replicas.
+
+    The replica table per role is cached for max_age seconds. Between
+    refreshes every routed message counts towards its replica's load, so a
+    burst does not pile onto the replica that was idle at the last refresh.
+    """
+
+    def __init__(self, max_age: Optional[float] = None,
+                 affinity_keys: Optional[Iterable[str]] = None):
+        self.max_age = max_age if max_age is not None else float(os.getenv("AGENT_REPLICA_CACHE_MS", "1000")) / 1000
+        if affinity_keys is None:
+            env_keys = os.getenv("AGENT_AFFINITY_KEYS")
+            affinity_keys = env_keys.split(",") if env_keys else DEFAULT_AFFINITY_KEYS
+        self.affinity_keys: Tuple[str, ...] = tuple(key.strip() for key in affinity_keys if key.strip())
+        self._tables: Dict[str, _RoleTable] = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, role: str) -> Optional[_RoleTable]:
+        table = self._tables.get(role)
+        if table is not None and table.expires > time.monotonic():
+            return table
+        return None
+
+    def _store(self, role: str, loads: Dict[str, int]) -> _RoleTable:
+        previous = self._tables.get(role)
+        if previous is not None and previous.loads.keys() == loads.keys():
+            ring = previous.ring
+        else:
+            ring = HashRing(loads) if loads else None
+        table = self._tables[role] = _RoleTable(time.monotonic() + self.max_age, loads, ring)
+        return table
+
+    def affinity_for(self, payload: Any) -> Optional[str]:
+        if isinstance(payload, dict):
+            for key in self.affinity_keys:
+                value = payload.get(key)
+                if value is not None:
+                    return str(value)
+        return None
+
+    def _pick(self, role: str, table: _RoleTable, affinity: Optional[str]) -> str:
+        if not table.loads:
+            return role
+        with self._lock:
+            if affinity is not None:
+                replica_id = table.ring.node_for(affinity)
+            else:
+                replica_id = min(table.loads, key=table.loads.__getitem__)
+            table.loads[replica_id] += 1
+        return replica_address(role, replica_id)
+
+    def replicas(self, role: str) -> List[str]:
+        """Addresses of the replicas last seen for role (cached)"""
+        table = self._tables.get(role)
+        return [replica_address(role, replica_id) for replica_id in table.loads] if table else []
+
+
+class ReplicaRouter(_RouterBase):
+    """Router on a sync ReplicaRegistry"""
+
+    def __init__(self, registry: ReplicaRegistry, max_age: Optional[float] = None,
+                 affinity_keys: Optional[Iterable[str]] = None):
+        super().__init__(max_age, affinity_keys)
+        self.registry = registry
+
+    def route(self, to_agent: str, payload: Any = None, affinity: Optional[str] = None) -> str:
+        """Address to send to: a replica of to_agent, or to_agent itself
+
+        Explicit replica addresses ("ui@2") are passed through. affinity
+        overrides the key taken from the payload's affinity fields.
+        """
+        if REPLICA_SEPARATOR in to_agent:
+            return to_agent
+        table = self._cached(to_agent)
+        if table is None:
+            table = self._store(to_agent, self.registry.load(to_agent))
+        return self._pick(to_agent, table, affinity if affinity is not None else self.affinity_for(payload))
+
+
+class AsyncReplicaRouter(_RouterBase):
+    """Router on an AsyncReplicaRegistry"""
+
+    def __init__(self, registry: AsyncReplicaRegistry, max_age: Optional[float] = None,
+                 affinity_keys: Optional[Iterable[str]] = None):
+        super().__init__(max_age, affinity_keys)
+        self.registry = registry
+
+    async def route(self, to_agent: str, payload: Any = None, affinity: Optional[str] = None) -> str:
+        if REPLICA_SEPARATOR in to_agent:
+            return to_agent
+        table = self._cached(to_agent)
+        if table is None:
+            table = self._store(to_agent, await self.registry.load(to_agent))
+        return self._pick(to_agent, table, affinity if affinity is not None else self.affinity_for(payload))
@@ -0,0 +1,121 @@
+"""
+Request/Response RPC - Korrelation von Antworten über correlation_id
+"""
+
+import heapq
+import threading
+import time
+import uuid
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class RemoteError(Exception):
+    """The handler on the remote agent failed or does not exist"""
+
+
+class RequestTimeout(FutureTimeoutError):
+    """No reply arrived before the request deadline"""
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+class PendingRequests:
+    """
+    Futures of outstanding requests keyed by correlation id.
+
+    One reaper thread fails futures whose deadline passed, using a min-heap
+    of deadlines instead of a timer per request.
+    """
+
+    def __init__(self, name: str = "agent"):
+        self.name = name
+        self._futures: Dict[str, Future] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def create(self, timeout: float) -> Tuple[str, Future]:
+        """Register a new request, returns (correlation_id, future)"""
+        correlation_id = new_correlation_id()
+        future: Future = Future()
+        with self._cond:
+            self._futures[correlation_id] = future
+            heapq.heappush(self._deadlines, (time.monotonic() + timeout, correlation_id))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._reap, name=f"{self.name}-rpc-timeouts", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+        return correlation_id, future
+
+    def resolve(self, correlation_id: str, payload: Any = None, error: Optional[str] = None) -> bool:
+        """Complete the future for a reply; False if unknown or already timed out"""
+        with self._cond:
+            future = self._futures.pop(correlation_id, None)
+        if future is None:
+            return False
+        try:
+            if error is not None:
+                future.set_exception(RemoteError(error))
+            else:
+                future.set_result(payload)
+        except InvalidStateError:
+            # vom Aufrufer abgebrochen
+            return False
+        return True
+
+    def fail_all(self, reason: str):
+        with self._cond:
+            futures, self._futures = self._futures, {}
+            self._deadlines.clear()
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(RemoteError(reason))
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._futures)
+
+    def _reap(self):
+        while True:
+            expired = []
+            with self._cond:
+                while not self._deadlines:
+                    self._cond.wait()
+                deadline, correlation_id = self._deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._deadlines)
+                future = self._futures.pop(correlation_id, None)
+                if future is not None:
+                    expired.append(future)
+            for future in expired:
+                if not future.done():
+                    future.set_exception(RequestTimeout("No reply before request timeout"))
+
+
+def gather(futures: Dict[str, Future], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Wait for a dict of request futures. Each value becomes the reply payload
+    or the exception (RemoteError, RequestTimeout) of that request.
+    """
+    end = None if timeout is None else time.monotonic() + timeout
+    results: Dict[str, Any] = {}
+    for key, future in futures.items():
+        remaining = None if end is None else max(0.0, end - time.monotonic())
+        try:
+            results[key] = future.result(timeout=remaining)
+        except FutureTimeoutError as e:
+            results[key] = e if isinstance(e, RequestTimeout) else RequestTimeout(
+                "No reply before gather timeout"
+            )
+        except Exception as e:
+            results[key] = e
+    return results
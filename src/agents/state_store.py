@@ -0,0 +1,685 @@
+"""
+Agent State Store - Agent- und Phasenstatus in Redis Hashes (Single Source of Truth)
+"""
+
+import json
+import os
+import socket
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from redis.exceptions import NoScriptError, WatchError
+
+# Every agent writes its own status (one Lua call, atomic and ordered by
+# the sender timestamp); the coordinator writes phases and coordination.
+# Bridge and coordinator read from here, MemoryExporter materializes the
+# MCP memory file.
+#
+# <prefix>:agents            SET   known agent names
+# <prefix>:active            SET   agents whose status is active/working/ready
+# <prefix>:agent:<name>      HASH  status, last_update, current_task, updated_ms, role, ...
+# <prefix>:agent:<name>:tasks LIST last MAX_TASKS tasks as JSON
+# <prefix>:phases            ZSET  phase names by position
+# <prefix>:phase:<name>      HASH  status, required_agents, ...
+# <prefix>:coordination      HASH  status, current_phase, started_at, ...
+# <prefix>:project           HASH  name, path, tech_stack
+# <prefix>:version           INT   bumped by every change
+# <prefix>:lease:<name>      STR   lease holder, expires unless renewed
+# <prefix>:fence:<name>      INT   fencing token, bumped on every new holder
+#
+# Hash values are JSON so lists, numbers and None round-trip.
+#
+# Status history per agent, written by the same Lua call:
+#
+# <prefix>:series:<name>:raw       LIST  last SERIES_RAW_LIMIT transitions (ring buffer)
+# <prefix>:series:<name>:1m:<ms>   HASH  per-minute rollup, expires after MINUTE_RETENTION_S
+# <prefix>:series:<name>:1h:<ms>   HASH  per-hour rollup, expires after HOUR_RETENTION_S
+#
+# Rollups are aggregated at write time (HINCRBY), so there is no rollup job
+# and memory per agent is bounded by the list cap and the key expiry.
+
+ACTIVE_STATUSES = ("active", "working", "ready")
+ERROR_STATUSES = ("error", "failed")
+MAX_TASKS = 10
+
+SERIES_RAW_LIMIT = 1000
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+MINUTE_RETENTION_S = 24 * 3600
+HOUR_RETENTION_S = 30 * 24 * 3600
+# Bucket resolution picked by history() when none is given
+AUTO_MINUTE_RANGE_MS = 6 * HOUR_MS
+
+# KEYS: agent hash, tasks list, agents set, active set, version,
+#       series raw list, minute bucket, hour bucket
+# ARGV: name, status (JSON), last_update, updated_ms, current_task ('' = none), task entry,
+#       active, max tasks, error, raw entry, raw limit, minute ttl, hour ttl, status (plain)
+#
+# A "working" period ends with the next update; its length counts as a
+# task duration in the rollups.
+STATUS_SCRIPT = """
+local last = tonumber(redis.call('HGET', KEYS[1], 'updated_ms') or '0')
+local now = tonumber(ARGV[4])
+if now < last then
+    return 0
+end
+local prev_status = redis.call('HGET', KEYS[1], 'status')
+redis.call('HSET', KEYS[1], 'status', ARGV[2], 'last_update', ARGV[3], 'updated_ms', ARGV[4])
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[1], 'current_task', ARGV[5])
+    redis.call('RPUSH', KEYS[2], ARGV[6])
+    redis.call('LTRIM', KEYS[2], -tonumber(ARGV[8]), -1)
+end
+redis.call('SADD', KEYS[3], ARGV[1])
+if ARGV[7] == '1' then
+    redis.call('SADD', KEYS[4], ARGV[1])
+else
+    redis.call('SREM', KEYS[4], ARGV[1])
+end
+
+local held = 0
+if last > 0 then
+    held = now - last
+end
+local entry = cjson.decode(ARGV[10])
+if prev_status then
+    entry['prev_status'] = cjson.decode(prev_status)
+    entry['prev_ms'] = held
+end
+redis.call('RPUSH', KEYS[6], cjson.encode(entry))
+redis.call('LTRIM', KEYS[6], -tonumber(ARGV[11]), -1)
+
+local function rollup(key, ttl)
+    redis.call('HINCRBY', key, 'updates', 1)
+    redis.call('HINCRBY', key, 'status:' .. ARGV[14], 1)
+    if prev_status ~= ARGV[2] then
+        redis.call('HINCRBY', key, 'transitions', 1)
+    end
+    if ARGV[9] == '1' then
+        redis.call('HINCRBY', key, 'errors', 1)
+    end
+    if prev_status == '"working"' and last > 0 then
+        redis.call('HINCRBY', key, 'tasks', 1)
+        redis.call('HINCRBY', key, 'task_ms', held)
+        if held > tonumber(redis.call('HGET', key, 'task_max_ms') or '0') then
+            redis.call('HSET', key, 'task_max_ms', held)
+        end
+    end
+    redis.call('EXPIRE', key, ttl)
+end
+rollup(KEYS[7], ARGV[12])
+rollup(KEYS[8], ARGV[13])
+
+return redis.call('INCR', KEYS[5])
+"""
+
+# KEYS: lease key; ARGV: owner, ttl ms - acquire or renew
+LEASE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if holder then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+# KEYS: lease key, fence key; ARGV: owner, ttl ms - acquire or renew.
+# Returns the fencing token while we hold the lease, 0 otherwise; a new
+# holder always gets a larger token than any holder before it.
+ELECTION_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return tonumber(redis.call('GET', KEYS[2]) or '0')
+end
+if holder then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return redis.call('INCR', KEYS[2])
+"""
+
+# KEYS: lease key; ARGV: owner - delete only our own lease
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class FencedOut(Exception):
+    """A fenced write was rejected: a newer lease holder exists"""
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def encode_fields(fields: Dict[str, Any]) -> Dict[str, str]:
+    return {key: json.dumps(value) for key, value in fields.items()}
+
+
+def decode_fields(raw: Dict[Any, Any]) -> Dict[str, Any]:
+    return {_text(key): json.loads(value) for key, value in raw.items()}
+
+
+def default_owner(component: str) -> str:
+    """Lease owner id, unique per process"""
+    return f"{socket.gethostname()}:{os.getpid()}:{component}"
+
+
+class _StateSchema:
+    """Key layout, command builders and result parsing shared by both stores"""
+
+    def __init__(self, prefix: str = "agentlab"):
+        self.prefix = prefix
+        # Script sources by SHA, for the NOSCRIPT fallback
+        self._sources: Dict[str, str] = {}
+        self.agents_key = f"{prefix}:agents"
+        self.active_key = f"{prefix}:active"
+        self.phases_key = f"{prefix}:phases"
+        self.coordination_key = f"{prefix}:coordination"
+        self.project_key = f"{prefix}:project"
+        self.version_key = f"{prefix}:version"
+
+    def agent_key(self, name: str) -> str:
+        return f"{self.prefix}:agent:{name}"
+
+    def tasks_key(self, name: str) -> str:
+        return f"{self.prefix}:agent:{name}:tasks"
+
+    def phase_key(self, name: str) -> str:
+        return f"{self.prefix}:phase:{name}"
+
+    def lease_key(self, name: str) -> str:
+        return f"{self.prefix}:lease:{name}"
+
+    def fence_key(self, name: str) -> str:
+        return f"{self.prefix}:fence:{name}"
+
+    def _eval_retries(self, commands: List[Any], results: List[Any]) -> List[Tuple[int, Tuple[Any, ...]]]:
+        """(index, EVAL args) for queued EVALSHAs of our scripts that failed with NOSCRIPT"""
+        retries = []
+        for index, ((args, _options), result) in enumerate(zip(commands, results)):
+            if isinstance(result, NoScriptError) and args[0] == "EVALSHA" and args[1] in self._sources:
+                retries.append((index, (self._sources[args[1]], *args[2:])))
+        return retries
+
+    def series_key(self, name: str, resolution: str, bucket_ms: Optional[int] = None) -> str:
+        key = f"{self.prefix}:series:{name}:{resolution}"
+        return key if bucket_ms is None else f"{key}:{bucket_ms}"
+
+    def _status_call(self, agent: str, status: str, task: Optional[str], at: Optional[str],
+                     updated_ms: Optional[int]) -> Tuple[List[str], List[Any]]:
+        at = at or datetime.utcnow().isoformat()
+        now_ms = int(updated_ms if updated_ms is not None else time.time() * 1000)
+        keys = [
+            self.agent_key(agent), self.tasks_key(agent), self.agents_key,
+            self.active_key, self.version_key,
+            self.series_key(agent, "raw"),
+            self.series_key(agent, "1m", now_ms - now_ms % MINUTE_MS),
+            self.series_key(agent, "1h", now_ms - now_ms % HOUR_MS),
+        ]
+        args = [
+            agent,
+            json.dumps(status),
+            json.dumps(at),
+            now_ms,
+            json.dumps(task) if task else "",
+            json.dumps({"task": task, "timestamp": at}) if task else "",
+            "1" if status in ACTIVE_STATUSES else "0",
+            MAX_TASKS,
+            "1" if status in ERROR_STATUSES else "0",
+            json.dumps({"t": now_ms, "status": status, "task": task}),
+            SERIES_RAW_LIMIT,
+            MINUTE_RETENTION_S,
+            HOUR_RETENTION_S,
+            status,
+        ]
+        return keys, args
+
+    def _history_plan(self, agent: str, start_ms: Optional[int], end_ms: Optional[int],
+                      resolution: Optional[str]) -> Tuple[str, int, int, List[int]]:
+        """Resolution, clamped range and the bucket starts to read (empty for raw)"""
+        end_ms = int(end_ms if end_ms is not None else time.time() * 1000)
+        start_ms = int(start_ms if start_ms is not None else end_ms - HOUR_MS)
+        if resolution is None:
+            resolution = "1m" if end_ms - start_ms <= AUTO_MINUTE_RANGE_MS else "1h"
+        if resolution == "raw":
+            return resolution, start_ms, end_ms, []
+        if resolution not in ("1m", "1h"):
+            raise ValueError(f"Unknown resolution: {resolution} (raw, 1m or 1h)")
+        if resolution == "1m":
+            step, retention_s = MINUTE_MS, MINUTE_RETENTION_S
+        else:
+            step, retention_s = HOUR_MS, HOUR_RETENTION_S
+        # Buckets older than the retention have expired anyway
+        start_ms = max(start_ms, end_ms - retention_s * 1000)
+        buckets = list(range(start_ms - start_ms % step, end_ms + 1, step))
+        return resolution, start_ms, end_ms, buckets
+
+    def _queue_history(self, pipe, agent: str, resolution: str, buckets: List[int]):
+        if resolution == "raw":
+            pipe.lrange(self.series_key(agent, "raw"), 0, -1)
+        else:
+            for bucket in buckets:
+                pipe.hgetall(self.series_key(agent, resolution, bucket))
+
+    @staticmethod
+    def _build_history(agent: str, resolution: str, start_ms: int, end_ms: int,
+                       buckets: List[int], results: List[Any]) -> Dict[str, Any]:
+        history = {"agent": agent, "resolution": resolution, "start_ms": start_ms, "end_ms": end_ms}
+        if resolution == "raw":
+            entries = (json.loads(entry) for entry in results[0])
+            history["points"] = [entry for entry in entries if start_ms <= entry["t"] <= end_ms]
+            return history
+        points = []
+        totals = {"updates": 0, "transitions": 0, "errors": 0, "tasks": 0, "task_ms": 0, "task_max_ms": 0}
+        for bucket, raw in zip(buckets, results):
+            if not raw:
+                continue
+            counters = {_text(field): int(value) for field, value in raw.items()}
+            point = {"t": bucket, "statuses": {}}
+            for field, value in counters.items():
+                if field.startswith("status:"):
+                    point["statuses"][field[len("status:"):]] = value
+                else:
+                    point[field] = value
+            for field in totals:
+                point.setdefault(field, 0)
+            point["task_avg_ms"] = round(point["task_ms"] / point["tasks"], 1) if point["tasks"] else 0.0
+            for field in totals:
+                totals[field] = (max(totals[field], point[field]) if field == "task_max_ms"
+                                 else totals[field] + point[field])
+            points.append(point)
+        totals["task_avg_ms"] = round(totals["task_ms"] / totals["tasks"], 1) if totals["tasks"] else 0.0
+        history["points"] = points
+        history["totals"] = totals
+        return history
+
+    def _queue_seed(self, pipe, initial: Dict[str, Any]):
+        """HSETNX only: a restart never resets state another process already wrote"""
+        for section, key in (("coordination", self.coordination_key), ("project", self.project_key)):
+            for field, value in encode_fields(initial.get(section, {})).items():
+                pipe.hsetnx(key, field, value)
+        for name, fields in initial.get("agents", {}).items():
+            pipe.sadd(self.agents_key, name)
+            for field, value in encode_fields(fields).items():
+                if field != "tasks":
+                    pipe.hsetnx(self.agent_key(name), field, value)
+        for position, (name, fields) in enumerate(initial.get("phases", {}).items()):
+            pipe.zadd(self.phases_key, {name: position}, nx=True)
+            for field, value in encode_fields(fields).items():
+                pipe.hsetnx(self.phase_key(name), field, value)
+        pipe.incr(self.version_key)
+
+    @staticmethod
+    def _restorable(snapshot: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(name, fields) for name, fields in snapshot.get("agents", {}).items() if fields.get("status")]
+
+    def _queue_phase(self, pipe, phase: str, fields: Dict[str, Any], current: bool):
+        pipe.zadd(self.phases_key, {phase: time.time()}, nx=True)
+        pipe.hset(self.phase_key(phase), mapping=encode_fields(fields))
+        if current:
+            pipe.hset(self.coordination_key, "current_phase", json.dumps(phase))
+        pipe.incr(self.version_key)
+
+    def _queue_index(self, pipe):
+        pipe.smembers(self.agents_key)
+        pipe.smembers(self.active_key)
+        pipe.zrange(self.phases_key, 0, -1)
+        pipe.hgetall(self.coordination_key)
+        pipe.hgetall(self.project_key)
+        pipe.get(self.version_key)
+
+    def _queue_entities(self, pipe, agents: List[str], phases: List[str]):
+        for name in agents:
+            pipe.hgetall(self.agent_key(name))
+            pipe.lrange(self.tasks_key(name), 0, -1)
+        for name in phases:
+            pipe.hgetall(self.phase_key(name))
+
+    @staticmethod
+    def _index_names(index: List[Any]) -> Tuple[List[str], List[str]]:
+        return sorted(_text(name) for name in index[0]), [_text(name) for name in index[2]]
+
+    @staticmethod
+    def _build_snapshot(index: List[Any], agents: List[str], phases: List[str],
+                        entities: List[Any]) -> Dict[str, Any]:
+        """Same layout as the memory file the MCP memory server reads"""
+        _, active, _, coordination, project, version = index
+        coordination = decode_fields(coordination)
+        coordination["active_agents"] = len(active)
+        snapshot = {
+            "coordination": coordination,
+            "agents": {},
+            "phases": {},
+            "project": decode_fields(project),
+            "state_version": int(version or 0),
+        }
+        for position, name in enumerate(agents):
+            fields = decode_fields(entities[2 * position])
+            fields["tasks"] = [json.loads(task) for task in entities[2 * position + 1]]
+            snapshot["agents"][name] = fields
+        offset = 2 * len(agents)
+        for position, name in enumerate(phases):
+            snapshot["phases"][name] = decode_fields(entities[offset + position])
+        return snapshot
+
+    @staticmethod
+    def _statuses(names: List[str], results: List[Any]) -> Dict[str, Optional[str]]:
+        return {name: json.loads(value) if value is not None else None
+                for name, value in zip(names, results)}
+
+
+class AgentStateStore(_StateSchema):
+    """Agent and phase state in Redis hashes (redis-py client)"""
+
+    def __init__(self, redis_client, prefix: str = "agentlab"):
+        super().__init__(prefix)
+        self.redis_client = redis_client
+        self._status_script = redis_client.register_script(STATUS_SCRIPT)
+        self._lease_script = redis_client.register_script(LEASE_SCRIPT)
+        self._release_script = redis_client.register_script(RELEASE_SCRIPT)
+        self._election_script = redis_client.register_script(ELECTION_SCRIPT)
+        self._sources = {self._status_script.sha: STATUS_SCRIPT}
+        self._scripts_loaded = False
+
+    # Writes ---------------------------------------------------------------
+    def queue_status(self, pipe, agent: str, status: str, task: Optional[str] = None,
+                     at: Optional[str] = None, updated_ms: Optional[int] = None):
+        """Append the atomic status update to a pipeline (e.g. next to the PUBLISH)
+
+        Queued as EVALSHA: a Script object in a pipeline would cost a
+        SCRIPT EXISTS round-trip on every execute, so the script is loaded
+        once per store instead. Whoever executes the pipeline passes its
+        commands and results to recover_noscript().
+        """
+        if not self._scripts_loaded:
+            self.redis_client.script_load(STATUS_SCRIPT)
+            self._scripts_loaded = True
+        keys, args = self._status_call(agent, status, task, at, updated_ms)
+        pipe.evalsha(self._status_script.sha, len(keys), *keys, *args)
+
+    def recover_noscript(self, commands: List[Any], results: List[Any]) -> List[int]:
+        """Re-send status writes that failed with NOSCRIPT (Redis restart, SCRIPT FLUSH)
+
+        commands is the pipeline's command_stack from before execute().
+        They go out again as EVAL, which also caches the script; the next
+        queue_status() loads it again as well. Returns the recovered indexes.
+        """
+        retries = self._eval_retries(commands, results)
+        if not retries:
+            return []
+        self._scripts_loaded = False
+        pipe = self.redis_client.pipeline(transaction=False)
+        for _index, args in retries:
+            pipe.eval(*args)
+        pipe.execute()
+        return [index for index, _args in retries]
+
+    def record_status(self, agent: str, status: str, task: Optional[str] = None,
+                      at: Optional[str] = None, updated_ms: Optional[int] = None) -> int:
+        """Write one status update now; returns the new version (0 if it was stale)"""
+        keys, args = self._status_call(agent, status, task, at, updated_ms)
+        return self._status_script(keys=keys, args=args)
+
+    def seed(self, initial: Dict[str, Any]):
+        pipe = self.redis_client.pipeline(transaction=True)
+        self._queue_seed(pipe, initial)
+        pipe.execute()
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """Rebuild an empty store from a recovered memory file
+
+        Agent status goes through the status script so the active set is
+        rebuilt too; everything else is seeded (HSETNX only).
+        """
+        for name, fields in self._restorable(snapshot):
+            self.record_status(name, fields["status"], None, fields.get("last_update"), fields.get("updated_ms"))
+        self.seed(snapshot)
+
+    def update_phase(self, phase: str, fields: Dict[str, Any], current: bool = False,
+                     fence: Optional[Tuple[str, int]] = None):
+        """Phase fields (and optionally current_phase) in one MULTI/EXEC"""
+        self._transaction(lambda pipe: self._queue_phase(pipe, phase, fields, current), fence)
+
+    def update_coordination(self, fields: Dict[str, Any], fence: Optional[Tuple[str, int]] = None):
+        def queue(pipe):
+            pipe.hset(self.coordination_key, mapping=encode_fields(fields))
+            pipe.incr(self.version_key)
+        self._transaction(queue, fence)
+
+    def _transaction(self, queue: Callable[[Any], None], fence: Optional[Tuple[str, int]] = None):
+        """MULTI/EXEC; with fence=(lease name, token) only while token is the current one
+
+        The fence key is WATCHed, so a takeover between the check and EXEC
+        aborts the write as well. Raises FencedOut when rejected.
+        """
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            if fence is not None:
+                name, token = fence
+                try:
+                    pipe.watch(self.fence_key(name))
+                    current = int(pipe.get(self.fence_key(name)) or 0)
+                    if current != token:
+                        raise FencedOut(f"{name} token {token} is stale (current: {current})")
+                    pipe.multi()
+                    queue(pipe)
+                    pipe.execute()
+                except WatchError:
+                    raise FencedOut(f"{name} changed hands during the write")
+                return
+            queue(pipe)
+            pipe.execute()
+
+    # Reads ----------------------------------------------------------------
+    def version(self) -> int:
+        return int(self.redis_client.get(self.version_key) or 0)
+
+    def coordination(self) -> Dict[str, Any]:
+        return decode_fields(self.redis_client.hgetall(self.coordination_key))
+
+    def statuses(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Status per agent in one round-trip (None for unknown agents)"""
+        names = list(names)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for name in names:
+            pipe.hget(self.agent_key(name), "status")
+        return self._statuses(names, pipe.execute())
+
+    def history(self, agent: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                resolution: Optional[str] = None) -> Dict[str, Any]:
+        """Status history of one agent in [start_ms, end_ms] (default: last hour)
+
+        resolution: 'raw' (transitions from the ring buffer), '1m' or '1h'
+        rollups; by default 1m up to a 6 hour range, 1h beyond. One round-trip.
+        """
+        resolution, start_ms, end_ms, buckets = self._history_plan(agent, start_ms, end_ms, resolution)
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_history(pipe, agent, resolution, buckets)
+        return self._build_history(agent, resolution, start_ms, end_ms, buckets, pipe.execute())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Full state in two round-trips"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_index(pipe)
+        index = pipe.execute()
+        agents, phases = self._index_names(index)
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_entities(pipe, agents, phases)
+        return self._build_snapshot(index, agents, phases, pipe.execute())
+
+    # Leases ---------------------------------------------------------------
+    def acquire_lease(self, name: str, owner: str, ttl_ms: int) -> bool:
+        """Acquire or renew; True while we hold it"""
+        return bool(self._lease_script(keys=[self.lease_key(name)], args=[owner, ttl_ms]))
+
+    def release_lease(self, name: str, owner: str):
+        self._release_script(keys=[self.lease_key(name)], args=[owner])
+
+    def acquire_leadership(self, name: str, owner: str, ttl_ms: int) -> int:
+        """Lease with a fencing token: acquire or renew, 0 if someone else holds it"""
+        return int(self._election_script(keys=[self.lease_key(name), self.fence_key(name)],
+                                         args=[owner, ttl_ms]))
+
+    def lease_holder(self, name: str) -> Optional[str]:
+        holder = self.redis_client.get(self.lease_key(name))
+        return _text(holder) if holder is not None else None
+
+
+class AsyncAgentStateStore(_StateSchema):
+    """asyncio variant of AgentStateStore (redis.asyncio client)"""
+
+    def __init__(self, redis_client, prefix: str = "agentlab"):
+        super().__init__(prefix)
+        self.redis_client = redis_client
+        self._status_script = redis_client.register_script(STATUS_SCRIPT)
+        self._lease_script = redis_client.register_script(LEASE_SCRIPT)
+        self._release_script = redis_client.register_script(RELEASE_SCRIPT)
+        self._sources = {self._status_script.sha: STATUS_SCRIPT}
+        self._scripts_loaded = False
+
+    # Writes ---------------------------------------------------------------
+    async def queue_status(self, pipe, agent: str, status: str, task: Optional[str] = None,
+                           at: Optional[str] = None, updated_ms: Optional[int] = None):
+        if not self._scripts_loaded:
+            await self.redis_client.script_load(STATUS_SCRIPT)
+            self._scripts_loaded = True
+        keys, args = self._status_call(agent, status, task, at, updated_ms)
+        pipe.evalsha(self._status_script.sha, len(keys), *keys, *args)
+
+    async def recover_noscript(self, commands: List[Any], results: List[Any]) -> List[int]:
+        """See AgentStateStore.recover_noscript()"""
+        retries = self._eval_retries(commands, results)
+        if not retries:
+            return []
+        self._scripts_loaded = False
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for _index, args in retries:
+                pipe.eval(*args)
+            await pipe.execute()
+        return [index for index, _args in retries]
+
+    async def record_status(self, agent: str, status: str, task: Optional[str] = None,
+                            at: Optional[str] = None, updated_ms: Optional[int] = None) -> int:
+        keys, args = self._status_call(agent, status, task, at, updated_ms)
+        return await self._status_script(keys=keys, args=args)
+
+    async def seed(self, initial: Dict[str, Any]):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            self._queue_seed(pipe, initial)
+            await pipe.execute()
+
+    async def restore(self, snapshot: Dict[str, Any]):
+        for name, fields in self._restorable(snapshot):
+            await self.record_status(name, fields["status"], None,
+                                     fields.get("last_update"), fields.get("updated_ms"))
+        await self.seed(snapshot)
+
+    async def update_phase(self, phase: str, fields: Dict[str, Any], current: bool = False):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            self._queue_phase(pipe, phase, fields, current)
+            await pipe.execute()
+
+    # Reads ----------------------------------------------------------------
+    async def version(self) -> int:
+        return int(await self.redis_client.get(self.version_key) or 0)
+
+    async def statuses(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        names = list(names)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.hget(self.agent_key(name), "status")
+            return self._statuses(names, await pipe.execute())
+
+    async def history(self, agent: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                      resolution: Optional[str] = None) -> Dict[str, Any]:
+        resolution, start_ms, end_ms, buckets = self._history_plan(agent, start_ms, end_ms, resolution)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            self._queue_history(pipe, agent, resolution, buckets)
+            results = await pipe.execute()
+        return self._build_history(agent, resolution, start_ms, end_ms, buckets, results)
+
+    async def snapshot(self) -> Dict[str, Any]:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            self._queue_index(pipe)
+            index = await pipe.execute()
+        agents, phases = self._index_names(index)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            self._queue_entities(pipe, agents, phases)
+            entities = await pipe.execute()
+        return self._build_snapshot(index, agents, phases, entities)
+
+    # Leases ---------------------------------------------------------------
+    async def acquire_lease(self, name: str, owner: str, ttl_ms: int) -> bool:
+        return bool(await self._lease_script(keys=[self.lease_key(name)], args=[owner, ttl_ms]))
+
+    async def release_lease(self, name: str, owner: str):
+        await self._release_script(keys=[self.lease_key(name)], args=[owner])
+
+
+class MemoryExporter:
+    """
+    Materializes store snapshots as the MCP memory file.
+
+    Any number of bridges and coordinators may run one; only the holder of
+    the `memory_exporter` lease writes, and only when the state version
+    moved since its last export. The file is written with temp file +
+    rename, so the memory server never reads a half-written document.
+    With a StatusJournal (agents/journal.py) the export is its compaction:
+    the journal is folded in and truncated.
+    """
+
+    LEASE = "memory_exporter"
+
+    def __init__(self, path: str, owner: str, lease_ms: int = 5000, journal=None):
+        self.path = path
+        self.owner = owner
+        self.lease_ms = lease_ms
+        self.journal = journal
+        self.exported_version: Optional[int] = None
+
+    def due(self, version: int) -> bool:
+        return version != self.exported_version
+
+    def export(self, store: AgentStateStore) -> bool:
+        """Sync export step; True if the file was written"""
+        if not store.acquire_lease(self.LEASE, self.owner, self.lease_ms):
+            return False
+        if not self.due(store.version()):
+            return False
+        self.write(store.snapshot())
+        return True
+
+    def write(self, snapshot: Dict[str, Any]):
+        document = {**snapshot, "exported_at": datetime.utcnow().isoformat()}
+        if self.journal is not None:
+            self.journal.compact(document)
+        else:
+            write_json_atomic(self.path, document)
+        self.exported_version = snapshot["state_version"]
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]):
+    """Temp file in the same directory, fsync, then rename over the old file"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".memory.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
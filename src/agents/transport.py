@@ -0,0 +1,385 @@
+"""
+Message Transports für BaseAgent - Redis Pub/Sub und Redis Streams
+"""
+
+import os
+import socket
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import redis
+
+# (message_id, raw_data) - message_id ist None bei Pub/Sub (kein Ack nötig)
+RawMessage = Tuple[Optional[str], Any]
+
+
+class PubSubTransport:
+    """Fire-and-forget transport on `agent_<name>` Pub/Sub channels"""
+
+    name = "pubsub"
+
+    def __init__(self, redis_client: redis.Redis, agent_name: str, batch_size: int = 100,
+                 block_ms: int = 1000):
+        self.redis_client = redis_client
+        self.agent_name = agent_name
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.pubsub = None
+
+    @staticmethod
+    def channel_for(agent_name: str) -> str:
+        return f"agent_{agent_name}"
+
+    def send(self, to_agent: str, data: Any, client=None):
+        """Publish raw message to the target agent channel (client: e.g. a pipeline)"""
+        (client or self.redis_client).publish(self.channel_for(to_agent), data)
+
+    def send_many(self, messages: Dict[str, Any]) -> Dict[str, int]:
+        """Send to several agents in one pipeline round-trip, returns deliveries per target"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for to_agent, data in messages.items():
+            self.send(to_agent, data, client=pipe)
+        return self.delivery_counts(messages, pipe.execute(raise_on_error=False))
+
+    @staticmethod
+    def delivery_counts(messages: Dict[str, Any], results: List[Any]) -> Dict[str, int]:
+        """PUBLISH replies with the number of subscribers that got the message"""
+        return {
+            to_agent: result if isinstance(result, int) else 0
+            for to_agent, result in zip(messages, results)
+        }
+
+    def subscribe(self):
+        """Subscribe to our own agent channel"""
+        self.pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(self.channel_for(self.agent_name))
+
+    def read_batch(self) -> List[RawMessage]:
+        """Wait up to block_ms for a message, then drain whatever is already buffered"""
+        batch: List[RawMessage] = []
+        message = self.pubsub.get_message(timeout=self.block_ms / 1000)
+        while message is not None:
+            if message.get("type") == "message":
+                batch.append((None, message["data"]))
+            if len(batch) >= self.batch_size:
+                break
+            message = self.pubsub.get_message(timeout=0)
+        return batch
+
+    def ack(self, message_ids: List[str]):
+        """Pub/Sub has no delivery tracking"""
+        pass
+
+    def close(self):
+        if self.pubsub is not None:
+            self.pubsub.close()
+            self.pubsub = None
+
+
+class StreamsTransport:
+    """
+    Durable transport on Redis Streams with consumer groups.
+
+    Each agent reads `stream:agent_<name>` through the consumer group
+    `agent_<name>` so messages sent while the agent is down or busy stay
+    in the stream until they are read and acknowledged. Entries that were
+    delivered to a consumer but never acknowledged (crash mid-handler) are
+    reclaimed with XAUTOCLAIM once they have been idle for `reclaim_idle_ms`.
+    Entries still being handled here are touched (XCLAIM JUSTID) before each
+    reclaim pass so long-running handlers are not picked up a second time.
+    """
+
+    name = "streams"
+    DATA_FIELD = "data"
+    DATA_FIELD_RAW = b"data"
+
+    def __init__(self, redis_client: redis.Redis, agent_name: str, batch_size: int = 100,
+                 block_ms: int = 1000, maxlen: int = 10000, reclaim_idle_ms: int = 60000,
+                 consumer_name: Optional[str] = None):
+        self.redis_client = redis_client
+        self.agent_name = agent_name
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.maxlen = maxlen
+        self.reclaim_idle_ms = reclaim_idle_ms
+        self.group_name = f"agent_{agent_name}"
+        self.consumer_name = consumer_name or f"{agent_name}-{socket.gethostname()}-{os.getpid()}"
+        self._reclaim_cursor = "0-0"
+        self._next_reclaim = 0.0
+        self.in_flight: Set[str] = set()
+
+    @staticmethod
+    def stream_for(agent_name: str) -> str:
+        return f"stream:agent_{agent_name}"
+
+    def send(self, to_agent: str, data: Any, client=None):
+        """XADD with approximate MAXLEN trimming so streams stay bounded"""
+        (client or self.redis_client).xadd(
+            self.stream_for(to_agent),
+            {self.DATA_FIELD: data},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    def send_many(self, messages: Dict[str, Any]) -> Dict[str, int]:
+        """XADD to several streams in one pipeline round-trip, 1 per stored entry"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for to_agent, data in messages.items():
+            self.send(to_agent, data, client=pipe)
+        return self.delivery_counts(messages, pipe.execute(raise_on_error=False))
+
+    @staticmethod
+    def delivery_counts(messages: Dict[str, Any], results: List[Any]) -> Dict[str, int]:
+        """The entry waits in the stream for the group, so a stored entry counts once"""
+        return {
+            to_agent: 0 if isinstance(result, Exception) or not result else 1
+            for to_agent, result in zip(messages, results)
+        }
+
+    def subscribe(self):
+        """Create the consumer group (and stream) if it does not exist yet"""
+        try:
+            self.redis_client.xgroup_create(
+                self.stream_for(self.agent_name), self.group_name, id="0", mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read_batch(self) -> List[RawMessage]:
+        """Reclaim stale pending entries first, then read up to batch_size new ones"""
+        batch = self._reclaim()
+        if batch:
+            return batch
+
+        response = self.redis_client.xreadgroup(
+            self.group_name,
+            self.consumer_name,
+            {self.stream_for(self.agent_name): ">"},
+            count=self.batch_size,
+            block=self.block_ms,
+        )
+        batch, trimmed = self._accept(self._entries(response))
+        self.ack(trimmed)
+        return batch
+
+    def _reclaim(self) -> List[RawMessage]:
+        if not self._reclaim_due():
+            return []
+        if self.in_flight:
+            # Idle-Zeit laufender Einträge zurücksetzen
+            self.redis_client.xclaim(**self._touch_args())
+        result = self.redis_client.xautoclaim(**self._autoclaim_args())
+        self._reclaim_cursor = result[0]
+        batch, trimmed = self._accept(result[1])
+        self.ack(trimmed)
+        return batch
+
+    def _reclaim_due(self) -> bool:
+        now = time.monotonic()
+        if now < self._next_reclaim:
+            return False
+        self._next_reclaim = now + self.reclaim_idle_ms / 2000
+        return True
+
+    def _touch_args(self) -> Dict[str, Any]:
+        return dict(
+            name=self.stream_for(self.agent_name),
+            groupname=self.group_name,
+            consumername=self.consumer_name,
+            min_idle_time=0,
+            message_ids=list(self.in_flight),
+            justid=True,
+        )
+
+    def _autoclaim_args(self) -> Dict[str, Any]:
+        return dict(
+            name=self.stream_for(self.agent_name),
+            groupname=self.group_name,
+            consumername=self.consumer_name,
+            min_idle_time=self.reclaim_idle_ms,
+            start_id=self._reclaim_cursor,
+            count=self.batch_size,
+        )
+
+    @staticmethod
+    def _entries(response) -> list:
+        """Flatten an XREADGROUP reply into (id, fields) entries"""
+        if not response:
+            return []
+        # RESP2 liefert [[stream, entries]], RESP3 liefert {stream: [entries]}
+        if isinstance(response, dict):
+            streams = [(key, value[0] if value and isinstance(value[0], list) else value)
+                       for key, value in response.items()]
+        else:
+            streams = response
+        entries = []
+        for _stream, stream_entries in streams:
+            entries.extend(stream_entries)
+        return entries
+
+    def _accept(self, entries) -> Tuple[List[RawMessage], List[str]]:
+        """Split entries into new messages and ids trimmed away by MAXLEN"""
+        batch: List[RawMessage] = []
+        trimmed: List[str] = []
+        for message_id, fields in entries:
+            if not fields:
+                # Entry wurde bereits per MAXLEN getrimmt - nur noch acken
+                trimmed.append(message_id)
+                continue
+            if message_id in self.in_flight:
+                continue
+            self.in_flight.add(message_id)
+            data = fields.get(self.DATA_FIELD_RAW, fields.get(self.DATA_FIELD))
+            batch.append((message_id, data))
+        return batch, trimmed
+
+    def ack(self, message_ids: List[str]):
+        """Acknowledge processed entries so they leave the pending list"""
+        if message_ids:
+            self.in_flight.difference_update(message_ids)
+            self.redis_client.xack(self.stream_for(self.agent_name), self.group_name, *message_ids)
+
+    def close(self):
+        pass
+
+
+class AsyncPubSubTransport(PubSubTransport):
+    """PubSubTransport on a redis.asyncio client"""
+
+    async def send(self, to_agent: str, data: Any):
+        await self.redis_client.publish(self.channel_for(to_agent), data)
+
+    async def send_many(self, messages: Dict[str, Any]) -> Dict[str, int]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for to_agent, data in messages.items():
+            PubSubTransport.send(self, to_agent, data, client=pipe)
+        return self.delivery_counts(messages, await pipe.execute(raise_on_error=False))
+
+    async def subscribe(self):
+        self.pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(self.channel_for(self.agent_name))
+
+    async def read_batch(self) -> List[RawMessage]:
+        batch: List[RawMessage] = []
+        message = await self.pubsub.get_message(timeout=self.block_ms / 1000)
+        while message is not None:
+            if message.get("type") == "message":
+                batch.append((None, message["data"]))
+            if len(batch) >= self.batch_size:
+                break
+            message = await self.pubsub.get_message(timeout=0)
+        return batch
+
+    async def ack(self, message_ids: List[str]):
+        pass
+
+    async def close(self):
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+
+
+class AsyncStreamsTransport(StreamsTransport):
+    """StreamsTransport on a redis.asyncio client"""
+
+    async def send(self, to_agent: str, data: Any):
+        await self.redis_client.xadd(
+            self.stream_for(to_agent),
+            {self.DATA_FIELD: data},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    async def send_many(self, messages: Dict[str, Any]) -> Dict[str, int]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for to_agent, data in messages.items():
+            StreamsTransport.send(self, to_agent, data, client=pipe)
+        return self.delivery_counts(messages, await pipe.execute(raise_on_error=False))
+
+    async def subscribe(self):
+        try:
+            await self.redis_client.xgroup_create(
+                self.stream_for(self.agent_name), self.group_name, id="0", mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read_batch(self) -> List[RawMessage]:
+        batch = await self._reclaim()
+        if batch:
+            return batch
+
+        response = await self.redis_client.xreadgroup(
+            self.group_name,
+            self.consumer_name,
+            {self.stream_for(self.agent_name): ">"},
+            count=self.batch_size,
+            block=self.block_ms,
+        )
+        batch, trimmed = self._accept(self._entries(response))
+        await self.ack(trimmed)
+        return batch
+
+    async def _reclaim(self) -> List[RawMessage]:
+        if not self._reclaim_due():
+            return []
+        if self.in_flight:
+            await self.redis_client.xclaim(**self._touch_args())
+        result = await self.redis_client.xautoclaim(**self._autoclaim_args())
+        self._reclaim_cursor = result[0]
+        batch, trimmed = self._accept(result[1])
+        await self.ack(trimmed)
+        return batch
+
+    async def ack(self, message_ids: List[str]):
+        if message_ids:
+            self.in_flight.difference_update(message_ids)
+            await self.redis_client.xack(
+                self.stream_for(self.agent_name), self.group_name, *message_ids
+            )
+
+    async def close(self):
+        pass
+
+
+TRANSPORTS = {
+    PubSubTransport.name: PubSubTransport,
+    StreamsTransport.name: StreamsTransport,
+}
+
+ASYNC_TRANSPORTS = {
+    AsyncPubSubTransport.name: AsyncPubSubTransport,
+    AsyncStreamsTransport.name: AsyncStreamsTransport,
+}
+
+
+def transport_options_from_env(name: str) -> Dict[str, Any]:
+    """Transport tuning from AGENT_* environment variables"""
+    options = {
+        "batch_size": int(os.getenv("AGENT_BATCH_SIZE", "100")),
+        "block_ms": int(os.getenv("AGENT_BLOCK_MS", "1000")),
+    }
+    if name == StreamsTransport.name:
+        options["maxlen"] = int(os.getenv("AGENT_STREAM_MAXLEN", "10000"))
+        options["reclaim_idle_ms"] = int(os.getenv("AGENT_STREAM_RECLAIM_MS", "60000"))
+    return options
+
+
+def create_transport(name: str, redis_client: redis.Redis, agent_name: str, **kwargs):
+    """Build a transport by name ('pubsub' or 'streams')"""
+    try:
+        transport_cls = TRANSPORTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown agent transport: {name}")
+    return transport_cls(redis_client, agent_name, **kwargs)
+
+
+def create_async_transport(name: str, redis_client, agent_name: str, **kwargs):
+    """Build an asyncio transport by name for a redis.asyncio client"""
+    try:
+        transport_cls = ASYNC_TRANSPORTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown agent transport: {name}")
+    return transport_cls(redis_client, agent_name, **kwargs)
@@ -12,15 +12,17 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from agents.base_agent import BaseAgent
 
 class UIAgent(BaseAgent):
-    def __init__(self):
-        super().__init__("ui", "SvelteKit + Southwest Theme Specialist")
+    def __init__(self, **kwargs):
+        super().__init__("ui", "SvelteKit + Southwest Theme Specialist", **kwargs)
         
     def setup(self):
         """Setup UI Agent handlers"""
         self.register_handler("initialize", self.handle_initialize)
-        self.register_handler("setup_sveltekit", self.handle_setup_sveltekit)
+        # npm scaffolding is slow and must not run twice in parallel
+        self.register_handler("setup_sveltekit", self.handle_setup_sveltekit, concurrency=1,
+                              priority="low")
         self.register_handler("integrate_components", self.handle_integrate_components)
-        self.register_handler("status_request", self.handle_status_request)
+        self.register_handler("status_request", self.handle_status_request, priority="high")
         
         print("🎨 UI Agent ready!")
         print("🎯 Specializing in: SvelteKit + Southwest Theme + Responsive Design")
@@ -6,7 +6,7 @@ Agent Configuration für Warp 2.0 Multi-Agent System
 """
 
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Union
 from dataclasses import dataclass
 
 @dataclass
@@ -106,36 +106,49 @@ class AgentLabConfig:
             )
         }
         
-        # Development phases
+        # Development phases: a phase starts once all depends_on phases are
+        # done and is done once every completes_on "<agent>_<phase>"
+        # phase_complete message arrived
         self.phases = [
             {
                 "name": "init",
                 "description": "Initialize all agents",
                 "required_agents": ["main", "ui", "leaflet", "github"],
+                "depends_on": [],
+                "completes_on": ["ui_init", "leaflet_init", "github_init"],
                 "estimated_time": "2-3 minutes"
             },
             {
                 "name": "sveltekit_setup", 
                 "description": "SvelteKit + Southwest theme setup",
                 "required_agents": ["ui"],
+                "depends_on": ["init"],
+                "completes_on": ["ui_sveltekit_setup"],
                 "estimated_time": "5-8 minutes"
             },
             {
                 "name": "leaflet_integration",
                 "description": "Map component integration",
                 "required_agents": ["leaflet"],
+                # The component goes into the SvelteKit project
+                "depends_on": ["sveltekit_setup"],
+                "completes_on": ["leaflet_map_component"],
                 "estimated_time": "8-12 minutes"
             },
             {
                 "name": "github_setup",
                 "description": "Repository and CI/CD setup", 
                 "required_agents": ["github"],
+                "depends_on": ["init"],
+                "completes_on": ["github_repository_setup"],
                 "estimated_time": "10-15 minutes"
             },
             {
                 "name": "final_integration",
                 "description": "Final integration and testing",
                 "required_agents": ["ui", "leaflet", "github"],
+                "depends_on": ["sveltekit_setup", "leaflet_integration", "github_setup"],
+                "completes_on": ["ui_final_integration"],
                 "estimated_time": "5-10 minutes"
             }
         ]
@@ -197,6 +210,19 @@ class AgentLabConfig:
                 return phase
         return None
         
+    def resolve_targets(self, targets: Union[str, List[str]], exclude: Optional[str] = None) -> List[str]:
+        """Agent names for a list of names, one name, a capability or "*" (all agents)"""
+        if isinstance(targets, str):
+            if targets == "*":
+                names = list(self.agents)
+            elif targets in self.agents:
+                names = [targets]
+            else:
+                names = [name for name, agent in self.agents.items() if targets in agent.capabilities]
+        else:
+            names = list(dict.fromkeys(targets))
+        return [name for name in names if name != exclude]
+        
     def validate_dependencies(self, agent_name: str, active_agents: List[str]) -> bool:
         """Check if agent dependencies are satisfied"""
         agent_config = self.get_agent_config(agent_name)
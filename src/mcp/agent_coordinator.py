@@ -8,23 +8,225 @@ Koordiniert zwischen Redis und MCP für optimales Warp 2.0 Experience
 import redis
 import json
 import asyncio
+import heapq
 import os
 import sys
 import time
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Set, Tuple, Union
 import logging
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.agent_config import config
+from agents.transport import create_transport
+from agents.codec import ChannelCodecs, decode, epoch_ms
+from agents.journal import StatusJournal, apply_status_event
+from agents.replicas import ReplicaRegistry, ReplicaRouter, role_of
+from agents.state_store import AgentStateStore, FencedOut, MemoryExporter, default_owner
+
+class PhaseStateMachine:
+    """
+    Phase readiness from per-phase counters of ready required agents
+    
+    A status change touches only the phases that require that agent, so
+    update() is O(1) in the number of agents and phases. Each phase is
+    reported ready at most once; agents dropping out afterwards do not
+    re-arm it.
+    """
+    
+    READY_STATUSES = ("ready", "active")
+    
+    def __init__(self, phases: List[Dict[str, Any]], current_phase: str,
+                 ready_phases: Optional[List[str]] = None):
+        self.phases = {phase["name"]: phase for phase in phases}
+        self.required = {name: len(set(phase["required_agents"])) for name, phase in self.phases.items()}
+        self.ready_counts = {name: 0 for name in self.phases}
+        self.phases_by_agent: Dict[str, List[str]] = {}
+        for name, phase in self.phases.items():
+            for agent_name in set(phase["required_agents"]):
+                self.phases_by_agent.setdefault(agent_name, []).append(name)
+        self.ready_agents: Set[str] = set()
+        # Ready instances per role (the role itself or its replicas)
+        self.ready_instances: Dict[str, Set[str]] = {}
+        self.announced: Set[str] = set(ready_phases or [])
+        self.current_phase = current_phase
+        
+    def update(self, agent_name: str, status: str) -> Optional[str]:
+        """Apply one status; returns the current phase if it just became ready
+        
+        Replicas ("ui@1") count for their role, which is ready while at
+        least one of its instances is.
+        """
+        role = role_of(agent_name)
+        instances = self.ready_instances.setdefault(role, set())
+        if status in self.READY_STATUSES:
+            instances.add(agent_name)
+        else:
+            instances.discard(agent_name)
+        ready = bool(instances)
+        if ready == (role in self.ready_agents):
+            return None
+        if ready:
+            self.ready_agents.add(role)
+        else:
+            self.ready_agents.discard(role)
+        delta = 1 if ready else -1
+        for phase in self.phases_by_agent.get(role, ()):
+            self.ready_counts[phase] += delta
+        return self.check() if ready else None
+        
+    def set_current_phase(self, phase: str) -> Optional[str]:
+        self.current_phase = phase
+        return self.check()
+        
+    def check(self) -> Optional[str]:
+        """Current phase if all its agents are ready and it was not announced yet"""
+        phase = self.current_phase
+        if phase not in self.phases or phase in self.announced:
+            return None
+        if self.ready_counts[phase] < self.required[phase]:
+            return None
+        self.announced.add(phase)
+        return phase
+        
+    def ready_agents_for(self, phase: str) -> List[str]:
+        return [name for name in self.phases[phase]["required_agents"] if name in self.ready_agents]
+        
+    def progress(self) -> Dict[str, str]:
+        """Ready/required per phase, e.g. {"init": "3/4"}"""
+        return {name: f"{self.ready_counts[name]}/{self.required[name]}" for name in self.phases}
+
+class HeartbeatMonitor:
+    """
+    Heartbeat deadlines in a min-heap, one entry per agent
+    
+    beat() only moves the agent's deadline (O(1)); expire() pops entries
+    that are due and re-pushes those whose deadline moved in the meantime,
+    so the heap holds at most one entry per agent. The unhealthy set is
+    maintained incrementally, reading it costs O(1).
+    """
+    
+    def __init__(self, timeouts: Dict[str, float], default_timeout: float):
+        self.timeouts = timeouts
+        self.default_timeout = default_timeout
+        self.deadlines: Dict[str, float] = {}
+        self.unhealthy: Set[str] = set()
+        self._heap: List[Tuple[float, str]] = []
+        
+    def beat(self, agent_name: str, now: float) -> bool:
+        """Record a sign of life; True if the agent was unhealthy until now"""
+        # Replicas ("ui@2") share their role's timeout
+        timeout = self.timeouts.get(agent_name) or self.timeouts.get(role_of(agent_name), self.default_timeout)
+        deadline = now + timeout
+        if agent_name not in self.deadlines:
+            heapq.heappush(self._heap, (deadline, agent_name))
+        self.deadlines[agent_name] = deadline
+        if agent_name in self.unhealthy:
+            self.unhealthy.discard(agent_name)
+            # Its heap entry was consumed when it expired
+            heapq.heappush(self._heap, (deadline, agent_name))
+            return True
+        return False
+        
+    def expire(self, now: float) -> List[str]:
+        """Agents whose deadline passed since the last call"""
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, agent_name = heapq.heappop(self._heap)
+            deadline = self.deadlines[agent_name]
+            if deadline > now:
+                heapq.heappush(self._heap, (deadline, agent_name))
+            else:
+                self.unhealthy.add(agent_name)
+                expired.append(agent_name)
+        return expired
+        
+    def next_deadline(self) -> Optional[float]:
+        """Earliest deadline in the heap (may be stale-early, never late)"""
+        return self._heap[0][0] if self._heap else None
+
+class LeaderElection:
+    """
+    Coordinator leadership via a Redis lease with fencing tokens
+    
+    Every instance calls tick() every ttl/3: the leader renews, standbys
+    try to acquire. The leader's lease counts from before the Redis call,
+    so it stops acting before Redis can hand the lease to someone else,
+    even when renewals fail. Each new leader gets a larger token; writes
+    carrying an older one are rejected by the store.
+    """
+    
+    LEASE = "coordinator"
+    
+    def __init__(self, store: AgentStateStore, owner: str, ttl_ms: int,
+                 logger: Optional[logging.Logger] = None):
+        self.store = store
+        self.owner = owner
+        self.ttl_ms = ttl_ms
+        self.logger = logger or logging.getLogger("LeaderElection")
+        self.token = 0
+        self.valid_until = 0.0
+        self.next_tick = 0.0
+        self._leading = False
+        
+    @property
+    def is_leader(self) -> bool:
+        return self.token > 0 and time.monotonic() < self.valid_until
+        
+    @property
+    def fence(self) -> Tuple[str, int]:
+        return (self.LEASE, self.token)
+        
+    def tick(self) -> Optional[bool]:
+        """Acquire or renew; True if we just became leader, False if we just lost it"""
+        started = time.monotonic()
+        self.next_tick = started + self.ttl_ms / 3000
+        try:
+            token = self.store.acquire_leadership(self.LEASE, self.owner, self.ttl_ms)
+            if token:
+                self.token = token
+                self.valid_until = started + self.ttl_ms / 1000
+            else:
+                self.token = 0
+        except Exception as e:
+            # Leadership runs out with valid_until
+            self.logger.error(f"❌ Lease renewal failed: {e}")
+        return self._transition()
+        
+    def step_down(self, release: bool = True) -> Optional[bool]:
+        if release and self.token:
+            try:
+                self.store.release_lease(self.LEASE, self.owner)
+            except Exception as e:
+                self.logger.error(f"❌ Lease release failed: {e}")
+        self.token = 0
+        return self._transition()
+        
+    def _transition(self) -> Optional[bool]:
+        leading = self.is_leader
+        if leading == self._leading:
+            return None
+        self._leading = leading
+        return leading
 
 class AgentCoordinator:
     """
     Central coordinator for multi-agent development
     Manages agent lifecycle, communication, and status reporting
+    
+    Consumes agent_status_update and agent_heartbeat in batches and keeps
+    an in-memory model of agent status, so phase checks react within one
+    event batch instead of on the monitoring poll.
+    
+    Several coordinators may run; one is elected leader and does the
+    writes and announcements. Standbys consume the same events, so their
+    model is warm and a takeover only re-reads the phase state.
     """
     
+    # Channels the coordinator consumes
+    EVENT_CHANNELS = ("agent_status_update", "agent_heartbeat", "phase_transition")
+    
     def __init__(self):
         self.redis_url = config.redis_url
         self.agent_lab_path = config.agent_lab_path
@@ -39,9 +241,29 @@ class AgentCoordinator:
             print(f"❌ Redis connection failed: {e}")
             raise
             
+        # Same codecs and transport the agents use
+        self.codecs = ChannelCodecs.from_env(self.redis_client)
+        self.transport = create_transport(
+            os.getenv('AGENT_TRANSPORT', 'pubsub'), self.redis_client, "coordinator"
+        )
+        # Commands to a role that runs as replicas go to one of them
+        self.router = ReplicaRouter(ReplicaRegistry(self.redis_client))
+            
         # Agent tracking
         self.active_agents: Dict[str, Dict] = {}
         self.agent_heartbeats: Dict[str, datetime] = {}
+        # Heartbeat deadlines per agent: AgentConfig.timeout, else COORDINATOR_HEARTBEAT_TIMEOUT
+        self.health = HeartbeatMonitor(
+            {name: agent.timeout for name, agent in config.agents.items()},
+            float(os.getenv('COORDINATOR_HEARTBEAT_TIMEOUT', '120'))
+        )
+        # In-memory model, seeded from Redis and updated by events
+        self.agent_status: Dict[str, str] = {}
+        self.batch_size = int(os.getenv('COORDINATOR_BATCH_SIZE', '100'))
+        # get_coordination_status() result, rebuilt after the next change
+        self.status_version = 0
+        self._status_changed_at = datetime.utcnow()
+        self._status_cache: Optional[Dict[str, Any]] = None
         
         # Setup logging
         logging.basicConfig(level=logging.INFO)
@@ -53,12 +275,59 @@ class AgentCoordinator:
     def init_coordination_system(self):
         """Initialize the coordination system"""
         try:
-            # Create memory file if it doesn't exist
-            if not os.path.exists(self.memory_file):
-                self.create_initial_memory()
+            # Agent/phase state lives in Redis hashes shared with the agents
+            # and the bridge; seeding never overwrites existing fields
+            self.state = AgentStateStore(self.redis_client)
+            
+            # Status changes written here are journaled too; the export folds
+            # the journal into the memory file, a restart replays its tail
+            self.journal = StatusJournal(
+                self.memory_file,
+                "coordinator",
+                apply_status_event,
+                compact_every=int(os.getenv('COORDINATOR_COMPACT_EVERY', '100')),
+                compact_interval=float(os.getenv('COORDINATOR_COMPACT_INTERVAL', '5'))
+            )
+            self.replay_journal()
+            self.state.seed(self.create_initial_memory())
+            snapshot = self.state.snapshot()
+            self.agent_status = {
+                name: info.get("status", "unknown") for name, info in snapshot["agents"].items()
+            }
+            
+            # Phase readiness counters; phases marked ready in Redis are
+            # not announced again after a restart
+            self.phase_machine = PhaseStateMachine(
+                config.phases,
+                snapshot["coordination"].get("current_phase", "init"),
+                [name for name, phase in snapshot["phases"].items() if phase.get("status") == "ready"]
+            )
+            for agent_name, status in self.agent_status.items():
+                self.phase_machine.update(agent_name, status)
+            
+            # Lease owner id, unique per instance even with several in one process
+            owner = f"{default_owner('coordinator')}:{os.urandom(4).hex()}"
+            
+            # Leader election (COORDINATOR_LEASE_MS), standbys stay warm
+            self.election = LeaderElection(
+                self.state,
+                owner,
+                int(os.getenv('COORDINATOR_LEASE_MS', '5000')),
+                logger=self.logger
+            )
+            
+            # Memory file for the MCP memory server, written by whichever
+            # bridge or coordinator holds the exporter lease
+            self.exporter = MemoryExporter(
+                self.memory_file,
+                owner,
+                lease_ms=int(os.getenv('STATE_EXPORT_LEASE_MS', '5000')),
+                journal=self.journal
+            )
                 
             # Set up Redis channels for coordination
             self.setup_redis_channels()
+            self.run_election()
             
             self.logger.info("🎭 Agent Coordinator initialized")
             
@@ -66,7 +335,7 @@ class AgentCoordinator:
             self.logger.error(f"❌ Coordination system init failed: {e}")
             raise
             
-    def create_initial_memory(self):
+    def create_initial_memory(self) -> Dict[str, Any]:
         """Create initial memory structure for MCP"""
         initial_memory = {
             "coordination": {
@@ -99,16 +368,10 @@ class AgentCoordinator:
                 "role": agent_config.role,
                 "capabilities": agent_config.capabilities,
                 "dependencies": agent_config.dependencies,
-                "last_seen": None,
-                "tasks": [],
-                "errors": []
+                "last_update": None
             }
             
-        # Write to file
-        with open(self.memory_file, 'w') as f:
-            json.dump(initial_memory, f, indent=2)
-            
-        self.logger.info(f"📝 Initial memory created: {self.memory_file}")
+        return initial_memory
         
     def setup_redis_channels(self):
         """Setup Redis pub/sub channels for coordination"""
@@ -122,34 +385,112 @@ class AgentCoordinator:
         for channel in self.coordination_channels:
             # Test channel connectivity
             try:
-                self.redis_client.publish(channel, json.dumps({
+                self.redis_client.publish(channel, self.codecs.encode_for_channel(channel, {
                     "type": "coordinator_init",
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": epoch_ms()
                 }))
             except Exception as e:
                 self.logger.warning(f"Channel setup warning for {channel}: {e}")
                 
+        # Own raw-bytes connection: agent frames may use a binary codec
+        self.pubsub_client = redis.Redis.from_url(self.redis_url, decode_responses=False)
+        # Subscribe-Acks nicht ausfiltern: sonst liefert get_message() dafür
+        # None und read_events() hält einen vollen Puffer für leer
+        self.pubsub = self.pubsub_client.pubsub()
+        self.pubsub.subscribe(*self.EVENT_CHANNELS)
+        
+    def read_events(self, timeout: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """Wait up to timeout for an event, then drain what is already buffered"""
+        events = []
+        deadline = time.monotonic() + timeout
+        while len(events) < self.batch_size:
+            # Bis zum ersten Event warten, danach nur noch den Puffer leeren
+            remaining = 0 if events else max(0.0, deadline - time.monotonic())
+            message = self.pubsub.get_message(timeout=remaining)
+            if message is None:
+                if events or time.monotonic() >= deadline:
+                    break
+                continue
+            # subscribe/unsubscribe-Acks überspringen
+            if message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            try:
+                events.append((channel.decode() if isinstance(channel, bytes) else channel,
+                               decode(message["data"])))
+            except Exception as e:
+                self.logger.warning(f"Invalid event on {channel}: {e}")
+        return events
+        
+    def process_events(self, events: List[Tuple[str, Dict[str, Any]]]):
+        """Apply a batch of events to the model; one phase check per batch"""
+        for channel, event in events:
+            if channel == "phase_transition":
+                self.apply_phase_event(event)
+                continue
+            agent_name = event.get("agent")
+            if not agent_name:
+                continue
+            # Every event is a sign of life
+            self.record_heartbeat(agent_name)
+            # Status is already in Redis, the agent wrote it with the publish
+            if channel == "agent_status_update" and "status" in event:
+                self.apply_status(agent_name, event["status"], event.get("task"))
+            elif event.get("event") == "agent_registered" and agent_name not in self.active_agents:
+                # Registered on another coordinator
+                self.track_registration(agent_name, event.get("info") or {})
+                
+    def apply_phase_event(self, event: Dict[str, Any]):
+        """Phase announcements of the leader (our own included)"""
+        phase = event.get("phase")
+        if not phase:
+            return
+        if event.get("event") == "phase_ready":
+            self.phase_machine.announced.add(phase)
+        elif event.get("event") == "current_phase":
+            self.phase_machine.current_phase = phase
+        self.invalidate_status()
+        
+    def track_registration(self, agent_name: str, agent_info: Dict[str, Any]):
+        self.active_agents[agent_name] = {
+            **agent_info,
+            "registered_at": datetime.utcnow(),
+            "status": "active"
+        }
+        self.apply_status(agent_name, "active")
+                
+    def apply_status(self, agent_name: str, status: str, task: Optional[str] = None):
+        """Update the in-memory model; announces the current phase when it becomes ready"""
+        if agent_name in self.active_agents:
+            self.active_agents[agent_name]["status"] = status
+            if task:
+                self.active_agents[agent_name]["current_task"] = task
+        self.agent_status[agent_name] = status
+        ready_phase = self.phase_machine.update(agent_name, status)
+        # The snapshot reports the active set, active_agents and phase progress
+        self.invalidate_status()
+        # Standbys only count; announced phases are re-read on takeover
+        if ready_phase and self.election.is_leader:
+            self.announce_phase_ready(ready_phase)
+                
     def register_agent(self, agent_name: str, agent_info: Dict[str, Any]):
         """Register an agent with the coordinator"""
         try:
             # Update active agents tracking
-            self.active_agents[agent_name] = {
-                **agent_info,
-                "registered_at": datetime.utcnow(),
-                "status": "active"
-            }
+            self.track_registration(agent_name, agent_info)
             
             # Update heartbeat
-            self.agent_heartbeats[agent_name] = datetime.utcnow()
+            self.record_heartbeat(agent_name)
             
             # Update memory file
             self.update_agent_memory(agent_name, "active", "Agent registered and ready")
             
             # Publish registration event
-            self.redis_client.publish("agent_status_update", json.dumps({
+            self.redis_client.publish("agent_status_update", self.codecs.encode_for_channel("agent_status_update", {
                 "event": "agent_registered",
                 "agent": agent_name,
-                "timestamp": datetime.utcnow().isoformat()
+                "info": agent_info,
+                "timestamp": epoch_ms()
             }))
             
             self.logger.info(f"✅ Agent registered: {agent_name}")
@@ -161,19 +502,11 @@ class AgentCoordinator:
         """Update agent status in coordination system"""
         try:
             # Update heartbeat
-            self.agent_heartbeats[agent_name] = datetime.utcnow()
+            self.record_heartbeat(agent_name)
             
-            # Update active agents
-            if agent_name in self.active_agents:
-                self.active_agents[agent_name]["status"] = status
-                if task:
-                    self.active_agents[agent_name]["current_task"] = task
-                    
-            # Update memory
+            # Update shared state, then the model (may announce a phase)
             self.update_agent_memory(agent_name, status, task)
-            
-            # Check for phase transitions
-            self.check_phase_transition()
+            self.apply_status(agent_name, status, task)
             
             self.logger.info(f"📊 {agent_name}: {status}" + (f" - {task}" if task else ""))
             
@@ -181,166 +514,313 @@ class AgentCoordinator:
             self.logger.error(f"❌ Status update failed for {agent_name}: {e}")
             
     def update_agent_memory(self, agent_name: str, status: str, task: Optional[str] = None):
-        """Update agent status in MCP memory file"""
+        """Write an agent status change to the shared Redis state and journal it"""
         try:
-            # Load current memory
-            with open(self.memory_file, 'r') as f:
-                memory = json.load(f)
-                
-            # Update agent entry
-            if agent_name not in memory["agents"]:
-                memory["agents"][agent_name] = {
-                    "status": "unknown",
-                    "tasks": [],
-                    "errors": []
-                }
-                
-            memory["agents"][agent_name]["status"] = status
-            memory["agents"][agent_name]["last_seen"] = datetime.utcnow().isoformat()
-            
-            if task:
-                memory["agents"][agent_name]["tasks"].append({
-                    "task": task,
-                    "timestamp": datetime.utcnow().isoformat()
-                })
-                # Keep only last 10 tasks
-                memory["agents"][agent_name]["tasks"] = memory["agents"][agent_name]["tasks"][-10:]
-                
-            # Update coordination stats
-            active_count = sum(1 for agent in memory["agents"].values() 
-                             if agent["status"] in ["active", "working", "ready"])
-            memory["coordination"]["active_agents"] = active_count
-            memory["coordination"]["last_update"] = datetime.utcnow().isoformat()
-            
-            # Save updated memory
-            with open(self.memory_file, 'w') as f:
-                json.dump(memory, f, indent=2)
-                
+            event = {
+                "agent": agent_name,
+                "status": status,
+                "task": task,
+                "at": datetime.utcnow().isoformat(),
+                "updated_ms": epoch_ms()
+            }
+            self.state.record_status(agent_name, status, task, event["at"], event["updated_ms"])
+            self.journal.append([event])
         except Exception as e:
             self.logger.error(f"❌ Memory update failed for {agent_name}: {e}")
             
+    def replay_journal(self):
+        """Crash replay: fold the journal tail, restore Redis from the file if it came back empty"""
+        snapshot, tail = self.journal.recover(dict)
+        if tail:
+            self.logger.info(f"📝 Replayed {len(tail)} journaled status events into {self.memory_file}")
+        if self.state.version():
+            return
+        if snapshot.get("agents") or snapshot.get("phases"):
+            self.state.restore(snapshot)
+            self.logger.info(f"♻️ Redis state restored from {self.memory_file}")
+            
+    def export_memory(self) -> bool:
+        """Materialize the Redis state as the MCP memory file if we hold the lease"""
+        try:
+            return self.exporter.export(self.state)
+        except Exception as e:
+            self.logger.error(f"❌ Memory export failed: {e}")
+            return False
+            
     def check_phase_transition(self):
-        """Check if we can transition to next phase"""
+        """Announce the current phase if all its agents are ready (once per phase, leader only)"""
+        if not self.election.is_leader:
+            return
+        ready_phase = self.phase_machine.check()
+        if ready_phase:
+            self.announce_phase_ready(ready_phase)
+            
+    def set_current_phase(self, phase: str):
+        """Move coordination to another phase; announced at once if already satisfied"""
+        if not self.election.is_leader:
+            self.logger.warning(f"⚠️ Not the leader, phase change to {phase} ignored")
+            return
         try:
-            with open(self.memory_file, 'r') as f:
-                memory = json.load(f)
-                
-            current_phase = memory["coordination"]["current_phase"]
-            phase_config = config.get_phase_config(current_phase)
+            self.state.update_coordination({"current_phase": phase}, fence=self.election.fence)
+            # Standbys and the bridge follow the phase change
+            self.redis_client.publish("phase_transition", self.codecs.encode_for_channel("phase_transition", {
+                "event": "current_phase",
+                "phase": phase,
+                "timestamp": epoch_ms()
+            }))
+            self.invalidate_status()
+            ready_phase = self.phase_machine.set_current_phase(phase)
+            if ready_phase:
+                self.announce_phase_ready(ready_phase)
+        except FencedOut as e:
+            self.lose_leadership(e)
+        except Exception as e:
+            self.logger.error(f"❌ Phase change to {phase} failed: {e}")
             
-            if not phase_config:
-                return
-                
-            # Check if all required agents are ready for this phase
-            required_agents = phase_config["required_agents"]
-            ready_agents = [
-                name for name, info in memory["agents"].items()
-                if info["status"] in ["ready", "active"] and name in required_agents
-            ]
-            
-            if len(ready_agents) == len(required_agents):
-                self.logger.info(f"🎯 Phase {current_phase} ready - all agents available")
-                
-                # Publish phase ready event
-                self.redis_client.publish("phase_transition", json.dumps({
-                    "event": "phase_ready",
-                    "phase": current_phase,
-                    "ready_agents": ready_agents,
-                    "timestamp": datetime.utcnow().isoformat()
-                }))
-                
+    def announce_phase_ready(self, phase: str):
+        """Mark the phase ready in Redis and publish phase_ready"""
+        try:
+            ready_agents = self.phase_machine.ready_agents_for(phase)
+            self.logger.info(f"🎯 Phase {phase} ready - all agents available")
+            self.state.update_phase(phase, {
+                "status": "ready",
+                "ready_agents": ready_agents,
+                "ready_at": datetime.utcnow().isoformat()
+            }, fence=self.election.fence)
+            self.invalidate_status()
+            
+            # Publish phase ready event
+            self.redis_client.publish("phase_transition", self.codecs.encode_for_channel("phase_transition", {
+                "event": "phase_ready",
+                "phase": phase,
+                "ready_agents": ready_agents,
+                "timestamp": epoch_ms()
+            }))
+            
+        except FencedOut as e:
+            self.lose_leadership(e)
         except Exception as e:
             self.logger.error(f"❌ Phase transition check failed: {e}")
             
-    def monitor_agent_health(self):
-        """Monitor agent health via heartbeats"""
-        unhealthy_agents = []
-        current_time = datetime.utcnow()
+    def run_election(self):
+        """One election round: renew or acquire the lease, handle a change of role"""
+        changed = self.election.tick()
+        if changed is not None:
+            self.invalidate_status()
+        if changed is True:
+            self.take_over()
+        elif changed is False:
+            self.logger.warning("⚠️ Coordinator leadership lost, continuing as standby")
+            
+    def take_over(self):
+        """Became leader: re-read the phase state the old leader wrote
         
-        for agent_name, last_heartbeat in self.agent_heartbeats.items():
-            # Check if agent hasn't sent heartbeat in 2 minutes
-            if current_time - last_heartbeat > timedelta(minutes=2):
-                unhealthy_agents.append(agent_name)
-                self.logger.warning(f"⚠️ Agent {agent_name} appears unhealthy (last seen: {last_heartbeat})")
-                
-        return unhealthy_agents
+        Agent status, heartbeats and readiness counters are already warm
+        from the event stream; phases the old leader did not announce
+        before it died are announced now.
+        """
+        self.logger.info(f"👑 Coordinator leadership acquired (token {self.election.token})")
+        try:
+            snapshot = self.state.snapshot()
+            self.phase_machine.current_phase = snapshot["coordination"].get(
+                "current_phase", self.phase_machine.current_phase
+            )
+            self.phase_machine.announced = {
+                name for name, phase in snapshot["phases"].items() if phase.get("status") == "ready"
+            }
+            self.check_phase_transition()
+        except Exception as e:
+            self.logger.error(f"❌ Takeover sync failed: {e}")
+            
+    def lose_leadership(self, reason: Exception):
+        """A fenced write was rejected: another coordinator took over"""
+        self.logger.warning(f"⚠️ Write fenced out ({reason}), stepping down")
+        self.election.step_down(release=False)
+        self.invalidate_status()
+            
+    def record_heartbeat(self, agent_name: str):
+        self.agent_heartbeats[agent_name] = datetime.utcnow()
+        if self.health.beat(agent_name, time.monotonic()):
+            self.logger.info(f"💚 Agent {agent_name} is healthy again")
+            self.invalidate_status()
+            
+    def monitor_agent_health(self) -> List[str]:
+        """Flag agents whose heartbeat deadline passed; returns the newly unhealthy ones
+        
+        Only due heap entries are touched, O(log n) per expired deadline.
+        """
+        expired = self.health.expire(time.monotonic())
+        for agent_name in expired:
+            self.logger.warning(
+                f"⚠️ Agent {agent_name} appears unhealthy (last seen: {self.agent_heartbeats[agent_name]})"
+            )
+        if expired:
+            self.invalidate_status()
+        return expired
+        
+    def invalidate_status(self):
+        """Something get_coordination_status() reports changed"""
+        self.status_version += 1
+        self._status_changed_at = datetime.utcnow()
+        self._status_cache = None
         
-    def get_coordination_status(self) -> Dict[str, Any]:
-        """Get current coordination status"""
+    def get_coordination_status(self, since_version: Optional[int] = None) -> Dict[str, Any]:
+        """Get current coordination status
+        
+        Served from a snapshot that is rebuilt only after an agent, phase,
+        health or leadership change; "version" counts those changes. With
+        since_version equal to the current version only
+        {"version": n, "changed": False} is returned. "last_update" is the
+        time of the change the snapshot reflects. The returned dict is
+        shared between callers, do not modify it.
+        """
+        if since_version is not None and since_version == self.status_version:
+            return {"version": self.status_version, "changed": False}
+        if self._status_cache is None:
+            status = self._build_coordination_status()
+            if "error" in status:
+                return status
+            self._status_cache = status
+        return self._status_cache
+        
+    def _build_coordination_status(self) -> Dict[str, Any]:
         try:
-            with open(self.memory_file, 'r') as f:
-                memory = json.load(f)
-                
-            unhealthy_agents = self.monitor_agent_health()
+            memory = self.state.snapshot()
+            unhealthy_agents = sorted(self.health.unhealthy)
             
             return {
+                "version": self.status_version,
+                "changed": True,
                 "coordination": memory["coordination"],
                 "active_agents": len(self.active_agents),
                 "total_agents": len(config.agents),
                 "unhealthy_agents": unhealthy_agents,
-                "phases": memory["phases"],
-                "last_update": datetime.utcnow().isoformat()
+                "phases": memory.get("phases", {}),
+                "phase_progress": self.phase_machine.progress(),
+                "leader": {
+                    "is_leader": self.election.is_leader,
+                    "holder": self.state.lease_holder(LeaderElection.LEASE),
+                    "token": self.election.token
+                },
+                "last_update": self._status_changed_at.isoformat()
             }
             
         except Exception as e:
             self.logger.error(f"❌ Status retrieval failed: {e}")
             return {"error": str(e)}
             
-    def send_coordination_command(self, command: str, targets: List[str], payload: Dict[str, Any]):
-        """Send coordination command to agents"""
+    def get_agent_history(self, agent_name: str, start_ms: Optional[int] = None,
+                          end_ms: Optional[int] = None, resolution: Optional[str] = None) -> Dict[str, Any]:
+        """Status history of one agent by time range (raw, per-minute or per-hour rollups)"""
         try:
+            return self.state.history(agent_name, start_ms, end_ms, resolution)
+        except Exception as e:
+            self.logger.error(f"❌ History query failed for {agent_name}: {e}")
+            return {"error": str(e)}
+            
+    def send_coordination_command(self, command: str, targets: Union[str, List[str]],
+                                  payload: Dict[str, Any]) -> Dict[str, int]:
+        """Send coordination command to agents
+        
+        targets: agent names, a capability or "*". The channel publish and
+        all agent messages go out in one pipeline; returns the delivery
+        count per target.
+        """
+        try:
+            names = [name for name in config.resolve_targets(targets) if name in config.agents]
             message = {
                 "command": command,
-                "targets": targets,
+                "targets": names,
                 "payload": payload,
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": epoch_ms(),
                 "sender": "coordinator"
             }
+            addresses = {name: self.router.route(name, payload) for name in names}
+            # Encoded once for all agent channels
+            frames = self.codecs.encode_for_agents(list(addresses.values()), {
+                "from": "coordinator",
+                "to": names,
+                "type": "coordination_command",
+                "payload": {
+                    "command": command,
+                    **payload
+                },
+                "timestamp": epoch_ms()
+            })
             
+            pipe = self.redis_client.pipeline(transaction=False)
             # Send to coordination command channel
-            self.redis_client.publish("coordination_command", json.dumps(message))
-            
+            pipe.publish(
+                "coordination_command", self.codecs.encode_for_channel("coordination_command", message)
+            )
             # Also send to individual agent channels
-            for target in targets:
-                if target in config.agents:
-                    channel = f"agent_{target}"
-                    self.redis_client.publish(channel, json.dumps({
-                        "from": "coordinator",
-                        "to": target,
-                        "type": "coordination_command",
-                        "payload": {
-                            "command": command,
-                            **payload
-                        },
-                        "timestamp": datetime.utcnow().isoformat()
-                    }))
+            for name, data in frames.items():
+                self.transport.send(name, data, client=pipe)
+            results = pipe.execute(raise_on_error=False)
+            sent = self.transport.delivery_counts(frames, results[1:])
+            deliveries = {name: sent.get(address, 0) for name, address in addresses.items()}
                     
-            self.logger.info(f"📤 Coordination command sent: {command} → {targets}")
+            self.logger.info(f"📤 Coordination command sent: {command} → {deliveries}")
+            return deliveries
             
         except Exception as e:
             self.logger.error(f"❌ Command send failed: {e}")
+            return {}
             
     def start_monitoring(self):
-        """Start monitoring loop"""
+        """Start monitoring loop
+        
+        Blocks on the event channels until the next heartbeat deadline,
+        memory export or status summary is due.
+        """
         self.logger.info("👁️ Starting agent monitoring...")
+        export_interval = float(os.getenv('STATE_EXPORT_INTERVAL_MS', '1000')) / 1000
+        summary_interval = float(os.getenv('COORDINATOR_SUMMARY_INTERVAL', '30'))
+        next_export = next_summary = time.monotonic()
         
         try:
             while True:
-                # Health check
+                wake_at = min(next_export, next_summary, self.election.next_tick)
+                deadline = self.health.next_deadline()
+                if deadline is not None:
+                    wake_at = min(wake_at, deadline)
+                events = self.read_events(max(0.0, wake_at - time.monotonic()))
+                if events:
+                    self.process_events(events)
+                    
+                # Flags agents the moment their deadline passes
                 unhealthy = self.monitor_agent_health()
                 if unhealthy:
                     self.logger.warning(f"⚠️ Unhealthy agents detected: {unhealthy}")
                     
-                # Status summary every 30 seconds
-                status = self.get_coordination_status()
-                self.logger.info(f"📊 Coordination: {status['active_agents']}/{status['total_agents']} agents active")
+                now = time.monotonic()
                 
-                time.sleep(30)
+                if now >= self.election.next_tick:
+                    self.run_election()
+                    
+                if now >= next_export:
+                    # Refresh the MCP memory file from the Redis state; without
+                    # the lease only our journal is folded into it
+                    if not self.export_memory():
+                        self.journal.compact_if_due()
+                    next_export = now + export_interval
+                    
+                if now >= next_summary:
+                    status = self.get_coordination_status()
+                    self.logger.info(f"📊 Coordination: {status['active_agents']}/{status['total_agents']} agents active")
+                    next_summary = now + summary_interval
                 
         except KeyboardInterrupt:
             self.logger.info("🛑 Monitoring stopped by user")
         except Exception as e:
             self.logger.error(f"❌ Monitoring error: {e}")
+        finally:
+            self.pubsub.close()
+            self.export_memory()
+            self.journal.close()
+            self.state.release_lease(MemoryExporter.LEASE, self.exporter.owner)
+            # A standby takes over within one election round
+            self.election.step_down()
 
 def main():
     """Main entry point for Agent Coordinator"""
@@ -6,13 +6,42 @@ MCP-compatible JSON-RPC 2.0 interface (`stdin`/`stdout`).
 
 Supported MCP methods:
 - initialize
-- list_tools (returns empty list – no tools exposed)
+- tools/list, tools/call (agent state tools, see AGENT_TOOLS)
+- list_tools (legacy alias of tools/list)
+- resources/list, resources/read, resources/subscribe, resources/unsubscribe
+- bridge/metrics (per-method call counts and latency)
 - shutdown
 
+Batch arrays are supported; requests are dispatched concurrently and
+replies are written in completion order.
+
 Anything else returns JSON-RPC error –32601 (method not found).
 
-The bridge keeps listening on Redis `agent_status_update` channel and
-updates a JSON memory file so that Warp’s memory MCP server can serve it.
+Agent and phase state lives in Redis hashes (agents/state_store.py):
+agents write their own status, the coordinator writes phases. The bridge
+listens on `agent_status_update` / `phase_transition` to keep its query
+index current and, while it holds the exporter lease, materializes the
+state as the JSON memory file Warp’s memory MCP server serves (at most
+every STATE_EXPORT_INTERVAL_MS, only when the state version moved).
+
+Every status notification is also appended to a JSONL journal next to
+the memory file (agents/journal.py), one write per drained batch. The
+export folds the journal into the file and truncates it; a restart
+replays the journal tail and, if Redis came back empty, restores the
+agent and phase state from the recovered file.
+
+Everything runs on one asyncio event loop: stdin is read through a
+StreamReader, stdout written through a StreamWriter and the Redis
+subscription uses redis.asyncio. Only the file write of an export runs
+in a worker thread. Tool calls are answered from an in-memory index the
+listener keeps current, never from the file; get_agent_history reads the
+per-agent time series from Redis.
+
+The same index is published as MCP resources (agent-lab://agents,
+agent-lab://agents/<name>, agent-lab://phases, agent-lab://phases/<name>).
+Subscribed clients get notifications/resources/updated when the listener
+applies a change; per resource at most one notification every
+BRIDGE_NOTIFY_INTERVAL_MS, a burst in between is coalesced into one.
 """
 
 from __future__ import annotations
@@ -21,12 +50,26 @@ import asyncio
 import json
 import os
 import sys
+import time
+from collections import deque
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
 
-import redis
+import redis.asyncio as aioredis
 import logging
 
+# Shared message codecs live with the agents
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.codec import decode  # noqa: E402
+from agents.journal import StatusJournal, apply_status_event  # noqa: E402
+from agents.state_store import (  # noqa: E402
+    ACTIVE_STATUSES,
+    AsyncAgentStateStore,
+    MemoryExporter,
+    default_owner,
+)
+from agents.metrics import Histogram  # noqa: E402
+
 ############################
 # Logging setup            #
 ############################
@@ -36,13 +79,289 @@ logging.basicConfig(
 )
 logger = logging.getLogger("redis-mcp-bridge")
 
+RESOURCE_PREFIX = "agent-lab://"
+
+############################
+# In-memory state index    #
+############################
+
+
+class AgentStateIndex:
+    """Agent and phase state for MCP tool calls; every query is O(1) or O(result).
+
+    Only touched from the event loop (listener and JSON-RPC handlers), so
+    it needs no lock. on_change(uri) is called for every resource an
+    update touches.
+    """
+
+    def __init__(self, recent_tasks: int = 100, tasks_per_agent: int = 10) -> None:
+        self.tasks_per_agent = tasks_per_agent
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        self.active: Set[str] = set()
+        self.recent_tasks: Deque[Dict[str, Any]] = deque(maxlen=recent_tasks)
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.current_phase: Optional[str] = None
+        self.on_change: Optional[Callable[[str], None]] = None
+
+    # Updates ------------------------------------------------------------
+    def load(self, memory: Dict[str, Any]) -> None:
+        """Sync with a state snapshot; only agents the feed has not caught up with change"""
+        changed = False
+        for name, info in memory.get("agents", {}).items():
+            updated_ms = info.get("updated_ms") or 0
+            if name in self.agents and updated_ms <= self.agents[name]["updated_ms"]:
+                continue
+            entry = self._agent(name)
+            entry["status"] = info.get("status", "unknown")
+            entry["last_update"] = info.get("last_update")
+            entry["updated_ms"] = updated_ms
+            entry["tasks"] = deque(info.get("tasks", []), maxlen=self.tasks_per_agent)
+            self._track_active(name, entry["status"])
+            self._changed(f"{RESOURCE_PREFIX}agents/{name}")
+            changed = True
+        if changed:
+            self._changed(f"{RESOURCE_PREFIX}agents")
+        self.load_phases(memory)
+
+    def load_phases(self, memory: Dict[str, Any]) -> None:
+        """Phase section is owned by the coordinator, refreshed after each compaction"""
+        changed = False
+        for name, info in memory.get("phases", {}).items():
+            entry = self.phases.setdefault(name, {})
+            if any(entry.get(key) != value for key, value in info.items()):
+                entry.update(info)
+                self._changed(f"{RESOURCE_PREFIX}phases/{name}")
+                changed = True
+        current_phase = memory.get("coordination", {}).get("current_phase", self.current_phase)
+        if changed or current_phase != self.current_phase:
+            self.current_phase = current_phase
+            self._changed(f"{RESOURCE_PREFIX}phases")
+
+    def apply_status(self, event: Dict[str, Any]) -> None:
+        entry = self._agent(event["agent"])
+        entry["status"] = event["status"]
+        entry["last_update"] = event["at"]
+        entry["updated_ms"] = max(entry["updated_ms"], event.get("updated_ms") or 0)
+        if event.get("task"):
+            task = {"task": event["task"], "timestamp": event["at"]}
+            entry["tasks"].append(task)
+            self.recent_tasks.append({"agent": event["agent"], **task})
+        self._track_active(event["agent"], event["status"])
+        self._changed(f"{RESOURCE_PREFIX}agents/{event['agent']}")
+        self._changed(f"{RESOURCE_PREFIX}agents")
+
+    def apply_phase(self, data: Dict[str, Any]) -> None:
+        """phase_transition channel event from the coordinator"""
+        phase = data.get("phase")
+        if not phase:
+            return
+        entry = self.phases.setdefault(phase, {})
+        if data.get("event") == "phase_ready":
+            entry["status"] = "ready"
+            entry["ready_agents"] = data.get("ready_agents", [])
+            entry["ready_at"] = data.get("timestamp")
+            self.current_phase = phase
+        elif data.get("event") == "current_phase":
+            self.current_phase = phase
+        self._changed(f"{RESOURCE_PREFIX}phases/{phase}")
+        self._changed(f"{RESOURCE_PREFIX}phases")
+
+    def _changed(self, uri: str) -> None:
+        if self.on_change is not None:
+            self.on_change(uri)
+
+    def _agent(self, name: str) -> Dict[str, Any]:
+        entry = self.agents.get(name)
+        if entry is None:
+            entry = self.agents[name] = {
+                "status": "unknown",
+                "last_update": None,
+                "updated_ms": 0,
+                "tasks": deque(maxlen=self.tasks_per_agent),
+            }
+        return entry
+
+    def _track_active(self, name: str, status: str) -> None:
+        if status in ACTIVE_STATUSES:
+            self.active.add(name)
+        else:
+            self.active.discard(name)
+
+    # Queries ------------------------------------------------------------
+    def agent_status(self, agent: str) -> Optional[Dict[str, Any]]:
+        entry = self.agents.get(agent)
+        if entry is None:
+            return None
+        tasks = entry["tasks"]
+        return {
+            "agent": agent,
+            "status": entry["status"],
+            "last_update": entry["last_update"],
+            "current_task": tasks[-1]["task"] if tasks else None,
+        }
+
+    def active_agents(self) -> Dict[str, Any]:
+        return {"active": sorted(self.active), "count": len(self.active), "known": len(self.agents)}
+
+    def recent(self, agent: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest last, like the memory file"""
+        if agent is None:
+            source = self.recent_tasks
+        else:
+            entry = self.agents.get(agent)
+            source = [{"agent": agent, **task} for task in entry["tasks"]] if entry else []
+        return list(source)[-limit:] if limit > 0 else []
+
+    def phase_status(self, phase: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if phase is not None:
+            info = self.phases.get(phase)
+            return None if info is None else {"phase": phase, **info}
+        return {"current_phase": self.current_phase, "phases": self.phases}
+
+    # Resources ----------------------------------------------------------
+    def resources(self) -> List[Dict[str, Any]]:
+        """resources/list entries: the two collections plus one per agent and phase"""
+        entries = [
+            {"uri": f"{RESOURCE_PREFIX}agents", "name": "agents", "description": "Status of all agents"},
+            {"uri": f"{RESOURCE_PREFIX}phases", "name": "phases", "description": "Current phase and all phases"},
+        ]
+        entries += [
+            {"uri": f"{RESOURCE_PREFIX}agents/{name}", "name": f"agent {name}"} for name in sorted(self.agents)
+        ]
+        entries += [
+            {"uri": f"{RESOURCE_PREFIX}phases/{name}", "name": f"phase {name}"} for name in self.phases
+        ]
+        for entry in entries:
+            entry["mimeType"] = "application/json"
+        return entries
+
+    def read_resource(self, uri: str) -> Optional[Any]:
+        """Current content of a resource, None for an unknown URI"""
+        if not uri.startswith(RESOURCE_PREFIX):
+            return None
+        kind, _, name = uri[len(RESOURCE_PREFIX):].partition("/")
+        if kind == "agents":
+            if not name:
+                return {agent: self.agent_status(agent) for agent in self.agents}
+            status = self.agent_status(name)
+            return None if status is None else {**status, "tasks": self.recent(name)}
+        if kind == "phases":
+            return self.phase_status(name or None)
+        return None
+
+
+class ResourceNotifier:
+    """
+    notifications/resources/updated for subscribed resources.
+
+    At most one notification per resource every `interval` seconds: the
+    first change is sent at once, further changes inside the interval are
+    coalesced into a single notification when it expires. The client reads
+    the resource then and always sees the latest state.
+    """
+
+    def __init__(self, send: Callable[[str], None], interval: float) -> None:
+        self.send = send
+        self.interval = interval
+        self.subscriptions: Set[str] = set()
+        self.sent = 0
+        self.coalesced = 0
+        self._last_sent: Dict[str, float] = {}
+        self._pending: Dict[str, asyncio.TimerHandle] = {}
+
+    def subscribe(self, uri: str) -> None:
+        self.subscriptions.add(uri)
+
+    def unsubscribe(self, uri: str) -> None:
+        self.subscriptions.discard(uri)
+        timer = self._pending.pop(uri, None)
+        if timer is not None:
+            timer.cancel()
+
+    def changed(self, uri: str) -> None:
+        if uri not in self.subscriptions:
+            return
+        if uri in self._pending:
+            self.coalesced += 1
+            return
+        loop = asyncio.get_running_loop()
+        due = self._last_sent.get(uri, float("-inf")) + self.interval
+        if loop.time() >= due:
+            self._emit(uri)
+        else:
+            self._pending[uri] = loop.call_at(due, self._emit, uri)
+
+    def _emit(self, uri: str) -> None:
+        self._pending.pop(uri, None)
+        self._last_sent[uri] = asyncio.get_running_loop().time()
+        self.sent += 1
+        self.send(uri)
+
+    def close(self) -> None:
+        for timer in self._pending.values():
+            timer.cancel()
+        self._pending.clear()
+
+
+# MCP tool definitions (tools/list)
+AGENT_TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "get_agent_status",
+        "description": "Current status, last update and current task of one agent",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"agent": {"type": "string", "description": "Agent name, e.g. ui"}},
+            "required": ["agent"],
+        },
+    },
+    {
+        "name": "list_active_agents",
+        "description": "Agents whose status is active, working or ready",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "get_recent_tasks",
+        "description": "Most recent tasks of all agents or of one agent, newest last",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "agent": {"type": "string", "description": "Only tasks of this agent"},
+                "limit": {"type": "integer", "minimum": 1, "default": 10},
+            },
+        },
+    },
+    {
+        "name": "get_agent_history",
+        "description": "Status history of one agent by time range: raw transitions or "
+        "per-minute / per-hour rollups (updates, transitions, errors, task durations)",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "agent": {"type": "string", "description": "Agent name, e.g. ui"},
+                "start_ms": {"type": "integer", "description": "Range start, epoch ms (default: end - 1h)"},
+                "end_ms": {"type": "integer", "description": "Range end, epoch ms (default: now)"},
+                "resolution": {"type": "string", "enum": ["raw", "1m", "1h"]},
+            },
+            "required": ["agent"],
+        },
+    },
+    {
+        "name": "get_phase_status",
+        "description": "Status of one development phase, or the current phase and all phases",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"phase": {"type": "string", "description": "Phase name, e.g. init"}},
+        },
+    },
+]
+
 ############################
 # Bridge core              #
 ############################
 
 
 class RedisMCPBridge:
-    """Holds Redis connection and updates the JSON memory file."""
+    """Holds the Redis connection, the query index and the memory file exporter."""
 
     def __init__(self) -> None:
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
@@ -51,156 +370,524 @@ class RedisMCPBridge:
         )
         self.memory_file = os.path.join(self.agent_lab_path, "warp-agent-memory.json")
 
-        # Redis connection -------------------------------------------------
+        # Export settings ------------------------------------------------
+        self.export_interval = float(os.getenv("STATE_EXPORT_INTERVAL_MS", "1000")) / 1000
+        self.batch_size = int(os.getenv("BRIDGE_BATCH_SIZE", "100"))
+        # Listener reconnect backoff, doubled per failed attempt
+        self.reconnect_delay = float(os.getenv("BRIDGE_RECONNECT_DELAY_MS", "500")) / 1000
+        self.reconnect_max_delay = float(os.getenv("BRIDGE_RECONNECT_MAX_DELAY_MS", "30000")) / 1000
+        self._listener_up = False
+        self._tasks: List[asyncio.Task] = []
+
+        # Raw bytes: status updates may arrive as binary codec frames
+        self.redis_client = aioredis.Redis.from_url(self.redis_url, decode_responses=False)
+
+        # Agents write their status to the Redis hashes themselves; the
+        # bridge only reads, and exports the memory file while it holds
+        # the exporter lease
+        self.state = AsyncAgentStateStore(self.redis_client)
+        # Durable event log under the Redis state; the export compacts it
+        self.journal = StatusJournal(
+            self.memory_file,
+            "bridge",
+            apply_status_event,
+            compact_every=int(os.getenv("BRIDGE_JOURNAL_COMPACT_EVERY", "100")),
+            compact_interval=self.export_interval,
+            fsync=os.getenv("BRIDGE_JOURNAL_FSYNC", "0") == "1",
+        )
+        self.exporter = MemoryExporter(
+            self.memory_file,
+            default_owner("bridge"),
+            lease_ms=int(os.getenv("STATE_EXPORT_LEASE_MS", "5000")),
+            journal=self.journal,
+        )
+
+        # Query side for MCP tools, seeded from Redis in start() and kept
+        # current by the listener
+        self.index = AgentStateIndex()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    async def start(self) -> None:
+        """Connect to Redis, seed the index and start the listener and exporter tasks"""
         try:
-            self.redis_client = redis.Redis.from_url(self.redis_url, decode_responses=True)
-            self.redis_client.ping()
+            await self.redis_client.ping()
             logger.info("✅ Connected to Redis %s", self.redis_url)
         except Exception as exc:  # pragma: no cover
             logger.error("❌ Redis connection failed: %s", exc)
             sys.exit(1)
 
-        self._init_memory_file()
+        await self.replay_journal()
+        self.index.load(await self.state.snapshot())
+        self._tasks = [
+            asyncio.create_task(self.listen_for_agent_updates(), name="bridge-listener"),
+            asyncio.create_task(self._run_exporter(), name="bridge-exporter"),
+        ]
+
+    async def close(self) -> None:
+        """Cancel listener and exporter, export a last time and give up the lease"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await self.export()
+            await self.state.release_lease(MemoryExporter.LEASE, self.exporter.owner)
+        except Exception as exc:  # pragma: no cover
+            logger.error("❌ Final memory export failed: %s", exc)
+        await asyncio.to_thread(self.journal.close)
+        await self.redis_client.aclose()
 
     # ------------------------------------------------------------------
-    # Memory helpers
+    # Memory file export
     # ------------------------------------------------------------------
-    def _init_memory_file(self) -> None:
-        if os.path.exists(self.memory_file):
-            logger.info("📝 Memory file exists: %s", self.memory_file)
+    async def export(self) -> bool:
+        """Write the memory file if the state changed and we hold the lease"""
+        version = await self.state.version()
+        if not self.exporter.due(version):
+            return False
+        snapshot = await self.state.snapshot()
+        # Picks up phases and status written without a notification
+        self.index.load(snapshot)
+        if not await self.state.acquire_lease(MemoryExporter.LEASE, self.exporter.owner,
+                                              self.exporter.lease_ms):
+            # Another process exports; remember the version we have seen
+            self.exporter.exported_version = snapshot["state_version"]
+            return False
+        await asyncio.to_thread(self.exporter.write, snapshot)
+        logger.debug("💾 Memory file exported (version %d)", snapshot["state_version"])
+        return True
+
+    async def _run_exporter(self) -> None:
+        while True:
+            await asyncio.sleep(self.export_interval)
+            try:
+                if not await self.export():
+                    # Without the lease the journal is folded into the file
+                    # the holder wrote, so it does not grow unbounded
+                    await asyncio.to_thread(self.journal.compact_if_due)
+            except Exception as exc:
+                logger.error("❌ Memory export failed: %s", exc)
+
+    async def replay_journal(self) -> None:
+        """Crash replay: fold the journal tail, restore Redis from the file if it came back empty"""
+        snapshot, tail = await asyncio.to_thread(self.journal.recover, dict)
+        if tail:
+            logger.info("📝 Replayed %d journaled status events into %s", len(tail), self.memory_file)
+        if await self.state.version():
+            # Agents write Redis before they publish, the store has the tail
             return
-
-        initial_memory: Dict[str, Any] = {
-            "agents": {},
-            "coordination": {
-                "active_phase": "init",
-                "total_agents": 0,
-                "active_agents": 0,
-            },
-            "created_at": datetime.utcnow().isoformat(),
-        }
-        os.makedirs(os.path.dirname(self.memory_file), exist_ok=True)
-        with open(self.memory_file, "w", encoding="utf-8") as f:
-            json.dump(initial_memory, f, indent=2)
-        logger.info("✅ Memory file initialised: %s", self.memory_file)
-
-    def _load_memory(self) -> Dict[str, Any]:
-        with open(self.memory_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    def _save_memory(self, data: Dict[str, Any]) -> None:
-        with open(self.memory_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        if snapshot.get("agents") or snapshot.get("phases"):
+            await self.state.restore(snapshot)
+            logger.info("♻️ Redis state restored from %s (%d agents)",
+                        self.memory_file, len(snapshot.get("agents", {})))
 
     # ------------------------------------------------------------------
     # Public API used by listener
     # ------------------------------------------------------------------
-    def update_agent_status(self, agent: str, status: str, task: Optional[str] = None) -> None:
-        mem = self._load_memory()
-        agents = mem.setdefault("agents", {})
-        agent_entry = agents.setdefault(agent, {"status": "unknown", "tasks": []})
-        agent_entry["status"] = status
-        agent_entry["last_update"] = datetime.utcnow().isoformat()
-        if task:
-            agent_entry["tasks"].append({"task": task, "timestamp": datetime.utcnow().isoformat()})
-            agent_entry["tasks"] = agent_entry["tasks"][-10:]
-        mem["coordination"]["active_agents"] = sum(
-            1 for a in agents.values() if a.get("status") in {"active", "working", "ready"}
-        )
-        self._save_memory(mem)
-        logger.info("📊 %s → %s %s", agent, status, f"({task})" if task else "")
+    async def apply_status_updates(self, updates: List[Dict[str, Any]]) -> None:
+        """Journal a batch of status notifications and apply it to the index (Redis already has them)"""
+        at = datetime.utcnow().isoformat()
+        events = [
+            {
+                "agent": update.get("agent", "unknown"),
+                "status": update.get("status", "unknown"),
+                "task": update.get("task"),
+                "at": at,
+                "updated_ms": update.get("timestamp"),
+            }
+            # Skips e.g. the coordinator's agent_registered event
+            for update in updates if "status" in update
+        ]
+        try:
+            # One write() for the whole batch, off the event loop: it may
+            # fsync or wait for a compaction holding the journal lock
+            await asyncio.to_thread(self.journal.append, events)
+        except OSError as exc:
+            logger.error("❌ Journal append failed: %s", exc)
+        for event in events:
+            self.index.apply_status(event)
+            task = event["task"]
+            logger.info("📊 %s → %s %s", event["agent"], event["status"], f"({task})" if task else "")
 
     # ------------------------------------------------------------------
-    # Redis listener (blocking)
+    # Redis listener (async)
     # ------------------------------------------------------------------
-    def listen_for_agent_updates(self) -> None:
-        pubsub = self.redis_client.pubsub()
-        pubsub.subscribe("agent_status_update")
-        logger.info("👂 Listening on Redis channel agent_status_update …")
-        for message in pubsub.listen():
-            if message.get("type") != "message":
-                continue
+    async def listen_for_agent_updates(self) -> None:
+        """Run the listener, reconnecting with backoff when the connection drops"""
+        delay = self.reconnect_delay
+        resync = False
+        while True:
+            self._listener_up = False
             try:
-                data = json.loads(message["data"])  # type: ignore[arg-type]
-                self.update_agent_status(
-                    data.get("agent", "unknown"), data.get("status", "unknown"), data.get("task")
-                )
-            except Exception as exc:  # pragma: no cover
-                logger.warning("Invalid status update: %s", exc)
+                await self._listen(resync)
+            except Exception as exc:
+                if self._listener_up:
+                    # Was connected: start the backoff over
+                    delay = self.reconnect_delay
+                logger.error("❌ Bridge listener failed, reconnecting in %.2fs: %s", delay, exc)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+                resync = True
+
+    async def _listen(self, resync: bool = False) -> None:
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe("agent_status_update", "phase_transition")
+            self._listener_up = True
+            if resync:
+                # Notifications published while we were gone are lost, Redis has them
+                self.index.load(await self.state.snapshot())
+                logger.info("🔄 Bridge listener reconnected, index resynced from Redis")
+            logger.info("👂 Listening on Redis channels agent_status_update, phase_transition …")
+            while True:
+                updates = []
+                message = await pubsub.get_message(timeout=1.0)
+                # Drain what is already buffered and apply it as one batch
+                while message is not None:
+                    if message.get("type") == "message":
+                        try:
+                            data = decode(message["data"])
+                            if message["channel"] in (b"phase_transition", "phase_transition"):
+                                self.index.apply_phase(data)
+                            else:
+                                updates.append(data)
+                        except Exception as exc:  # pragma: no cover
+                            logger.warning("Invalid status update: %s", exc)
+                    if len(updates) >= self.batch_size:
+                        break
+                    message = await pubsub.get_message(timeout=0)
+                if updates:
+                    await self.apply_status_updates(updates)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception as exc:  # pragma: no cover - connection already gone
+                logger.debug("Closing the listener connection failed: %s", exc)
 
 ############################
 # Minimal MCP JSON-RPC     #
 ############################
 
 
+async def open_stdio() -> tuple:
+    """StreamReader on stdin and StreamWriter on stdout
+
+    Falls back to None for a side that is a regular file (e.g. stdin
+    redirected from a file), which the pipe transports cannot handle.
+    """
+    loop = asyncio.get_running_loop()
+    reader: Optional[asyncio.StreamReader] = asyncio.StreamReader(limit=2 ** 20)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except (ValueError, OSError):
+        reader = None
+
+    writer: Optional[asyncio.StreamWriter] = None
+    try:
+        transport, protocol = await loop.connect_write_pipe(
+            asyncio.streams.FlowControlMixin, sys.stdout
+        )
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+    except (ValueError, OSError):
+        writer = None
+    return reader, writer
+
+
+class ToolError(Exception):
+    """Tool call failed; reported as an isError result, not a JSON-RPC error"""
+
+
+class RpcError(Exception):
+    """Reported to the client as a JSON-RPC error object"""
+
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
 class MCPJsonRpcServer:
-    """Very small JSON-RPC 2.0 loop that fulfils MCP handshake."""
+    """
+    Small JSON-RPC 2.0 server that fulfils the MCP handshake.
+
+    Every input line (a single request or a batch array) is dispatched as
+    its own task, so a slow call never holds up the requests behind it and
+    replies go out in completion order, matched by id. A batch gets one
+    array reply once all its requests are done; notifications (no id) get
+    no reply. Each method records call count, errors and latency.
+    """
 
     def __init__(self, bridge: RedisMCPBridge) -> None:
         self.bridge = bridge
-        self.loop = asyncio.get_event_loop()
-        self._running = True
-        # run blocking redis listener in executor
-        # Schedule the blocking Redis listener in a background thread
-        self.loop.run_in_executor(None, self.bridge.listen_for_agent_updates)
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._stopped = asyncio.Event()
+        self._inflight: Set[asyncio.Task] = set()
+        self._tools = {tool["name"]: getattr(self, f"_tool_{tool['name']}") for tool in AGENT_TOOLS}
+        self.notifier = ResourceNotifier(
+            self._notify_resource_updated,
+            float(os.getenv("BRIDGE_NOTIFY_INTERVAL_MS", "250")) / 1000,
+        )
+        bridge.index.on_change = self.notifier.changed
+
+        # Method registry: JSON-RPC method name -> handler(params) returning the result
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "initialize": self._method_initialize,
+            "tools/list": self._method_tools_list,
+            "tools/call": self._method_tools_call,
+            "list_tools": self._method_list_tools,
+            "resources/list": self._method_resources_list,
+            "resources/read": self._method_resources_read,
+            "resources/subscribe": self._method_resources_subscribe,
+            "resources/unsubscribe": self._method_resources_unsubscribe,
+            "bridge/metrics": self._method_metrics,
+            "shutdown": self._method_shutdown,
+        }
+        self.method_stats: Dict[str, Dict[str, Any]] = {}
 
     # ------------------------------------------------------------------
     # JSON-RPC helpers
     # ------------------------------------------------------------------
-    def _reply(self, _id: Any, result: Any = None, *, error: Optional[Dict[str, Any]] = None) -> None:
-        response = {"jsonrpc": "2.0", "id": _id}
-        if error is not None:
-            response["error"] = error
+    def _notify(self, method: str, params: Dict[str, Any]) -> None:
+        """JSON-RPC notification (no id, no reply expected)"""
+        self._write({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def _notify_resource_updated(self, uri: str) -> None:
+        self._notify("notifications/resources/updated", {"uri": uri})
+
+    def _write(self, message: Any) -> None:
+        line = json.dumps(message, default=list) + "\n"
+        if self.writer is not None:
+            # Buffered by the transport, drained by the request task
+            self.writer.write(line.encode("utf-8"))
+        else:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+    @staticmethod
+    def _error(_id: Any, code: int, message: str) -> Dict[str, Any]:
+        return {"jsonrpc": "2.0", "id": _id, "error": {"code": code, "message": message}}
+
+    async def _readline(self) -> str:
+        if self.reader is not None:
+            return (await self.reader.readline()).decode("utf-8")
+        return await asyncio.to_thread(sys.stdin.readline)
+
+    def _record(self, method: str, elapsed_ms: float, error: bool) -> None:
+        stats = self.method_stats.get(method)
+        if stats is None:
+            stats = self.method_stats[method] = {"calls": 0, "errors": 0, "latency": Histogram()}
+        stats["calls"] += 1
+        if error:
+            stats["errors"] += 1
+        stats["latency"].observe(elapsed_ms)
+
+    def stats_snapshot(self) -> Dict[str, Any]:
+        return {
+            method: {"calls": stats["calls"], "errors": stats["errors"], "latency": stats["latency"].snapshot()}
+            for method, stats in sorted(self.method_stats.items())
+        }
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+    async def _handle_line(self, line: str) -> None:
+        try:
+            message = json.loads(line)
+        except ValueError as exc:
+            self._write(self._error(None, -32700, f"Parse error: {exc}"))
+        else:
+            if isinstance(message, list):
+                if not message:
+                    self._write(self._error(None, -32600, "Empty batch"))
+                else:
+                    responses = await asyncio.gather(*(self._handle(request) for request in message))
+                    responses = [response for response in responses if response is not None]
+                    if responses:
+                        self._write(responses)
+            else:
+                response = await self._handle(message)
+                if response is not None:
+                    self._write(response)
+        if self.writer is not None:
+            await self.writer.drain()
+
+    async def _handle(self, request: Any) -> Optional[Dict[str, Any]]:
+        """Run one request, returns the response (None for a notification)"""
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return self._error(None, -32600, "Invalid request")
+        _id = request.get("id")
+        method = request["method"]
+        handler = self.methods.get(method)
+        if handler is None:
+            response = self._error(_id, -32601, f"Method {method} not found")
         else:
-            response["result"] = result
-        sys.stdout.write(json.dumps(response) + "\n")
-        sys.stdout.flush()
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = handler(request.get("params") or {})
+                if asyncio.iscoroutine(result):
+                    result = await result
+                response = {"jsonrpc": "2.0", "id": _id, "result": result}
+                failed = False
+            except RpcError as exc:
+                response = self._error(_id, exc.code, exc.message)
+            except Exception as exc:  # pragma: no cover
+                logger.exception("Method %s failed", method)
+                response = self._error(_id, -32603, str(exc))
+            finally:
+                self._record(method, (time.perf_counter() - started) * 1000, failed)
+        return None if "id" not in request else response
 
     # ------------------------------------------------------------------
     # Supported methods
     # ------------------------------------------------------------------
-    def _method_initialize(self, _id: Any, _params: Dict[str, Any]):
-        self._reply(
-            _id,
-            {
-                "serverInfo": {"name": "redis-mcp-bridge", "version": "0.1.0"},
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
+    def _method_initialize(self, _params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "serverInfo": {"name": "redis-mcp-bridge", "version": "0.1.0"},
+            "protocolVersion": "2024-11-05",
+            "capabilities": {
+                "tools": {},
+                "resources": {"subscribe": True, "listChanged": False},
             },
-        )
+        }
 
-    def _method_list_tools(self, _id: Any, _params: Dict[str, Any]):
-        self._reply(_id, [])
+    def _method_list_tools(self, _params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return AGENT_TOOLS
 
-    def _method_shutdown(self, _id: Any, _params: Dict[str, Any]):
-        self._running = False
-        self._reply(_id, True)
+    def _method_tools_list(self, _params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"tools": AGENT_TOOLS}
+
+    async def _method_tools_call(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        name = params.get("name")
+        tool = self._tools.get(name)
+        if tool is None:
+            raise RpcError(-32602, f"Unknown tool: {name}")
+        try:
+            result = tool(params.get("arguments") or {})
+            if asyncio.iscoroutine(result):
+                result = await result
+        except ToolError as exc:
+            return {"content": [{"type": "text", "text": str(exc)}], "isError": True}
+        return {"content": [{"type": "text", "text": json.dumps(result, default=list)}], "isError": False}
 
     # ------------------------------------------------------------------
-    async def serve(self) -> None:  # noqa: C901  (simple enough)
-        while self._running:
-            line = await self.loop.run_in_executor(None, sys.stdin.readline)
-            if line == "":
-                # EOF
-                break
-            try:
-                request = json.loads(line.strip())
-                _id = request.get("id")
-                method = request.get("method")
-                params = request.get("params", {}) or {}
-                if method == "initialize":
-                    self._method_initialize(_id, params)
-                elif method == "list_tools":
-                    self._method_list_tools(_id, params)
-                elif method == "shutdown":
-                    self._method_shutdown(_id, params)
-                else:
-                    self._reply(
-                        _id,
-                        error={"code": -32601, "message": f"Method {method} not found"},
-                    )
-            except Exception as exc:  # pragma: no cover
-                self._reply(None, error={"code": -32603, "message": str(exc)})
+    # Tools (answered from the in-memory index)
+    # ------------------------------------------------------------------
+    def _tool_get_agent_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        agent = args.get("agent")
+        if not agent:
+            raise ToolError("Missing argument: agent")
+        status = self.bridge.index.agent_status(agent)
+        if status is None:
+            raise ToolError(f"Unknown agent: {agent}")
+        return status
+
+    def _tool_list_active_agents(self, _args: Dict[str, Any]) -> Dict[str, Any]:
+        return self.bridge.index.active_agents()
+
+    def _tool_get_recent_tasks(self, args: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            limit = int(args.get("limit", 10))
+        except (TypeError, ValueError):
+            raise ToolError("limit must be an integer")
+        return self.bridge.index.recent(args.get("agent"), limit)
+
+    async def _tool_get_agent_history(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Served from the Redis time series, not the index"""
+        agent = args.get("agent")
+        if not agent:
+            raise ToolError("Missing argument: agent")
+        try:
+            return await self.bridge.state.history(
+                agent, args.get("start_ms"), args.get("end_ms"), args.get("resolution")
+            )
+        except ValueError as exc:
+            raise ToolError(str(exc))
+
+    def _tool_get_phase_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        status = self.bridge.index.phase_status(args.get("phase"))
+        if status is None:
+            raise ToolError(f"Unknown phase: {args.get('phase')}")
+        return status
+
+    # ------------------------------------------------------------------
+    # Resources
+    # ------------------------------------------------------------------
+    def _method_resources_list(self, _params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"resources": self.bridge.index.resources()}
+
+    def _method_resources_read(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        uri = params.get("uri", "")
+        content = self.bridge.index.read_resource(uri)
+        if content is None:
+            raise RpcError(-32002, f"Resource not found: {uri}")
+        return {"contents": [{"uri": uri, "mimeType": "application/json", "text": json.dumps(content, default=list)}]}
+
+    def _method_resources_subscribe(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        uri = params.get("uri", "")
+        if not uri.startswith(RESOURCE_PREFIX):
+            raise RpcError(-32002, f"Resource not found: {uri}")
+        # Agents/phases that do not exist yet may still appear later
+        self.notifier.subscribe(uri)
+        return {}
+
+    def _method_resources_unsubscribe(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.notifier.unsubscribe(params.get("uri", ""))
+        return {}
+
+    def _method_metrics(self, _params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "methods": self.stats_snapshot(),
+            "inflight": len(self._inflight),
+            "notifications": {"sent": self.notifier.sent, "coalesced": self.notifier.coalesced},
+        }
+
+    def _method_shutdown(self, _params: Dict[str, Any]) -> bool:
+        self._stopped.set()
+        return True
+
+    # ------------------------------------------------------------------
+    async def _next_line(self, stopped: asyncio.Future) -> Optional[str]:
+        """Next input line, None once shutdown was requested"""
+        read = asyncio.ensure_future(self._readline())
+        await asyncio.wait({read, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        if read.done():
+            return read.result()
+        read.cancel()
+        return None
+
+    async def serve(self) -> None:
+        self.reader, self.writer = await open_stdio()
+        await self.bridge.start()
+        stopped = asyncio.ensure_future(self._stopped.wait())
+        try:
+            while not self._stopped.is_set():
+                line = await self._next_line(stopped)
+                if not line:
+                    # EOF or shutdown
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self._handle_line(line.strip()))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+        finally:
+            stopped.cancel()
+            if self._inflight:
+                await asyncio.gather(*self._inflight, return_exceptions=True)
+            self.notifier.close()
+            await self.bridge.close()
+            if self.writer is not None:
+                await self.writer.drain()
+            for method, stats in self.stats_snapshot().items():
+                logger.info(
+                    "📊 %s: %d calls, %d errors, p50 %.3f ms, p99 %.3f ms",
+                    method, stats["calls"], stats["errors"],
+                    stats["latency"]["p50_ms"], stats["latency"]["p99_ms"],
+                )
 
 ############################
 # Entry-point              #
@@ -212,7 +899,7 @@ def main() -> None:  # pragma: no cover
     logger.info("🌉 Redis-MCP Bridge running (JSON-RPC mode)")
     server = MCPJsonRpcServer(bridge)
     try:
-        server.loop.run_until_complete(server.serve())
+        asyncio.run(server.serve())
     except KeyboardInterrupt:
         pass
     finally:
@@ -220,4 +907,4 @@ def main() -> None:  # pragma: no cover
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,9 @@
+"""
+Test setup - Module unter src/ importierbar machen (wie der sys.path Hack der Agents)
+"""
+
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path[:0] = [SRC, os.path.join(SRC, "mcp")]
@@ -0,0 +1,117 @@
+"""
+Message Codecs - Round-Trip, Framing und Codec-Aushandlung pro Kanal
+"""
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from agents.codec import (  # noqa: E402
+    CODECS,
+    FLAG_ZLIB,
+    FRAME_MAGIC,
+    ChannelCodecs,
+    CodecError,
+    decode,
+    encode,
+    get_codec,
+)
+
+MESSAGE = {"from": "ui", "type": "status_request", "payload": {"tasks": ["a", "b"], "count": 2}}
+
+needs_msgpack = pytest.mark.skipif("msgpack" not in CODECS, reason="msgpack not installed")
+
+
+def test_plain_json_stays_plain():
+    data = encode(MESSAGE)
+    assert data.startswith(b"{")
+    assert decode(data) == MESSAGE
+    assert decode(data.decode("utf-8")) == MESSAGE
+
+
+def test_compressed_json_is_framed():
+    data = encode(MESSAGE, compress_threshold=16)
+    assert data.startswith(FRAME_MAGIC)
+    assert data[2] & FLAG_ZLIB
+    assert decode(data) == MESSAGE
+
+
+def test_below_threshold_is_not_compressed():
+    assert encode(MESSAGE, compress_threshold=10_000).startswith(b"{")
+
+
+@needs_msgpack
+@pytest.mark.parametrize("threshold", [0, 16])
+def test_msgpack_round_trip(threshold):
+    data = encode(MESSAGE, "msgpack", threshold)
+    assert data.startswith(FRAME_MAGIC + b"m")
+    assert decode(data) == MESSAGE
+
+
+def test_unknown_codec_and_invalid_frames_raise_codec_error():
+    with pytest.raises(CodecError):
+        get_codec("protobuf")
+    with pytest.raises(CodecError):
+        decode(FRAME_MAGIC + b"?" + b"\x00" + b"body")
+    with pytest.raises(CodecError):
+        decode(b"not json")
+    with pytest.raises(CodecError):
+        encode({"value": object()})
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+def test_json_sender_never_looks_up_peers(redis_client):
+    codecs = ChannelCodecs(redis_client)
+    assert decode(codecs.encode_for_agent("ui", MESSAGE)) == MESSAGE
+    assert codecs._peer_cache == {}
+
+
+@needs_msgpack
+def test_negotiates_preferred_codec_with_advertising_peer(redis_client):
+    ChannelCodecs(redis_client, preferred="msgpack").advertise("ui")
+    codecs = ChannelCodecs(redis_client, preferred="msgpack")
+    data = codecs.encode_for_agent("ui", MESSAGE)
+    assert data.startswith(FRAME_MAGIC + b"m")
+    assert decode(data) == MESSAGE
+
+
+@needs_msgpack
+def test_falls_back_to_json_for_json_only_or_silent_peers(redis_client):
+    redis_client.hset(ChannelCodecs.REGISTRY_KEY, "legacy", "json")
+    codecs = ChannelCodecs(redis_client, preferred="msgpack")
+    assert codecs.encode_for_agent("legacy", MESSAGE).startswith(b"{")
+    # Never advertised at all
+    assert codecs.encode_for_agent("silent", MESSAGE).startswith(b"{")
+
+
+@needs_msgpack
+def test_peer_lookup_is_cached_until_ttl(redis_client):
+    codecs = ChannelCodecs(redis_client, preferred="msgpack", cache_ttl=60)
+    assert codecs.encode_for_agent("ui", MESSAGE).startswith(b"{")
+    ChannelCodecs(redis_client, preferred="msgpack").advertise("ui")
+    assert codecs.encode_for_agent("ui", MESSAGE).startswith(b"{")
+
+    fresh = ChannelCodecs(redis_client, preferred="msgpack", cache_ttl=0)
+    assert fresh.encode_for_agent("ui", MESSAGE).startswith(FRAME_MAGIC + b"m")
+
+
+@needs_msgpack
+def test_channel_overrides(redis_client):
+    codecs = ChannelCodecs(redis_client, overrides={"agent_status_update": "msgpack", "agent_ui": "msgpack"})
+    assert codecs.encode_for_channel("agent_status_update", MESSAGE).startswith(FRAME_MAGIC + b"m")
+    assert codecs.encode_for_channel("coordination_command", MESSAGE).startswith(b"{")
+    assert codecs.encode_for_agent("ui", MESSAGE).startswith(FRAME_MAGIC + b"m")
+
+
+def test_from_env(monkeypatch, redis_client):
+    monkeypatch.setenv("AGENT_CODEC", "json")
+    monkeypatch.setenv("AGENT_CODEC_CHANNELS", "agent_status_update=json, agent_ui = json")
+    monkeypatch.setenv("AGENT_COMPRESS_THRESHOLD", "512")
+    codecs = ChannelCodecs.from_env(redis_client)
+    assert codecs.overrides == {"agent_status_update": "json", "agent_ui": "json"}
+    assert codecs.compress_threshold == 512
+    assert codecs.supported()[0] == "json"
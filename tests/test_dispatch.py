@@ -0,0 +1,47 @@
+"""
+Handler Dispatcher - Executor-Wahl und Picklebarkeit von Process-Handlern
+"""
+
+import pytest
+
+from agents.dispatch import HandlerDispatcher, process_safe
+
+
+def module_handler(payload):
+    return payload
+
+
+class Handlers:
+    def handle(self, payload):
+        return payload
+
+
+def test_process_is_not_a_default_executor():
+    with pytest.raises(ValueError):
+        HandlerDispatcher(executor="process")
+
+
+def test_process_can_be_configured_per_type():
+    dispatcher = HandlerDispatcher(executor="thread")
+    dispatcher.configure("render", executor="process")
+    assert dispatcher.executor_for("render") == "process"
+    assert dispatcher.executor_for("other") == "thread"
+
+
+def test_only_module_functions_are_process_safe():
+    def nested(payload):
+        return payload
+
+    assert process_safe(module_handler)
+    assert not process_safe(Handlers().handle)
+    assert not process_safe(nested)
+    assert not process_safe(lambda payload: payload)
+
+
+def test_failing_pressure_callback_is_logged(caplog):
+    def on_pressure(lane, high, depth, capacity):
+        raise RuntimeError("publish failed")
+
+    dispatcher = HandlerDispatcher(name="t", on_pressure=on_pressure)
+    dispatcher._notify_pressure("normal", True, 9, 10)
+    assert "publish failed" in caplog.text
@@ -0,0 +1,64 @@
+"""
+HeartbeatMonitor - Heartbeat Deadlines im Min-Heap
+"""
+
+from agent_coordinator import HeartbeatMonitor
+
+
+def monitor():
+    return HeartbeatMonitor({"main": 10.0, "ui": 30.0}, default_timeout=60.0)
+
+
+def test_agent_expires_after_its_timeout():
+    heartbeats = monitor()
+    heartbeats.beat("main", now=0.0)
+    assert heartbeats.expire(9.9) == []
+    assert heartbeats.expire(10.0) == ["main"]
+    assert heartbeats.unhealthy == {"main"}
+    # Reported once, not on every check
+    assert heartbeats.expire(20.0) == []
+
+
+def test_beat_moves_the_deadline():
+    heartbeats = monitor()
+    heartbeats.beat("main", now=0.0)
+    heartbeats.beat("main", now=8.0)
+    assert heartbeats.expire(12.0) == []
+    assert heartbeats.expire(18.0) == ["main"]
+
+
+def test_heap_holds_one_entry_per_agent():
+    heartbeats = monitor()
+    for now in range(100):
+        heartbeats.beat("main", now=float(now))
+        heartbeats.beat("ui", now=float(now))
+    assert len(heartbeats._heap) == 2
+
+
+def test_recovery_is_reported_and_rearms_the_deadline():
+    heartbeats = monitor()
+    heartbeats.beat("main", now=0.0)
+    heartbeats.expire(10.0)
+    assert heartbeats.beat("main", now=15.0) is True
+    assert heartbeats.unhealthy == set()
+    assert heartbeats.beat("main", now=16.0) is False
+    assert heartbeats.expire(25.0) == []
+    assert heartbeats.expire(26.0) == ["main"]
+
+
+def test_timeouts_per_agent_role_and_default():
+    heartbeats = monitor()
+    heartbeats.beat("ui", now=0.0)
+    heartbeats.beat("ui@2", now=0.0)
+    heartbeats.beat("api", now=0.0)
+    assert sorted(heartbeats.expire(30.0)) == ["ui", "ui@2"]
+    assert heartbeats.expire(59.0) == []
+    assert heartbeats.expire(60.0) == ["api"]
+
+
+def test_next_deadline_is_the_earliest_one():
+    heartbeats = monitor()
+    assert heartbeats.next_deadline() is None
+    heartbeats.beat("ui", now=0.0)
+    heartbeats.beat("main", now=5.0)
+    assert heartbeats.next_deadline() == 15.0
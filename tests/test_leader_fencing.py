@@ -0,0 +1,78 @@
+"""
+Leader Election - veraltete Fencing Tokens werden vom State Store abgewiesen
+"""
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from agent_coordinator import LeaderElection  # noqa: E402
+from agents.state_store import AgentStateStore, FencedOut  # noqa: E402
+
+LEASE = LeaderElection.LEASE
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def store_on(server):
+    return AgentStateStore(fakeredis.FakeRedis(server=server))
+
+
+def test_new_holder_gets_a_larger_token(server):
+    store = store_on(server)
+    first = store.acquire_leadership(LEASE, "a", 5000)
+    assert store.acquire_leadership(LEASE, "b", 5000) == 0
+    # Renewal keeps the token
+    assert store.acquire_leadership(LEASE, "a", 5000) == first
+    store.release_lease(LEASE, "a")
+    assert store.acquire_leadership(LEASE, "b", 5000) > first
+
+
+def test_stale_token_is_rejected(server):
+    store = store_on(server)
+    stale = store.acquire_leadership(LEASE, "a", 5000)
+    store.update_phase("init", {"status": "ready"}, current=True, fence=(LEASE, stale))
+    # a's lease runs out, b takes over
+    store.redis_client.delete(store.lease_key(LEASE))
+    current = store.acquire_leadership(LEASE, "b", 5000)
+
+    with pytest.raises(FencedOut):
+        store.update_phase("build", {"status": "ready"}, current=True, fence=(LEASE, stale))
+    with pytest.raises(FencedOut):
+        store.update_coordination({"status": "paused"}, fence=(LEASE, stale))
+    assert store.coordination().get("current_phase") == "init"
+
+    store.update_phase("build", {"status": "ready"}, current=True, fence=(LEASE, current))
+    assert store.coordination()["current_phase"] == "build"
+
+
+def test_takeover_during_the_write_is_rejected(server):
+    store = store_on(server)
+    token = store.acquire_leadership(LEASE, "a", 5000)
+    other = fakeredis.FakeRedis(server=server)
+
+    def queue(pipe):
+        # New holder between the token check and EXEC
+        other.incr(store.fence_key(LEASE))
+        pipe.hset(store.coordination_key, "status", '"paused"')
+
+    with pytest.raises(FencedOut):
+        store._transaction(queue, fence=(LEASE, token))
+    assert other.hget(store.coordination_key, "status") is None
+
+
+def test_standby_election_cannot_write_after_takeover(server):
+    leader = LeaderElection(store_on(server), "a", 5000)
+    standby = LeaderElection(store_on(server), "b", 5000)
+    assert leader.tick() is True
+    assert standby.tick() is None and not standby.is_leader
+    stale_fence = leader.fence
+
+    leader.step_down()
+    assert standby.tick() is True
+    with pytest.raises(FencedOut):
+        leader.store.update_phase("init", {"status": "ready"}, fence=stale_fence)
+    standby.store.update_phase("init", {"status": "ready"}, fence=standby.fence)
@@ -0,0 +1,161 @@
+"""
+PhaseScheduler - Phasen-DAG, parallele Phasen und kritischer Pfad
+"""
+
+import threading
+
+import pytest
+
+import agents.phase_scheduler as phase_scheduler
+from agents.phase_scheduler import DONE, RUNNING, PhaseScheduler, estimated_seconds
+from config.agent_config import config
+
+# a -> (b, c) -> d
+DIAMOND = [
+    {"name": "a", "depends_on": [], "completes_on": ["x_a"], "estimated_time": "1 minute"},
+    {"name": "b", "depends_on": ["a"], "completes_on": ["x_b"], "estimated_time": "5 minutes"},
+    {"name": "c", "depends_on": ["a"], "completes_on": ["y_c", "z_c"], "estimated_time": "2 minutes"},
+    {"name": "d", "depends_on": ["b", "c"], "completes_on": ["x_d"], "estimated_time": "1 minute"},
+]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(phase_scheduler.time, "monotonic", clock)
+    return clock
+
+
+def test_estimated_seconds():
+    assert estimated_seconds("5-8 minutes") == 480
+    assert estimated_seconds("1 hour") == 3600
+    assert estimated_seconds("30 seconds") == 30
+    assert estimated_seconds(None) == 0
+    assert estimated_seconds("soon") == 0
+
+
+def test_independent_phases_run_in_parallel():
+    scheduler = PhaseScheduler(DIAMOND)
+    assert scheduler.start().started == ["a"]
+    assert scheduler.complete("x_a").started == ["b", "c"]
+    assert scheduler.running() == ["b", "c"]
+
+
+def test_phase_waits_for_all_its_completions_and_dependencies():
+    scheduler = PhaseScheduler(DIAMOND)
+    scheduler.start()
+    scheduler.complete("x_a")
+    assert scheduler.complete("y_c").started == []
+    assert scheduler.complete("z_c").started == []
+    assert scheduler.state["c"] == DONE
+    assert scheduler.state["d"] == "pending"
+    assert scheduler.complete("x_b").started == ["d"]
+    assert scheduler.complete("x_d") == ([], True)
+    assert scheduler.finished
+    # Late or repeated completions do not finish the run a second time
+    assert scheduler.complete("x_d") == ([], False)
+
+
+def test_early_completion_finishes_the_phase_when_it_starts():
+    scheduler = PhaseScheduler(DIAMOND)
+    scheduler.start()
+    # b reports before a is done
+    assert scheduler.complete("x_b").started == []
+    assert scheduler.complete("x_a").started == ["c"]
+    assert scheduler.state["b"] == DONE
+    assert scheduler.state["c"] == RUNNING
+
+
+def test_force_complete_finishes_running_phases():
+    scheduler = PhaseScheduler(DIAMOND)
+    scheduler.start()
+    assert scheduler.force_complete() == (["b", "c"], False)
+    assert scheduler.force_complete() == (["d"], False)
+    assert scheduler.force_complete() == ([], True)
+    assert scheduler.force_complete() == ([], False)
+    assert scheduler.finished
+
+
+def test_each_transition_is_reported_once():
+    scheduler = PhaseScheduler(DIAMOND)
+    scheduler.start()
+    scheduler.complete("x_a")
+    scheduler.complete("x_b")
+    scheduler.complete("y_c")
+    transitions = []
+    threads = [
+        threading.Thread(target=lambda: transitions.append(scheduler.complete("z_c"))),
+        threading.Thread(target=lambda: transitions.append(scheduler.force_complete())),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(name for transition in transitions for name in transition.started) == ["d"]
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError, match="unknown phase"):
+        PhaseScheduler([{"name": "a", "depends_on": ["missing"]}])
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        PhaseScheduler([
+            {"name": "a", "depends_on": ["b"]},
+            {"name": "b", "depends_on": ["a"]},
+            {"name": "c", "depends_on": []},
+        ])
+
+
+def test_critical_path_from_estimates():
+    path, seconds = PhaseScheduler(DIAMOND).critical_path()
+    assert path == ["a", "b", "d"]
+    assert seconds == 7 * 60
+
+
+def test_critical_path_uses_measured_durations(clock):
+    scheduler = PhaseScheduler(DIAMOND)
+    scheduler.start()
+    clock.now = 60
+    scheduler.complete("x_a")
+    clock.now = 120
+    scheduler.complete("x_b")
+    # c takes far longer than estimated
+    clock.now = 1000
+    scheduler.complete("y_c")
+    scheduler.complete("z_c")
+    clock.now = 1030
+    scheduler.complete("x_d")
+    path, seconds = scheduler.critical_path()
+    assert path == ["a", "c", "d"]
+    assert seconds == 60 + 940 + 30
+    report = scheduler.report()
+    assert report["critical_path"] == ["a", "c", "d"]
+    assert report["sequential_seconds"] == 60 + 60 + 940 + 30
+    assert report["phases"]["b"] == {"state": DONE, "seconds": 60}
+
+
+def test_running_phase_counts_at_least_its_estimate(clock):
+    scheduler = PhaseScheduler(DIAMOND)
+    scheduler.start()
+    clock.now = 10
+    assert scheduler.duration("a") == 60
+    clock.now = 100
+    assert scheduler.duration("a") == 100
+
+
+def test_project_phases_form_a_dag():
+    scheduler = PhaseScheduler(config.phases)
+    assert scheduler.order[0] == "init"
+    assert scheduler.order[-1] == "final_integration"
+    path, _ = scheduler.critical_path()
+    assert path[0] == "init" and path[-1] == "final_integration"
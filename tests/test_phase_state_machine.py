@@ -0,0 +1,87 @@
+"""
+PhaseStateMachine - Phasenbereitschaft aus Zählern pro Phase
+"""
+
+from agent_coordinator import PhaseStateMachine
+
+PHASES = [
+    {"name": "init", "required_agents": ["main", "ui", "api"]},
+    {"name": "build", "required_agents": ["ui", "api"]},
+]
+
+
+def machine(current_phase="init", ready_phases=None):
+    return PhaseStateMachine(PHASES, current_phase, ready_phases)
+
+
+def test_phase_ready_once_all_required_agents_are_ready():
+    phases = machine()
+    assert phases.update("main", "ready") is None
+    assert phases.update("ui", "active") is None
+    assert phases.update("api", "ready") == "init"
+    assert phases.ready_agents_for("init") == ["main", "ui", "api"]
+
+
+def test_phase_is_announced_at_most_once():
+    phases = machine()
+    for agent_name in ("main", "ui", "api"):
+        phases.update(agent_name, "ready")
+    # Dropping out and coming back does not re-arm the phase
+    assert phases.update("ui", "working") is None
+    assert phases.update("ui", "ready") is None
+    assert phases.check() is None
+
+
+def test_not_ready_status_decrements_counter():
+    phases = machine()
+    phases.update("main", "ready")
+    phases.update("ui", "ready")
+    phases.update("ui", "error")
+    assert phases.progress() == {"init": "1/3", "build": "0/2"}
+    assert phases.update("api", "ready") is None
+
+
+def test_repeated_status_is_counted_once():
+    phases = machine()
+    phases.update("ui", "ready")
+    phases.update("ui", "active")
+    assert phases.progress()["build"] == "1/2"
+
+
+def test_unknown_agent_is_ignored():
+    phases = machine()
+    assert phases.update("stranger", "ready") is None
+    assert phases.progress() == {"init": "0/3", "build": "0/2"}
+
+
+def test_set_current_phase_checks_the_new_phase():
+    phases = machine()
+    phases.update("ui", "ready")
+    phases.update("api", "ready")
+    assert phases.set_current_phase("build") == "build"
+    assert phases.set_current_phase("missing") is None
+
+
+def test_restored_announcements_are_not_repeated():
+    phases = machine(ready_phases=["init"])
+    for agent_name in ("main", "ui", "api"):
+        assert phases.update(agent_name, "ready") is None
+
+
+def test_replicas_count_for_their_role():
+    phases = machine(current_phase="build")
+    phases.update("ui@1", "ready")
+    phases.update("ui@2", "ready")
+    assert phases.progress()["build"] == "1/2"
+    assert phases.update("api@1", "ready") == "build"
+
+
+def test_role_stays_ready_while_any_replica_is_ready():
+    phases = machine(current_phase="build")
+    phases.update("ui@1", "ready")
+    phases.update("ui@2", "ready")
+    phases.update("ui@1", "offline")
+    assert "ui" in phases.ready_agents
+    phases.update("ui@2", "offline")
+    assert "ui" not in phases.ready_agents
+    assert phases.progress()["build"] == "0/2"
@@ -0,0 +1,134 @@
+"""
+Agent Replicas - Hash Ring, Routing nach Last und Ablauf veralteter Reports
+"""
+
+import json
+import time
+
+import pytest
+
+import agents.replicas as replicas
+from agents.replicas import (
+    HashRing,
+    LoadReporter,
+    ReplicaRegistry,
+    ReplicaRouter,
+    replica_address,
+    role_of,
+)
+
+KEYS = [f"/projects/app-{index}" for index in range(2000)]
+
+
+class FakeRegistry:
+    """Fixed replica loads, counts lookups"""
+
+    def __init__(self, loads):
+        self.loads = loads
+        self.lookups = 0
+
+    def load(self, role):
+        self.lookups += 1
+        return dict(self.loads.get(role, {}))
+
+
+def test_addresses():
+    assert replica_address("ui", "2") == "ui@2"
+    assert role_of("ui@2") == "ui"
+    assert role_of("ui") == "ui"
+
+
+def test_empty_ring():
+    assert HashRing([]).node_for("key") is None
+
+
+def test_ring_spreads_keys():
+    ring = HashRing(["1", "2", "3"])
+    owners = [ring.node_for(key) for key in KEYS]
+    for node in ("1", "2", "3"):
+        assert owners.count(node) > len(KEYS) / 6
+
+
+def test_adding_a_replica_only_moves_keys_to_it():
+    before = HashRing(["1", "2", "3"])
+    after = HashRing(["1", "2", "3", "4"])
+    moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+    assert moved
+    assert all(after.node_for(key) == "4" for key in moved)
+    assert len(moved) < len(KEYS) / 2
+
+
+def test_removing_a_replica_only_moves_its_keys():
+    before = HashRing(["1", "2", "3"])
+    after = HashRing(["1", "2"])
+    for key in KEYS:
+        if before.node_for(key) != "3":
+            assert after.node_for(key) == before.node_for(key)
+
+
+def test_least_loaded_across_a_burst():
+    router = ReplicaRouter(FakeRegistry({"ui": {"1": 0, "2": 0, "3": 5}}), max_age=60, affinity_keys=())
+    picks = [router.route("ui", {}) for _ in range(10)]
+    # Routed messages count towards the load until the next refresh
+    assert picks.count("ui@1") == 5
+    assert picks.count("ui@2") == 5
+
+
+def test_affinity_pins_a_key_to_one_replica():
+    router = ReplicaRouter(FakeRegistry({"ui": {"1": 0, "2": 0, "3": 0}}), max_age=60)
+    target = router.route("ui", {"project_path": "/projects/a"})
+    assert all(router.route("ui", {"project_path": "/projects/a"}) == target for _ in range(20))
+    assert router.route("ui", {}, affinity="/projects/a") == target
+
+
+def test_roles_without_replicas_and_explicit_addresses_pass_through():
+    registry = FakeRegistry({"ui": {"1": 0}})
+    router = ReplicaRouter(registry, max_age=60)
+    assert router.route("github", {}) == "github"
+    assert router.route("ui@7", {}) == "ui@7"
+    assert router.replicas("ui") == []
+    router.route("ui", {})
+    assert router.replicas("ui") == ["ui@1"]
+
+
+def test_replica_table_is_cached_for_max_age(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(replicas.time, "monotonic", lambda: now[0])
+    registry = FakeRegistry({"ui": {"1": 0}})
+    router = ReplicaRouter(registry, max_age=1.0)
+    for _ in range(5):
+        router.route("ui", {})
+    assert registry.lookups == 1
+    now[0] += 1.5
+    router.route("ui", {})
+    assert registry.lookups == 2
+
+
+def test_stale_reports_are_not_routed_to():
+    fakeredis = pytest.importorskip("fakeredis")
+    registry = ReplicaRegistry(fakeredis.FakeRedis(), ttl_ms=1000)
+    pipe = registry.redis_client.pipeline()
+    registry.queue_report(pipe, "ui", "1", 3)
+    pipe.execute()
+    registry.redis_client.hset(registry.replicas_key("ui"), "2", json.dumps({
+        "in_flight": 0,
+        "updated_ms": int(time.time() * 1000) - 5000,
+    }))
+    assert registry.load("ui") == {"1": 3}
+
+    pipe = registry.redis_client.pipeline()
+    registry.queue_remove(pipe, "ui", "1")
+    pipe.execute()
+    assert registry.load("ui") == {}
+
+
+def test_load_reporter_reports_changes_and_heartbeats(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(replicas.time, "monotonic", lambda: now[0])
+    reporter = LoadReporter(ttl_ms=3000)
+    assert reporter.due(0)
+    assert not reporter.due(0)
+    assert reporter.due(1)
+    now[0] += 1.0
+    assert reporter.due(1)
+    assert not reporter.due(1)
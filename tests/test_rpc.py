@@ -0,0 +1,83 @@
+"""
+Request/Response RPC - Futures, Timeouts und verspätete Antworten
+"""
+
+import time
+
+import pytest
+
+from agents.rpc import PendingRequests, RemoteError, RequestTimeout, gather
+
+
+@pytest.fixture
+def pending():
+    return PendingRequests("test")
+
+
+def test_reply_completes_the_future(pending):
+    correlation_id, future = pending.create(timeout=5)
+    assert len(pending) == 1
+    assert pending.resolve(correlation_id, {"ok": True})
+    assert future.result(timeout=1) == {"ok": True}
+    assert len(pending) == 0
+
+
+def test_error_reply_raises_remote_error(pending):
+    correlation_id, future = pending.create(timeout=5)
+    pending.resolve(correlation_id, error="handler failed")
+    with pytest.raises(RemoteError, match="handler failed"):
+        future.result(timeout=1)
+
+
+def test_unknown_and_duplicate_replies_are_ignored(pending):
+    correlation_id, _ = pending.create(timeout=5)
+    assert not pending.resolve("unknown")
+    assert pending.resolve(correlation_id, {})
+    assert not pending.resolve(correlation_id, {})
+
+
+def test_request_times_out_and_late_reply_is_dropped(pending):
+    correlation_id, future = pending.create(timeout=0.05)
+    with pytest.raises(RequestTimeout):
+        future.result(timeout=2)
+    assert len(pending) == 0
+    assert not pending.resolve(correlation_id, {"late": True})
+
+
+def test_shorter_deadline_wakes_the_reaper(pending):
+    _, slow = pending.create(timeout=30)
+    _, fast = pending.create(timeout=0.05)
+    started = time.monotonic()
+    with pytest.raises(RequestTimeout):
+        fast.result(timeout=2)
+    assert time.monotonic() - started < 1
+    assert not slow.done()
+
+
+def test_cancelled_future_is_not_resolved(pending):
+    correlation_id, future = pending.create(timeout=5)
+    future.cancel()
+    assert not pending.resolve(correlation_id, {})
+
+
+def test_fail_all(pending):
+    _, first = pending.create(timeout=5)
+    _, second = pending.create(timeout=5)
+    pending.fail_all("agent stopped")
+    for future in (first, second):
+        with pytest.raises(RemoteError, match="agent stopped"):
+            future.result(timeout=1)
+    assert len(pending) == 0
+
+
+def test_gather_collects_replies_errors_and_timeouts(pending):
+    ok_id, ok = pending.create(timeout=5)
+    failed_id, failed = pending.create(timeout=5)
+    _, silent = pending.create(timeout=5)
+    pending.resolve(ok_id, {"value": 1})
+    pending.resolve(failed_id, error="boom")
+
+    results = gather({"ok": ok, "failed": failed, "silent": silent}, timeout=0.05)
+    assert results["ok"] == {"value": 1}
+    assert isinstance(results["failed"], RemoteError)
+    assert isinstance(results["silent"], RequestTimeout)